@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""Module to reconcile read counts across pipeline stages.
+
+Each stage of the pipeline records how many reads it received and emitted
+as a by-product of doing its work (trimmomatic's summary file, flash's
+STDOUT statistics, the counts of merged reads rejected by the hashing
+filters, and the abundance totals of hashed and thresholded reads). This
+module collects those counts into a single table, so that read losses
+between stages can be checked without re-parsing any reads.
+"""
+
+from typing import List
+
+import pandas as pd
+
+# Source columns in the pipeline dataframe, keyed by reconciliation column
+ACCOUNTING_COLUMNS = [
+    ("input_pairs", "Input Read Pairs"),
+    ("surviving_pairs", "Both Surviving Reads"),
+    ("merge_input_pairs", "Total pairs"),
+    ("merged_reads", "Combined pairs"),
+    ("filtered_reads", "rejected_reads"),
+    ("hashed_total", "hashed_total"),
+    ("thresholded_total", "thresholded_total"),
+]
+
+
+def reconcile_read_counts(dfm: pd.DataFrame) -> pd.DataFrame:
+    """Return pd.DataFrame reconciling read counts at each stage, by sample.
+
+    :param dfm:  pd.DataFrame containing one row per sample
+
+    The returned dataframe has one row per sample, with the read counts
+    recorded at each stage, the number of reads lost between consecutive
+    stages, and a boolean "reconciled" column. A sample is reconciled when
+    every read surviving trimming was passed to flash, and every read merged
+    by flash was either counted by hashing or rejected by its filters.
+    Losses to trimming, merging, filtering and thresholding are expected,
+    and reported but not treated as errors.
+    """
+    data = pd.DataFrame(index=dfm.index)
+    for colname, source in ACCOUNTING_COLUMNS:
+        if source in dfm.columns:
+            data[colname] = pd.to_numeric(dfm[source], errors="coerce")
+        else:
+            data[colname] = float("nan")
+
+    data["lost_trimming"] = data["input_pairs"] - data["surviving_pairs"]
+    data["lost_handoff"] = data["surviving_pairs"] - data["merge_input_pairs"]
+    data["unmerged"] = data["merge_input_pairs"] - data["merged_reads"]
+    # Reads are only rejected when hashing filters are set
+    data["lost_hashing"] = (
+        data["merged_reads"] - data["filtered_reads"].fillna(0) - data["hashed_total"]
+    )
+    data["below_threshold"] = data["hashed_total"] - data["thresholded_total"]
+    data["reconciled"] = (data["lost_handoff"] == 0) & (data["lost_hashing"] == 0)
+    return data
+
+
+def unreconciled_samples(data: pd.DataFrame) -> List[str]:
+    """Return names of samples whose read counts do not reconcile.
+
+    :param data:  pd.DataFrame returned by reconcile_read_counts()
+
+    Samples with missing counts (e.g. from a dry run) are not reported.
+    """
+    complete = data[["lost_handoff", "lost_hashing"]].notnull().all(axis=1)
+    return sorted(data.index[complete & ~data["reconciled"]])
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""Module to reduce read hash abundance tables to a bounded size for plotting.
+
+The thresholded read table holds one row per sample/hash combination, and
+grows with both the number of samples and the number of hashes in a run.
+Plots are drawn from reduced tables instead: the top hashes by total
+abundance over the run are kept, and every other hash is binned into a
+single OTHER_HASHES category. The abundance distribution of each kept hash
+(and of the binned hashes) is summarised as quantiles over the samples it
+occurs in, so the per-hash summary has at most top + 1 rows, and the
+per-sample table at most top + 1 rows per sample, whatever the number of
+hashes in the run.
+
+All reductions are vectorised pandas groupby operations. Groups are taken
+over every category (observed=False), so that results follow category
+order, and empty groups are then dropped.
+"""
+
+from typing import Sequence
+
+import pandas as pd
+
+# Label of the category holding hashes outside the top hashes
+OTHER_HASHES = "other"
+
+# Default number of top hashes plotted: Category20 has 20 colours, and one
+# is left for the binned hashes
+PLOT_TOP_HASHES = 19
+
+# Default quantiles of abundance reported for each hash category
+PLOT_QUANTILES = (0.0, 0.25, 0.5, 0.75, 1.0)
+
+
+def rank_hashes(readtable: pd.DataFrame, top: int = PLOT_TOP_HASHES) -> pd.Index:
+    """Return the top read hashes by total abundance over all samples.
+
+    :param readtable:  pd.DataFrame of read hash abundance, indexed by sample
+    :param top:  int, number of read hashes to return
+
+    Hashes are ordered by decreasing total abundance; ties are broken by
+    read hash, so the ranking is reproducible.
+    """
+    totals = readtable.groupby("read_hash")["abundance"].sum()
+    return (-totals).sort_values(kind="mergesort").index[:top]
+
+
+def hash_categories(readtable: pd.DataFrame, top: int = PLOT_TOP_HASHES) -> pd.Series:
+    """Return categorical series labelling each row with its hash category.
+
+    :param readtable:  pd.DataFrame of read hash abundance, indexed by sample
+    :param top:  int, number of top read hashes kept as their own category
+
+    Rows for hashes outside the top hashes are labelled OTHER_HASHES. The
+    categories are ordered by rank, with OTHER_HASHES last.
+    """
+    ranked = rank_hashes(readtable, top)
+    labels = readtable["read_hash"].where(
+        readtable["read_hash"].isin(ranked), OTHER_HASHES
+    )
+    return pd.Series(
+        pd.Categorical(labels, categories=list(ranked) + [OTHER_HASHES]),
+        index=readtable.index,
+        name="read_hash",
+    )
+
+
+def sample_totals(readtable: pd.DataFrame) -> pd.DataFrame:
+    """Return total reads and number of read hashes for each sample.
+
+    :param readtable:  pd.DataFrame of read hash abundance, indexed by sample
+    """
+    totals = readtable.groupby(level=0)["abundance"].agg(reads="sum", hashes="size")
+    totals.index.name = "sample_name"
+    return totals
+
+
+def bin_hashes(readtable: pd.DataFrame, top: int = PLOT_TOP_HASHES) -> pd.DataFrame:
+    """Return abundance of the top hashes in each sample, with others binned.
+
+    :param readtable:  pd.DataFrame of read hash abundance, indexed by sample
+    :param top:  int, number of top read hashes kept as their own category
+
+    The returned dataframe is indexed by sample name, with one row for each
+    top hash present in the sample, and one OTHER_HASHES row summing the
+    remaining hashes (if any). The hashes column counts the read hashes in
+    each row, and fraction gives the row's share of the sample's reads.
+    """
+    columns = ["read_hash", "abundance", "hashes", "fraction"]
+    if not len(readtable):
+        return pd.DataFrame(columns=columns, index=pd.Index([], name="sample_name"))
+    categories = hash_categories(readtable, top)
+    binned = (
+        readtable["abundance"]
+        .groupby([readtable.index.rename("sample_name"), categories], observed=False)
+        .agg(abundance="sum", hashes="size")
+        .reset_index(level=1)
+    )
+    binned = binned[binned["hashes"] > 0]
+    return binned.assign(
+        read_hash=binned["read_hash"].astype(str),
+        fraction=binned["abundance"] / sample_totals(readtable)["reads"],
+    )[columns]
+
+
+def hash_quantiles(
+    readtable: pd.DataFrame,
+    top: int = PLOT_TOP_HASHES,
+    quantiles: Sequence[float] = PLOT_QUANTILES,
+) -> pd.DataFrame:
+    """Return quantiles of abundance over samples, for each hash category.
+
+    :param readtable:  pd.DataFrame of read hash abundance, indexed by sample
+    :param top:  int, number of top read hashes kept as their own category
+    :param quantiles:  quantiles of abundance to report, between 0 and 1
+
+    The returned dataframe is indexed by hash category (the top hashes in
+    rank order, then OTHER_HASHES), with the number of sample/hash rows and
+    total abundance in each category, and one column per quantile, named by
+    percentage (e.g. q50 for the median). Quantiles of OTHER_HASHES are taken
+    over every binned sample/hash row.
+    """
+    qcols = [f"q{round(100 * _)}" for _ in quantiles]
+    columns = ["rows", "total"] + qcols
+    if not len(readtable):
+        return pd.DataFrame(columns=columns, index=pd.Index([], name="read_hash"))
+    categories = hash_categories(readtable, top)
+    grouped = readtable["abundance"].groupby(categories, observed=False)
+    summary = grouped.agg(rows="size", total="sum")
+    spread = grouped.quantile(list(quantiles)).unstack()
+    spread.columns = qcols
+    return summary.join(spread)[summary["rows"] > 0][columns]
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""Library API to hash and threshold reads held in memory.
+
+These functions take reads as iterables of sequences or NumPy arrays, and
+return NumPy arrays, so that pymetabc can be embedded in other software
+without writing reads or hashed read files to disk. Reads are hashed with
+the same digest backends, and thresholded with the same rule, as in the
+pipeline, so results match pipeline output.
+
+Digests are held as fixed-width bytes arrays, sorted, with one entry per
+unique sequence.
+"""
+
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Tuple, Union
+
+import numpy as np
+
+from .digest import get_digest_function, to_hex
+
+# Read input: an iterable of str or bytes sequences, a 1D array of str/bytes
+# sequences, or a 2D uint8 array with one fixed-length ASCII sequence per row
+Reads = Union[Iterable[Union[str, bytes]], np.ndarray]
+
+
+class HashedReads(NamedTuple):
+
+    """Unique sequences in a read batch, with their digests and abundances."""
+
+    digests: np.ndarray
+    counts: np.ndarray
+    sequences: np.ndarray
+
+
+def hash_reads(
+    reads: Reads, algorithm: str = "md5", digest_size: int = 16
+) -> HashedReads:
+    """Return digests, abundances and sequences of the unique reads in a batch.
+
+    :param reads:  iterable of read sequences, or NumPy array of sequences
+    :param algorithm:  str, digest algorithm (one of digest.DIGEST_ALGORITHMS)
+    :param digest_size:  int, digest length in bytes (blake2b only)
+
+    Sequences are upper-cased before counting, and only the unique sequences
+    are hashed. Rows of a 2D uint8 array may be padded with trailing zero
+    bytes to hold reads of different lengths.
+    """
+    digest = get_digest_function(algorithm, digest_size)
+    if isinstance(reads, np.ndarray):
+        if reads.ndim == 2 and reads.dtype == np.uint8:
+            reads = np.ascontiguousarray(reads).view(f"S{reads.shape[1]}").ravel()
+        reads = reads.tolist()
+    tally = Counter()  # type: Counter
+    for seq, count in Counter(_.upper() for _ in reads).items():
+        tally[seq.decode("ascii") if isinstance(seq, bytes) else seq] += count
+    sequences, counts = list(tally), list(tally.values())
+
+    width = len(digest(b""))
+    digests = np.array(
+        [digest(_.encode("ascii")) for _ in sequences], dtype=f"S{width}"
+    )
+    order = np.argsort(digests, kind="stable")
+    return HashedReads(
+        digests[order],
+        np.asarray(counts, dtype=np.int64)[order],
+        np.array(sequences, dtype=object)[order],
+    )
+
+
+def merge_hashed_reads(batches: Iterable[HashedReads]) -> HashedReads:
+    """Return the combined unique reads and summed abundances of several batches.
+
+    :param batches:  iterable of HashedReads, hashed with the same algorithm
+    """
+    batches = list(batches)
+    if not batches:
+        raise ValueError("at least one batch of hashed reads is required")
+    digests = np.concatenate([_.digests for _ in batches])
+    counts = np.concatenate([_.counts for _ in batches])
+    sequences = np.concatenate([_.sequences for _ in batches])
+    if not len(digests):
+        return HashedReads(digests, counts, sequences)
+    order = np.argsort(digests, kind="stable")
+    digests, counts, sequences = digests[order], counts[order], sequences[order]
+    starts = np.flatnonzero(np.concatenate(([True], digests[1:] != digests[:-1])))
+    return HashedReads(
+        digests[starts], np.add.reduceat(counts, starts), sequences[starts]
+    )
+
+
+def hash_count_matrix(
+    samples: Dict[str, HashedReads],
+) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """Return sample names, digests, and a sample by digest abundance matrix.
+
+    :param samples:  dictionary of HashedReads, keyed by sample name
+
+    Rows of the matrix are samples, in sorted name order; columns are the
+    sorted union of all samples' digests.
+    """
+    names = sorted(samples)
+    if not names:
+        return names, np.zeros(0, dtype="S16"), np.zeros((0, 0), dtype=np.int64)
+    digests = np.unique(np.concatenate([samples[_].digests for _ in names]))
+    matrix = np.zeros((len(names), len(digests)), dtype=np.int64)
+    for row, name in enumerate(names):
+        cols = np.searchsorted(digests, samples[name].digests)
+        matrix[row, cols] = samples[name].counts
+    return names, digests, matrix
+
+
+def threshold_counts(counts: np.ndarray, cutoff: int) -> np.ndarray:
+    """Return a copy of an abundance array with counts at or below cutoff zeroed.
+
+    :param counts:  NumPy array of abundances (e.g. HashedReads.counts, or a
+                    matrix from hash_count_matrix())
+    :param cutoff:  int, hard abundance threshold
+
+    As with the pipeline's cutoff threshold, only abundances strictly greater
+    than the cutoff are kept.
+    """
+    return np.where(counts > cutoff, counts, 0)
+
+
+def hex_digests(digests: np.ndarray) -> List[str]:
+    """Return hexadecimal strings for a fixed-width bytes array of digests.
+
+    :param digests:  fixed-width bytes array of binary digests
+    """
+    width = digests.dtype.itemsize
+    return [to_hex(_.tobytes()) for _ in digests.view(f"V{width}")]
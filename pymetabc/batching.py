@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""Module to process several input directories in a single pipeline run.
+
+A batch manifest is a tab-separated file with one input directory and one
+output directory per line; blank lines and lines starting with # are
+ignored. Each input directory (e.g. one sequencing plate) keeps its own
+output directory, but the trimming, merging and hashing of samples from all
+input directories are scheduled together on one shared pool of worker
+processes, so that workers are not left idle between input directories.
+"""
+
+import copy
+
+from argparse import Namespace
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Generator, List, NamedTuple, Tuple
+
+import pandas as pd
+
+from . import flash, hashing, io, scratch, trimmomatic
+from .manifest import SampleRecord
+
+
+class BatchEntry(NamedTuple):
+
+    """Input and output directory for one member of a batch."""
+
+    indir: Path
+    outdir: Path
+
+
+def read_batch_manifest(fpath: Path) -> List[BatchEntry]:
+    """Return list of input and output directory pairs from a batch manifest.
+
+    :param fpath:  Path to tab-separated batch manifest
+
+    Relative paths are taken as relative to the current directory. A
+    ValueError is raised if a line does not hold exactly two paths, or if
+    an output directory is given more than once.
+    """
+    entries = []
+    with fpath.open("r") as ifh:
+        for lineno, line in enumerate(ifh, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            fields = line.split("\t")
+            if len(fields) != 2:
+                raise ValueError(
+                    f"{fpath} line {lineno}: expected input and output "
+                    f"directories separated by a tab, got {line!r}"
+                )
+            entries.append(BatchEntry(Path(fields[0]), Path(fields[1])))
+    outdirs = [_.outdir.resolve() for _ in entries]
+    if len(set(outdirs)) != len(outdirs):
+        raise ValueError(f"{fpath}: output directories must be unique")
+    return entries
+
+
+def entry_namespace(args: Namespace, entry: BatchEntry) -> Namespace:
+    """Return copy of the run's arguments, for one member of a batch.
+
+    :param args:  Namespace of command-line arguments
+    :param entry:  BatchEntry giving the input and output directory
+    """
+    entry_args = copy.copy(args)
+    entry_args.indir, entry_args.outdir = entry.indir, entry.outdir
+    return entry_args
+
+
+def worker_namespace(args: Namespace, workers: int) -> Namespace:
+    """Return copy of arguments for samples processed in a worker pool.
+
+    :param args:  Namespace of arguments for the sample's batch member
+    :param workers:  int, number of worker processes
+
+    The threads given to trimmomatic and flash are divided between workers,
+    and per-sample progress bars are disabled.
+    """
+    worker_args = copy.copy(args)
+    worker_args.threads = max(1, args.threads // workers)
+    worker_args.disable_tqdm = True
+    return worker_args
+
+
+def process_sample(sample: SampleRecord, args: Namespace) -> SampleRecord:
+    """Trim, merge and hash reads for a single sample.
+
+    :param sample:  SampleRecord for the sample
+    :param args:  Namespace of arguments for the sample's batch member, with
+                  output directories set
+
+    Returns the SampleRecord, updated as by the trimming, merging and hashing
+    stages.
+    """
+    sample.trimmed_dir = next(io.add_sample_subdirs([sample], args.trimdir))
+    sample.merged_dir = next(io.add_sample_subdirs([sample], args.mergedir))
+    if args.scratch is not None:
+        return scratch.process_sample_in_scratch(sample, args)
+    trimmomatic.run_trimmomatic([sample], args)
+    trimmomatic.collect_trimmomatic_summaries([sample])
+    flash.run_flash([sample], args)
+    readfile, qcfile, total, filter_stats = next(
+        hashing.add_hashed_reads([sample], args)
+    )
+    sample.hashed_reads, sample.hashed_total = readfile, total
+    sample.filter_stats = filter_stats
+    sample.read_qc = qcfile
+    return sample
+
+
+def process_batch_samples(
+    jobs: List[Tuple[SampleRecord, Namespace]], workers: int = 1
+) -> Generator:
+    """Trim, merge and hash reads for samples from all members of a batch.
+
+    :param jobs:  List of (SampleRecord, Namespace) tuples, one per sample,
+                  with the arguments for the sample's batch member
+    :param workers:  int, number of worker processes
+
+    Yields (index, SampleRecord) for each job, in order of completion, where
+    index is the job's position in the passed list. As samples are processed
+    in other processes, the yielded SampleRecords are updated copies of
+    those passed.
+    """
+    if workers == 1:
+        for idx, (sample, args) in enumerate(jobs):
+            yield idx, process_sample(sample, args)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(process_sample, sample, args): idx
+            for idx, (sample, args) in enumerate(jobs)
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def combine_read_accounting(
+    outdirs: List[Path], table_format: str = "tsv"
+) -> pd.DataFrame:
+    """Return pd.DataFrame of read accounting for all members of a batch.
+
+    :param outdirs:  List of Paths to batch members' output directories
+    :param table_format:  str, format of the output tables
+
+    Each member's 05_read_accounting table is read, and an outdir column
+    added to identify the member.
+    """
+    tables = []
+    for outdir in outdirs:
+        table = io.read_table(
+            io.table_path(outdir, "05_read_accounting", table_format), table_format
+        )
+        table.insert(0, "outdir", str(outdir))
+        tables.append(table)
+    return pd.concat(tables)
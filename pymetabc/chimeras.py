@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+"""Module to flag and remove chimeric sequences from thresholded reads.
+
+Chimeras are detected de novo, within each sample, on the unique sequences
+that survived thresholding. Sequences are considered in decreasing order of
+abundance, and a sequence may only be explained by parents at least
+abskew times more abundant than itself that were not themselves flagged.
+
+Candidate parents are found with an index of the k-mers in accepted parent
+sequences: the parents sharing most k-mers with the left half of a query
+are tried as the left parent, and those sharing most with the right half
+as the right parent, so there is no all-pairs alignment. For each pair of
+candidates, the query is compared (without gaps) to the left parent from
+its start and to the right parent from its end, and the best breakpoint
+found. A query is flagged as chimeric if the two-parent model has at least
+min_diffs fewer differences than the closest single candidate parent.
+"""
+
+from argparse import Namespace
+from bisect import bisect_right
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+from typing import List, NamedTuple, Tuple
+
+import numpy as np
+import pandas as pd
+
+from Bio.Seq import Seq
+from Bio.SeqRecord import SeqRecord
+from tqdm import tqdm
+
+from .hashing import hashed_reads_to_rows
+from .io import (
+    READ_TABLE_DTYPES,
+    TableWriter,
+    read_hashed_reads,
+    table_path,
+    write_hashed_reads,
+)
+from .manifest import SampleRecord
+
+# Length of k-mers used to index candidate parents
+KMER_LENGTH = 8
+
+# Number of candidate parents tried for each half of a query sequence
+MAX_CANDIDATES = 4
+
+# Minimum number of bases each parent must contribute to a chimera
+MIN_SEGMENT = 20
+
+CHIMERA_TABLE_DTYPES = {
+    "sample_name": str,
+    "read_hash": str,
+    "abundance": "int64",
+    "parent_a": str,
+    "parent_b": str,
+    "breakpoint": "int64",
+    "diffs": "int64",
+    "parent_diffs": "int64",
+}
+
+
+class ChimeraHit(NamedTuple):
+
+    """A sequence flagged as chimeric, with its most likely parents.
+
+    The first breakpoint bases of the sequence are explained by parent_a and
+    the rest by parent_b, with diffs differences in total; parent_diffs is
+    the number of differences from the closest single candidate parent.
+    """
+
+    read_hash: str
+    abundance: int
+    parent_a: str
+    parent_b: str
+    breakpoint: int
+    diffs: int
+    parent_diffs: int
+
+
+class KmerIndex:
+
+    """Index of sequences by the k-mers they contain."""
+
+    __slots__ = ("k", "_postings")
+
+    def __init__(self, k: int = KMER_LENGTH) -> None:
+        """Create an empty index.
+
+        :param k:  int, k-mer length
+        """
+        self.k = k
+        self._postings = defaultdict(list)  # k-mer -> sequence identifiers
+
+    def add(self, idx: int, seq: str) -> None:
+        """Add a sequence to the index.
+
+        :param idx:  int, identifier for the sequence
+        :param seq:  str, sequence to index
+        """
+        for kmer in self._kmers(seq):
+            self._postings[kmer].append(idx)
+
+    def top_hits(self, seq: str, count: int, limit: int) -> List[int]:
+        """Return identifiers of the indexed sequences sharing most k-mers.
+
+        :param seq:  str, query sequence
+        :param count:  int, maximum number of identifiers to return
+        :param limit:  int, only sequences with identifiers below limit are
+                       considered
+        """
+        hits = Counter()  # type: Counter
+        for kmer in self._kmers(seq):
+            hits.update(_ for _ in self._postings.get(kmer, ()) if _ < limit)
+        return [idx for idx, _ in hits.most_common(count)]
+
+    def _kmers(self, seq: str) -> set:
+        """Return the set of k-mers in a sequence."""
+        return {seq[_ : _ + self.k] for _ in range(len(seq) - self.k + 1)}
+
+
+def find_chimeras(
+    reads: List[Tuple[str, int, str]], abskew: float = 2.0, min_diffs: int = 3
+) -> List[ChimeraHit]:
+    """Return ChimeraHits for chimeric sequences among one sample's reads.
+
+    :param reads:  List of (read hash, abundance, sequence) tuples
+    :param abskew:  float, minimum abundance of a parent, relative to the query
+    :param min_diffs:  int, minimum improvement in differences of the
+                       two-parent model over the closest single parent
+    """
+    index = KmerIndex()
+    parents = []  # type: List[Tuple[str, np.ndarray]]
+    neg_abundances = []  # type: List[int]
+    hits = []
+    for rhash, abundance, seq in sorted(reads, key=lambda _: -_[1]):
+        query = _encode(seq)
+        limit = bisect_right(neg_abundances, -abskew * abundance)
+        half = len(seq) // 2
+        left = index.top_hits(seq[:half], MAX_CANDIDATES, limit)
+        right = index.top_hits(seq[half:], MAX_CANDIDATES, limit)
+        if left and right:
+            parent_diffs = min(
+                _ungapped_diffs(query, parents[_][1]) for _ in set(left + right)
+            )
+            best = None
+            for pidx_a in left:
+                for pidx_b in right:
+                    if pidx_a == pidx_b:
+                        continue
+                    breakpoint, diffs = _chimera_diffs(
+                        query, parents[pidx_a][1], parents[pidx_b][1]
+                    )
+                    if best is None or diffs < best[3]:
+                        best = (pidx_a, pidx_b, breakpoint, diffs)
+            if best is not None and best[3] + min_diffs <= parent_diffs:
+                hits.append(
+                    ChimeraHit(
+                        rhash,
+                        abundance,
+                        parents[best[0]][0],
+                        parents[best[1]][0],
+                        best[2],
+                        int(best[3]),
+                        parent_diffs,
+                    )
+                )
+                continue
+        index.add(len(parents), seq)
+        parents.append((rhash, query))
+        neg_abundances.append(-abundance)
+    return hits
+
+
+def filter_chimeras(
+    readfile: Path, ofname: Path, abskew: float = 2.0, min_diffs: int = 3
+) -> Tuple[List[ChimeraHit], List[Tuple]]:
+    """Write the non-chimeric reads in a hashed read file to a new file.
+
+    :param readfile:  Path to input hashed read FASTA file
+    :param ofname:  Path to output hashed read FASTA file
+    :param abskew:  float, minimum abundance of a parent, relative to the query
+    :param min_diffs:  int, minimum improvement in differences of the
+                       two-parent model over the closest single parent
+
+    Returns a list of ChimeraHits for the flagged reads, and a list of
+    (sample name, read hash, abundance) rows for the reads written.
+    """
+    records = list(read_hashed_reads(readfile))
+    reads = [(rhash, abundance, seq.upper()) for rhash, abundance, seq in records]
+    hits = find_chimeras(reads, abskew, min_diffs)
+    flagged = {_.read_hash for _ in hits}
+    kept = [
+        SeqRecord(Seq(seq), id=f"{rhash}_{abundance}", description="")
+        for rhash, abundance, seq in records
+        if rhash not in flagged
+    ]
+    write_hashed_reads(kept, ofname)
+    return hits, hashed_reads_to_rows(kept, ofname)
+
+
+def remove_chimeras(samples: List[SampleRecord], args: Namespace) -> pd.DataFrame:
+    """Remove chimeras from each sample's thresholded reads.
+
+    :param samples:  List of SampleRecords, one per sample
+    :param args:  Namespace of parsed command-line options
+
+    Non-chimeric reads for each sample are written to a FASTA file under
+    args.chimeradir, and their abundances to the table 05_nonchimeric_reads.
+    Samples are processed in parallel on args.threads worker processes.
+
+    Returns pd.DataFrame of flagged chimeras, one row per sample and hash.
+    """
+    readfiles = [Path(_.thresholded_reads) for _ in samples]
+    ofnames = [args.chimeradir / _.name for _ in readfiles]
+    workers = max(1, min(args.threads, len(readfiles)))
+    jobs = (
+        readfiles,
+        ofnames,
+        repeat(args.chimera_abskew),
+        repeat(args.chimera_min_diffs),
+    )
+    if workers == 1:
+        results = map(filter_chimeras, *jobs)
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = executor.map(filter_chimeras, *jobs)
+
+    rows = []
+    try:
+        with TableWriter(
+            table_path(args.outdir, "05_nonchimeric_reads", args.table_format),
+            args.table_format,
+            READ_TABLE_DTYPES,
+        ) as writer:
+            for readfile, (hits, kept) in zip(
+                readfiles,
+                tqdm(results, total=len(readfiles), disable=args.disable_tqdm),
+            ):
+                fstem = readfile.stem.split("_")[0]
+                rows.extend((fstem,) + tuple(_) for _ in hits)
+                writer.write(
+                    pd.DataFrame(
+                        kept, columns=["sample_name", "read_hash", "abundance"]
+                    ).set_index("sample_name")
+                )
+    finally:
+        if workers > 1:
+            executor.shutdown()
+    return pd.DataFrame(rows, columns=list(CHIMERA_TABLE_DTYPES)).set_index(
+        "sample_name"
+    )
+
+
+def _encode(seq: str) -> np.ndarray:
+    """Return sequence as an array of ASCII codes."""
+    return np.frombuffer(seq.encode("ascii"), dtype=np.uint8)
+
+
+def _ungapped_diffs(query: np.ndarray, parent: np.ndarray) -> int:
+    """Return differences between two sequences compared without gaps.
+
+    The sequences are compared aligned at their starts and at their ends,
+    and the better alignment is used; any difference in length is counted.
+    """
+    overlap = min(len(query), len(parent))
+    extra = abs(len(query) - len(parent))
+    start = np.count_nonzero(query[:overlap] != parent[:overlap])
+    end = np.count_nonzero(
+        query[len(query) - overlap :] != parent[len(parent) - overlap :]
+    )
+    return int(min(start, end) + extra)
+
+
+def _chimera_diffs(
+    query: np.ndarray, parent_a: np.ndarray, parent_b: np.ndarray
+) -> Tuple[int, float]:
+    """Return best breakpoint, and differences, of a two-parent chimera model.
+
+    The query's prefix is compared with parent_a from the start, and its
+    suffix with parent_b from the end. Breakpoints leaving either parent
+    fewer than MIN_SEGMENT bases are not considered.
+    """
+    qlen = len(query)
+    # left[i]: differences between query[:i] and parent_a[:i]
+    left = np.full(qlen + 1, np.inf)
+    overlap = min(qlen, len(parent_a))
+    left[0] = 0
+    left[1 : overlap + 1] = np.cumsum(query[:overlap] != parent_a[:overlap])
+    # right[i]: differences between query[i:] and the same length of parent_b's end
+    right = np.full(qlen + 1, np.inf)
+    overlap = min(qlen, len(parent_b))
+    right[qlen] = 0
+    mismatches = query[qlen - overlap :] != parent_b[len(parent_b) - overlap :]
+    right[qlen - overlap : qlen] = np.cumsum(mismatches[::-1])[::-1]
+    total = (left + right)[MIN_SEGMENT : qlen - MIN_SEGMENT + 1]
+    if not len(total):
+        return (0, np.inf)
+    best = int(np.argmin(total))
+    return (best + MIN_SEGMENT, float(total[best]))
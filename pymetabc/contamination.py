@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""Module to remove contamination seen in negative control samples.
+
+The hashed (unthresholded) reads of the control samples (e.g. extraction
+blanks, PCR and index negatives, machine blanks) are combined into a
+control profile: an index of the read hashes seen in any control, sorted
+so they can be looked up with np.searchsorted, with a contamination level
+for each hash. The level is the given percentile of the hash's abundance
+across all controls (counting controls in which it is absent as zero).
+
+The thresholded reads of the other samples are arranged as a sample by
+hash abundance matrix, and the level of each hash is subtracted from its
+column ("subtract" mode), or abundances at or below the level are set to
+zero ("flag" mode), in a single vectorised operation.
+"""
+
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import List, NamedTuple, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .hashing import hashed_file_to_rows
+from .manifest import SampleRecord
+
+# Ways of removing contamination from sample abundances
+CONTROL_MODES = ("subtract", "flag")
+
+
+class ControlProfile(NamedTuple):
+
+    """Contamination level and prevalence for each hash seen in controls.
+
+    hashes are sorted; levels[i] and prevalence[i] (the number of controls
+    containing the hash) refer to hashes[i].
+    """
+
+    hashes: np.ndarray
+    levels: np.ndarray
+    prevalence: np.ndarray
+
+
+def find_controls(
+    samples: List[SampleRecord], patterns: List[str]
+) -> List[SampleRecord]:
+    """Return the samples whose names match any of the passed patterns.
+
+    :param samples:  List of SampleRecords, one per sample
+    :param patterns:  List of sample names or glob patterns (e.g. "EB_*")
+    """
+    return [_ for _ in samples if any(fnmatch(_.sample_name, pat) for pat in patterns)]
+
+
+def read_control_abundances(controls: List[SampleRecord]) -> pd.DataFrame:
+    """Return pd.DataFrame of read hash abundances in the controls' hashed reads.
+
+    :param controls:  List of SampleRecords for the control samples
+
+    Rows are (sample_name, read_hash, abundance), with sample names taken
+    from the hashed read filenames as in the thresholded read table.
+    """
+    rows = []
+    for control in controls:
+        rows.extend(hashed_file_to_rows(Path(control.hashed_reads)))
+    return pd.DataFrame(
+        rows, columns=["sample_name", "read_hash", "abundance"]
+    ).set_index("sample_name")
+
+
+def hash_matrix(readtable: pd.DataFrame) -> pd.DataFrame:
+    """Return sample by hash abundance matrix from a read hash abundance table.
+
+    :param readtable:  pd.DataFrame of read_hash and abundance, indexed by
+                       sample_name (e.g. 05_thresholded_reads)
+
+    Columns (read hashes) are sorted; absent hashes have zero abundance.
+    """
+    if readtable.empty:
+        return pd.DataFrame(index=pd.Index([], name="sample_name"), dtype=np.int64)
+    matrix = readtable.reset_index().pivot_table(
+        index="sample_name",
+        columns="read_hash",
+        values="abundance",
+        aggfunc="sum",
+        fill_value=0,
+    )
+    matrix.columns.name = None
+    return matrix.astype(np.int64)
+
+
+def build_control_profile(
+    readtable: pd.DataFrame, percentile: float = 0.95
+) -> ControlProfile:
+    """Return ControlProfile of the hashes in the controls' read table.
+
+    :param readtable:  pd.DataFrame of control read hash abundances, from
+                       read_control_abundances()
+    :param percentile:  float, quantile of each hash's abundance across
+                        controls used as its contamination level
+    """
+    if not 0 <= percentile <= 1:
+        raise ValueError(f"percentile must be between 0 and 1, got {percentile}")
+    if readtable.empty:
+        return ControlProfile(
+            np.array([], dtype=object), np.zeros(0), np.zeros(0, dtype=np.int64)
+        )
+    matrix = hash_matrix(readtable)
+    return ControlProfile(
+        matrix.columns.values.astype(object),
+        np.quantile(matrix.values, percentile, axis=0),
+        np.count_nonzero(matrix.values, axis=0),
+    )
+
+
+def profile_levels(profile: ControlProfile, hashes: np.ndarray) -> np.ndarray:
+    """Return contamination level for each passed hash (zero if not in controls).
+
+    :param profile:  ControlProfile for the control samples
+    :param hashes:  array of read hashes to look up
+    """
+    if not len(profile.hashes):
+        return np.zeros(len(hashes))
+    pos = np.searchsorted(profile.hashes, hashes).clip(0, len(profile.hashes) - 1)
+    return np.where(profile.hashes[pos] == hashes, profile.levels[pos], 0)
+
+
+def remove_contamination(
+    matrix: pd.DataFrame, profile: ControlProfile, mode: str = "subtract"
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Return cleaned abundance matrix, and per-sample contamination report.
+
+    :param matrix:  pd.DataFrame of sample by hash abundances, from hash_matrix()
+    :param profile:  ControlProfile for the control samples
+    :param mode:  str, "subtract" to subtract each hash's contamination level
+                  (rounded up) from its abundance, or "flag" to zero
+                  abundances at or below the contamination level
+
+    The report gives, for each sample, the reads and hashes before cleaning,
+    the reads removed, and the number of hashes that were reduced (flagged).
+    """
+    if mode not in CONTROL_MODES:
+        raise ValueError(f"mode must be one of {CONTROL_MODES}, got {mode!r}")
+    values = matrix.values
+    levels = profile_levels(profile, matrix.columns.values.astype(object))
+    if mode == "subtract":
+        cleaned = np.maximum(values - np.ceil(levels).astype(np.int64), 0)
+    else:
+        cleaned = np.where(values <= levels, 0, values)
+    flagged = (cleaned < values).sum(axis=1)
+    report = pd.DataFrame(
+        {
+            "reads": values.sum(axis=1),
+            "hashes": np.count_nonzero(values, axis=1),
+            "reads_removed": (values - cleaned).sum(axis=1),
+            "hashes_flagged": flagged,
+            "hashes_removed": np.count_nonzero(values, axis=1)
+            - np.count_nonzero(cleaned, axis=1),
+        },
+        index=matrix.index,
+    )
+    report["fraction_removed"] = report["reads_removed"] / report["reads"].where(
+        report["reads"] > 0
+    )
+    return pd.DataFrame(cleaned, index=matrix.index, columns=matrix.columns), report
+
+
+def profile_table(profile: ControlProfile) -> pd.DataFrame:
+    """Return pd.DataFrame of contamination level and prevalence by hash.
+
+    :param profile:  ControlProfile for the control samples
+    """
+    return pd.DataFrame(
+        {
+            "read_hash": profile.hashes,
+            "level": profile.levels,
+            "prevalence": profile.prevalence,
+        }
+    ).set_index("read_hash")
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""Module providing digest backends for identifying unique reads.
+
+Digests are computed and handled as raw bytes, and converted to hexadecimal
+strings only when written to output. The "md5" backend reproduces the read
+identifiers used by earlier versions of pymetabc.
+"""
+
+import hashlib
+
+from functools import partial
+from typing import Callable
+
+try:
+    import xxhash  # type: ignore
+except ImportError:
+    xxhash = None  # pylint: disable=invalid-name
+
+DIGEST_ALGORITHMS = ("md5", "blake2b", "xxh64", "xxh128")
+
+
+def get_digest_function(
+    algorithm: str = "md5", digest_size: int = 16
+) -> Callable[[bytes], bytes]:
+    """Return a function that computes the binary digest of a sequence.
+
+    :param algorithm:  str, name of digest algorithm (one of DIGEST_ALGORITHMS)
+    :param digest_size:  int, digest length in bytes (blake2b only; 1-64)
+
+    The md5, xxh64 and xxh128 digests have fixed lengths of 16, 8 and 16
+    bytes. The xxh64 and xxh128 digests require the optional xxhash package.
+    """
+    if algorithm == "md5":
+        return _md5_digest
+    if algorithm == "blake2b":
+        if not 0 < digest_size <= hashlib.blake2b.MAX_DIGEST_SIZE:
+            raise ValueError(
+                f"blake2b digest size must be between 1 and "
+                f"{hashlib.blake2b.MAX_DIGEST_SIZE} bytes (got {digest_size})"
+            )
+        return partial(_blake2b_digest, digest_size=digest_size)
+    if algorithm in ("xxh64", "xxh128"):
+        if xxhash is None:
+            raise ImportError(f"the xxhash package is required for {algorithm} digests")
+        return getattr(xxhash, f"{algorithm}_digest")
+    raise ValueError(
+        f"unknown digest algorithm {algorithm} "
+        f"(expected one of {', '.join(DIGEST_ALGORITHMS)})"
+    )
+
+
+def to_hex(digest: bytes) -> str:
+    """Return hexadecimal string representation of a binary digest.
+
+    :param digest:  bytes, binary digest
+    """
+    return digest.hex()
+
+
+def from_hex(hexdigest: str) -> bytes:
+    """Return binary digest from its hexadecimal string representation.
+
+    :param hexdigest:  str, hexadecimal digest
+    """
+    return bytes.fromhex(hexdigest)
+
+
+def _blake2b_digest(data: bytes, digest_size: int) -> bytes:
+    """Return blake2b digest of data, with the passed length in bytes."""
+    return hashlib.blake2b(data, digest_size=digest_size).digest()
+
+
+def _md5_digest(data: bytes) -> bytes:
+    """Return MD5 digest of data."""
+    return hashlib.md5(data).digest()
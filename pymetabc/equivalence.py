@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""Module to check that optimised pipeline modes reproduce reference output.
+
+The pipeline is run on the same input once in the reference mode (a single
+thread, with stages run in turn), and once in each optimised mode (several
+threads, scratch space, or a batch worker pool). Each run is a separate
+process, so that runs share no state, and its wall-clock time is recorded.
+
+The output of each mode is compared exactly with that of the reference run:
+
+- the table 05_thresholded_reads.tab, with rows sorted by sample and hash
+- the contents of every hashed (04_hashed) and thresholded (05_thresholded)
+  read file
+- every sample's trimmomatic summary (02_trimmed/<sample>/summary.txt)
+
+Synthetic input, with known sequences and abundances, can be written with
+write_synthetic_input().
+"""
+
+import filecmp
+import gzip
+import shutil
+import subprocess
+import sys
+import time
+
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from .io import READ_TABLE_DTYPES, read_table, table_path
+
+# Extra command-line options for each mode; "{scratch}" is replaced with the
+# path to a scratch directory. The "batch" mode is run from a batch manifest.
+EQUIVALENCE_MODES = {
+    "reference": ["-t", "1"],
+    "threads": ["-t", "4"],
+    "scratch": ["-t", "4", "--scratch", "{scratch}"],
+    "batch": ["-t", "4", "--batch_workers", "2"],
+}
+
+# Output files compared exactly, as glob patterns relative to the output root
+COMPARED_FILES = (
+    "04_hashed/*.fasta",
+    "05_thresholded/*.fasta",
+    "02_trimmed/*/summary.txt",
+)
+
+# Runs pymetabc's command-line entry point in a new interpreter
+_RUN_MAIN = (
+    "import sys; from pymetabc.scripts.pymetabc import run_main; sys.exit(run_main())"
+)
+
+
+class ModeResult(NamedTuple):
+
+    """Outcome of running the pipeline in one mode.
+
+    differences is empty if the mode's output matched the reference output.
+    """
+
+    mode: str
+    outdir: Path
+    seconds: float
+    differences: List[str]
+
+
+def mode_command(
+    mode: str,
+    indir: Path,
+    outdir: Path,
+    workdir: Path,
+    extra_args: Iterable[str] = (),
+) -> List[str]:
+    """Return pymetabc command-line arguments to run the pipeline in a mode.
+
+    :param mode:  str, one of EQUIVALENCE_MODES
+    :param indir:  Path to input directory of sample subdirectories
+    :param outdir:  Path to output directory
+    :param workdir:  Path to directory for scratch space and batch manifests
+    :param extra_args:  further command-line options, passed to every mode
+    """
+    if mode not in EQUIVALENCE_MODES:
+        raise ValueError(
+            f"mode must be one of {tuple(EQUIVALENCE_MODES)}, got {mode!r}"
+        )
+    options = [
+        _.replace("{scratch}", str(workdir / "scratch"))
+        for _ in EQUIVALENCE_MODES[mode]
+    ]
+    if mode == "batch":
+        manifest = workdir / f"{outdir.name}.batch"
+        manifest.write_text(f"{indir.resolve()}\t{outdir.resolve()}\n")
+        return [*options, *extra_args, "--batch", str(manifest)]
+    return [str(indir), str(outdir), *options, *extra_args]
+
+
+def run_modes(
+    indir: Path,
+    workdir: Path,
+    modes: Optional[Iterable[str]] = None,
+    extra_args: Iterable[str] = (),
+) -> List[ModeResult]:
+    """Run the pipeline in each mode, and compare outputs with the reference.
+
+    :param indir:  Path to input directory of sample subdirectories
+    :param workdir:  Path to directory holding one output directory per mode
+    :param modes:  modes to run (default: all EQUIVALENCE_MODES); the
+                   reference mode is always run, first
+    :param extra_args:  further command-line options, passed to every mode
+
+    A subprocess.CalledProcessError is raised if the reference run fails;
+    the failure of any other mode is reported as a difference.
+    """
+    modes = ["reference"] + [
+        _ for _ in (modes or EQUIVALENCE_MODES) if _ != "reference"
+    ]
+    workdir.mkdir(parents=True, exist_ok=True)
+    (workdir / "scratch").mkdir(exist_ok=True)
+    extra_args = [str(_) for _ in extra_args]
+    results = []
+    for mode in modes:
+        outdir = workdir / mode
+        shutil.rmtree(outdir, ignore_errors=True)
+        cmd = [sys.executable, "-c", _RUN_MAIN]
+        cmd.extend(mode_command(mode, indir, outdir, workdir, extra_args))
+        time0 = time.perf_counter()
+        result = subprocess.run(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False
+        )
+        seconds = time.perf_counter() - time0
+        if mode == "reference":
+            result.check_returncode()
+            differences = []  # type: List[str]
+        elif result.returncode:
+            stderr = result.stderr.decode("utf-8", errors="replace").strip()
+            differences = [
+                f"run failed with exit code {result.returncode}: "
+                f"{stderr.splitlines()[-1] if stderr else ''}"
+            ]
+        else:
+            differences = compare_outputs(workdir / "reference", outdir)
+        results.append(ModeResult(mode, outdir, seconds, differences))
+    return results
+
+
+def compare_outputs(refdir: Path, outdir: Path) -> List[str]:
+    """Return descriptions of differences between two pipeline output directories.
+
+    :param refdir:  Path to reference output directory
+    :param outdir:  Path to output directory to check
+
+    The thresholded read table is compared after sorting its rows by sample
+    and hash; read files and trimmomatic summaries are compared byte for byte.
+    """
+    differences = []
+    tables = []
+    for root in (refdir, outdir):
+        fname = table_path(root, "05_thresholded_reads")
+        if not fname.is_file():
+            differences.append(f"{fname} is missing")
+            continue
+        table = read_table(fname, dtypes=READ_TABLE_DTYPES).reset_index()
+        tables.append(
+            table.sort_values(["sample_name", "read_hash"]).reset_index(drop=True)
+        )
+    if len(tables) == 2 and not tables[0].equals(tables[1]):
+        differences.append(
+            f"05_thresholded_reads.tab differs ({len(tables[0])} reference rows, "
+            f"{len(tables[1])} rows)"
+        )
+    for pattern in COMPARED_FILES:
+        reffiles = {_.relative_to(refdir) for _ in refdir.glob(pattern)}
+        outfiles = {_.relative_to(outdir) for _ in outdir.glob(pattern)}
+        differences.extend(f"{_} is missing" for _ in sorted(reffiles - outfiles))
+        differences.extend(f"{_} is unexpected" for _ in sorted(outfiles - reffiles))
+        differences.extend(
+            f"{_} differs"
+            for _ in sorted(reffiles & outfiles)
+            if not filecmp.cmp(refdir / _, outdir / _, shallow=False)
+        )
+    return differences
+
+
+def timing_table(results: List[ModeResult]) -> pd.DataFrame:
+    """Return pd.DataFrame of run time and equivalence by mode.
+
+    :param results:  List of ModeResults from run_modes()
+
+    Speedup is relative to the reference run.
+    """
+    reference = next(_ for _ in results if _.mode == "reference")
+    return pd.DataFrame(
+        {
+            "seconds": [_.seconds for _ in results],
+            "speedup": [reference.seconds / _.seconds for _ in results],
+            "equivalent": [not _.differences for _ in results],
+            "differences": [len(_.differences) for _ in results],
+        },
+        index=pd.Index([_.mode for _ in results], name="mode"),
+    )
+
+
+def write_synthetic_input(
+    indir: Path,
+    samples: int = 4,
+    templates: int = 20,
+    reads: int = 1000,
+    amplicon_length: int = 250,
+    read_length: int = 150,
+    error_rate: float = 0.002,
+    seed: int = 0,
+) -> Dict[str, np.ndarray]:
+    """Write paired-end reads of random amplicons, laid out as pipeline input.
+
+    :param indir:  Path to input directory to create
+    :param samples:  int, number of samples
+    :param templates:  int, number of distinct amplicon sequences
+    :param reads:  int, number of read pairs per sample
+    :param amplicon_length:  int, length of each amplicon
+    :param read_length:  int, length of each read (reads overlap if this is
+                         more than half the amplicon length)
+    :param error_rate:  float, probability of a substitution at each base
+    :param seed:  int, random seed; the same seed writes identical reads
+
+    Each sample draws its reads from the amplicons in different proportions.
+    Returns the number of read pairs drawn from each amplicon, by sample name.
+    """
+    rng = np.random.default_rng(seed)
+    bases = np.frombuffer(b"ACGT", dtype=np.uint8)
+    complement = bytes.maketrans(b"ACGT", b"TGCA")
+    amplicons = rng.choice(bases, (templates, amplicon_length))
+    quality = b"I" * read_length
+    counts = {}
+    for sidx in range(1, samples + 1):
+        name = f"Synth-{sidx}"
+        sample_dir = indir / f"Synth_{sidx}_L001-ds.{seed:08x}"
+        sample_dir.mkdir(parents=True, exist_ok=True)
+        drawn = rng.choice(templates, reads, p=rng.dirichlet(np.full(templates, 0.5)))
+        seqs = amplicons[drawn]
+        errors = rng.random(seqs.shape) < error_rate
+        seqs[errors] = rng.choice(bases, int(errors.sum()))
+        paths = [sample_dir / f"{name}_S{sidx}_L001_R{_}_001.fastq.gz" for _ in (1, 2)]
+        with gzip.open(paths[0], "wb") as fwd, gzip.open(paths[1], "wb") as rev:
+            for ridx, seq in enumerate(seqs):
+                seq = seq.tobytes()
+                header = f"@{name}:{ridx} ".encode("ascii")
+                fwd.write(
+                    header + b"1\n" + seq[:read_length] + b"\n+\n" + quality + b"\n"
+                )
+                rev.write(
+                    header
+                    + b"2\n"
+                    + seq[-read_length:][::-1].translate(complement)
+                    + b"\n+\n"
+                    + quality
+                    + b"\n"
+                )
+        counts[name] = np.bincount(drawn, minlength=templates)
+    return counts
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""Module to emit structured progress events, as JSON lines.
+
+Events report the start and end of each pipeline stage, the completion of
+each sample within a stage, and the counts and timings that go with them,
+for workflow dashboards and orchestration tools. Each event is a JSON
+object on its own line, with at least an "event" name and a Unix "time".
+
+Events are written to a file, or to a TCP (tcp://host:port) or Unix
+(unix:///path) socket. Emitting an event only places it on a queue; a
+background thread writes queued events in batches, so that a slow or
+unresponsive reader never blocks the pipeline. If the output fails (e.g.
+the reader closes its socket), further events are discarded.
+
+A single stream is active in each process, set with set_stream(), and
+events are sent to it with emit() and stage(). Until a stream is set, and
+in worker processes, events are discarded.
+"""
+
+import json
+import os
+import socket
+import time
+
+from contextlib import contextmanager
+from pathlib import Path
+from queue import Queue
+from threading import Thread
+from typing import Any, Dict, Generator, Optional, TextIO
+
+
+class EventStream:
+
+    """Queue of events written as JSON lines by a background thread."""
+
+    __slots__ = ("_ofh", "_queue", "_thread", "_pid")
+
+    def __init__(self, ofh: Optional[TextIO] = None) -> None:
+        """Start writing events to the passed text stream.
+
+        :param ofh:  text stream for output; if None, events are discarded
+        """
+        self._ofh = ofh
+        self._pid = os.getpid()
+        self._queue = None  # type: Optional[Queue]
+        self._thread = None  # type: Optional[Thread]
+        if ofh is not None:
+            self._queue = Queue()
+            self._thread = Thread(target=self._write, name="pymetabc-events")
+            self._thread.daemon = True
+            self._thread.start()
+
+    def emit(self, event: str, **fields: Any) -> None:
+        """Queue an event for writing.
+
+        :param event:  str, event name
+        :param fields:  further values to report with the event; values that
+                        are not JSON types are written as strings
+        """
+        # Streams are not shared with child processes (e.g. forked workers)
+        if self._queue is None or os.getpid() != self._pid:
+            return
+        self._queue.put({"event": event, "time": round(time.time(), 6), **fields})
+
+    def close(self) -> None:
+        """Write all queued events and close the output."""
+        if self._queue is None or os.getpid() != self._pid:
+            return
+        self._queue.put(None)
+        self._thread.join()  # type: ignore
+        self._ofh.close()  # type: ignore
+        self._queue = None
+
+    def _write(self) -> None:
+        """Write queued events until the stream is closed."""
+        failed, closed = False, False
+        while not closed:
+            batch = [self._queue.get()]  # type: ignore
+            while not self._queue.empty():  # type: ignore
+                batch.append(self._queue.get())  # type: ignore
+            closed = batch[-1] is None
+            if failed:
+                continue
+            try:
+                self._ofh.writelines(  # type: ignore
+                    json.dumps(_, default=str) + "\n" for _ in batch if _ is not None
+                )
+                self._ofh.flush()  # type: ignore
+            except OSError:
+                failed = True
+
+
+_STREAM = EventStream()
+
+
+def open_event_stream(target: Optional[str]) -> EventStream:
+    """Return EventStream writing to the passed file or socket.
+
+    :param target:  str, path to output file, tcp://host:port, or
+                    unix:///path/to/socket; if None, events are discarded
+    """
+    if target is None:
+        return EventStream()
+    if target.startswith("tcp://"):
+        host, _, port = target[len("tcp://") :].rpartition(":")
+        if not host or not port.isdigit():
+            raise ValueError(f"expected tcp://host:port, got {target!r}")
+        sock = socket.create_connection((host, int(port)))
+    elif target.startswith("unix://"):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(target[len("unix://") :])
+    else:
+        return EventStream(Path(target).open("w", encoding="utf-8"))
+    # The socket is closed when the file object wrapping it is closed
+    return EventStream(sock.makefile("w", encoding="utf-8"))
+
+
+def set_stream(stream: EventStream) -> EventStream:
+    """Make the passed EventStream the active stream, returning the previous one.
+
+    :param stream:  EventStream to send events to
+    """
+    global _STREAM  # pylint: disable=global-statement
+    previous, _STREAM = _STREAM, stream
+    return previous
+
+
+def emit(event: str, **fields: Any) -> None:
+    """Send an event to the active stream.
+
+    :param event:  str, event name
+    :param fields:  further values to report with the event
+    """
+    _STREAM.emit(event, **fields)
+
+
+@contextmanager
+def stage(name: str, **fields: Any) -> Generator[Dict[str, Any], None, None]:
+    """Emit stage_start and stage_end events around a pipeline stage.
+
+    :param name:  str, stage name
+    :param fields:  further values to report with both events
+
+    Yields a dictionary; values added to it are reported with stage_end,
+    along with the stage's duration in seconds.
+    """
+    _STREAM.emit("stage_start", stage=name, **fields)
+    time0 = time.perf_counter()
+    counts = {}  # type: Dict[str, Any]
+    yield counts
+    _STREAM.emit(
+        "stage_end",
+        stage=name,
+        seconds=round(time.perf_counter() - time0, 6),
+        **fields,
+        **counts,
+    )
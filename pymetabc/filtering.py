@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""Module to filter merged reads by length, N content and expected errors.
+
+Filters are applied while merged reads are hashed, in the same pass over the
+FASTQ file, so rejected reads never become unique hashes. Reads are tested
+in chunks, with a few vectorised operations per chunk: the expected number
+of errors in a read is the sum, over its bases, of the error probability
+10 ** (-Q / 10) given by each quality score Q.
+
+Each rejected read is counted against the first filter it fails, in the
+order length, N count, expected errors.
+"""
+
+from argparse import Namespace
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Counts of rejected reads, in the order the filters are applied
+REJECTION_FIELDS = ("rejected_length", "rejected_ns", "rejected_ee")
+
+
+class ReadFilter:
+
+    """Length, N count and expected error filters for merged reads.
+
+    Filters left as None are not applied. Counts of rejected reads are
+    accumulated over all calls to filter().
+    """
+
+    __slots__ = (
+        "min_length",
+        "max_length",
+        "max_ns",
+        "max_ee",
+        "chunksize",
+        "rejected",
+        "_error_probs",
+    )
+
+    def __init__(
+        self,
+        min_length: Optional[int] = None,
+        max_length: Optional[int] = None,
+        max_ns: Optional[int] = None,
+        max_ee: Optional[float] = None,
+        offset: int = 33,
+        chunksize: int = 10000,
+    ) -> None:
+        """Create filters.
+
+        :param min_length:  int, minimum read length
+        :param max_length:  int, maximum read length
+        :param max_ns:  int, maximum number of N bases
+        :param max_ee:  float, maximum expected number of errors
+        :param offset:  int, ASCII offset of quality scores (33 or 64)
+        :param chunksize:  int, number of reads to test at once
+        """
+        self.min_length = min_length
+        self.max_length = max_length
+        self.max_ns = max_ns
+        self.max_ee = max_ee
+        self.chunksize = chunksize
+        self.rejected = dict.fromkeys(REJECTION_FIELDS, 0)  # type: Dict[str, int]
+        # Error probability for each ASCII quality character
+        scores = np.arange(256) - offset
+        self._error_probs = 10 ** (-np.clip(scores, 0, None) / 10)
+
+    def filter(self, seqs: List[str], quals: List[str]) -> np.ndarray:
+        """Return boolean array, True for each read that passes all filters.
+
+        :param seqs:  List of (upper-case) read sequences
+        :param quals:  List of read quality strings, in the same order
+        """
+        lengths = np.fromiter((len(_) for _ in seqs), dtype=np.int64, count=len(seqs))
+        keep = np.ones(len(seqs), dtype=bool)
+        if self.min_length is not None or self.max_length is not None:
+            passed = np.ones(len(seqs), dtype=bool)
+            if self.min_length is not None:
+                passed &= lengths >= self.min_length
+            if self.max_length is not None:
+                passed &= lengths <= self.max_length
+            self._reject("rejected_length", keep, passed)
+        if self.max_ns is not None:
+            ns = np.fromiter((_.count("N") for _ in seqs), dtype=np.int64)
+            self._reject("rejected_ns", keep, ns <= self.max_ns)
+        if self.max_ee is not None:
+            scores = np.frombuffer("".join(quals).encode("ascii"), dtype=np.uint8)
+            cumulative = np.concatenate(([0], np.cumsum(self._error_probs[scores])))
+            ends = np.cumsum(lengths)
+            errors = cumulative[ends] - cumulative[ends - lengths]
+            self._reject("rejected_ee", keep, errors <= self.max_ee)
+        return keep
+
+    def stats(self) -> Dict[str, int]:
+        """Return counts of rejected reads by filter, and in total."""
+        return {**self.rejected, "rejected_reads": sum(self.rejected.values())}
+
+    def _reject(self, field: str, keep: np.ndarray, passed: np.ndarray) -> None:
+        """Count reads still kept that fail a filter, and stop keeping them."""
+        failed = keep & ~passed
+        self.rejected[field] += int(failed.sum())
+        keep &= passed
+
+
+def build_read_filter(args: Namespace) -> Optional[ReadFilter]:
+    """Return ReadFilter for the filters set in args, or None if none are set.
+
+    :param args:  Namespace of parsed command-line options
+    """
+    limits = (
+        args.hash_min_length,
+        args.hash_max_length,
+        args.hash_max_ns,
+        args.hash_max_ee,
+    )
+    if all(_ is None for _ in limits):
+        return None
+    return ReadFilter(*limits, offset=64 if args.trim_fastq == "phred64" else 33)
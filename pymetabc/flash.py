@@ -2,56 +2,86 @@
 """Functions for handling flash."""
 
 import subprocess
+import time
 
 from argparse import Namespace
 from pathlib import Path
-from typing import Generator
-
-import pandas as pd
+from typing import Dict, Generator, List
 
 from tqdm import tqdm
 
+from . import events
+from .manifest import SampleRecord
+
 
-def generate_flash_commands(dfm: pd.DataFrame, args: Namespace) -> Generator:
+def generate_flash_commands(samples: List[SampleRecord], args: Namespace) -> Generator:
     """Generate flash commands.
 
-    :param dfm:  pd.DataFrame containing one row per sample
+    :param samples:  List of SampleRecords, one per sample
     :param args:  Namespace of parsed command-line arguments
 
     Yields command (as List[str]) for each sample, in turn
     """
     cmd_base = ["flash", "-O", "-t", args.threads, "-M", args.merge_maxoverlap]
-    for _, row in dfm.iterrows():
-        outdir = Path(row["merged_dir"])
-        readfiles = sorted(list(Path(row["trimmed_dir"]).glob("*_trimmed.fastq")))
+    for sample in samples:
+        outdir = Path(sample.merged_dir)
+        readfiles = sorted(list(Path(sample.trimmed_dir).glob("*_trimmed.fastq")))
         outputs = ["-d", outdir, "-o", readfiles[0].stem.split("_L001")[0]]
         yield (list(map(str, cmd_base + outputs + [str(_) for _ in readfiles])), outdir)
 
 
-def run_flash(dfm: pd.DataFrame, args: Namespace) -> pd.DataFrame:
+def parse_flash_stats(output: str) -> Dict[str, int]:
+    """Return read combination statistics from flash's standard output.
+
+    :param output:  str, text written by flash to STDOUT
+
+    flash reports "Total pairs", "Combined pairs" and "Uncombined pairs" on
+    lines of the form "[FLASH]     Combined pairs:   12345". These are
+    returned keyed by their flash label, so the merged read count is
+    available without a second pass over the extendedFrags output.
+    """
+    stats = {}  # type: Dict[str, int]
+    for line in output.splitlines():
+        if not line.startswith("[FLASH]") or ":" not in line:
+            continue
+        key, val = [_.strip() for _ in line[len("[FLASH]") :].split(":", 1)]
+        if key.endswith("pairs") and val.isdigit():
+            stats[key] = int(val)
+    return stats
+
+
+def run_flash(samples: List[SampleRecord], args: Namespace) -> List[SampleRecord]:
     """Run flash on a dataset.
 
-    :param dfm:  pd.DataFrame containing one row per sample
+    :param samples:  List of SampleRecords, one per sample
     :param args:  Namespace of parsed command-line arguments
 
-    Returns modified dataframe with the flash command that was
-    applied, and the path to the output directory as new columns
+    Returns SampleRecords updated with the flash command that was applied,
+    and the read combination statistics reported by flash ("Total pairs",
+    "Combined pairs", "Uncombined pairs")
     """
-    cmdlist = []
-    mergedirs = []
-    for cmd, mergedir in tqdm(
-        generate_flash_commands(dfm, args), disable=args.disable_tqdm
+    for sample, (cmd, _) in tqdm(
+        zip(samples, generate_flash_commands(samples, args)),
+        disable=args.disable_tqdm,
     ):
+        time0 = time.perf_counter()
+        stats = {}  # type: Dict[str, int]
         if not args.dryrun:
-            subprocess.run(
+            result = subprocess.run(
                 cmd,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
                 shell=False,
                 check=True,
             )
-        cmdlist.append(cmd)
-        mergedirs.append(str(mergedir))
-
-    dfm["merge_cmd"] = cmdlist
-    return dfm
+            stats = parse_flash_stats(result.stdout.decode("utf-8"))
+        sample.merge_cmd = cmd
+        sample.merge_stats = stats
+        events.emit(
+            "sample_end",
+            stage="merge",
+            sample=sample.sample_name,
+            seconds=round(time.perf_counter() - time0, 6),
+            merged_reads=stats.get("Combined pairs"),
+        )
+    return samples
@@ -1,38 +1,155 @@
 # -*- coding: utf-8 -*-
 """Functions to hash and quantify merged reads."""
 
-import hashlib
+import time
 
 from argparse import Namespace
-from collections import Counter, defaultdict
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from pathlib import Path
-from typing import Any, Dict, Generator, List
+from typing import Any, Dict, Generator, Iterable, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 
-from Bio import SeqIO
+from Bio.SeqIO.QualityIO import FastqGeneralIterator
 from Bio.Seq import Seq
 from Bio.SeqRecord import SeqRecord
 from tqdm import tqdm
 
+from . import events
+from .digest import from_hex, get_digest_function, to_hex
+from .filtering import ReadFilter, build_read_filter
+from .io import merge_hashed_reads, read_hashed_reads, write_hashed_reads
+from .manifest import SampleRecord
+from .qc import ReadQC
 
-def add_hashed_reads(dfm: pd.DataFrame, args: Namespace) -> Generator:
+
+def add_hashed_reads(samples: List[SampleRecord], args: Namespace) -> Generator:
     """Generate one output directory per sample under the root directory.
 
-    :param dfm:  pd.DataFrame containing one row per sample
+    :param samples:  List of SampleRecords, one per sample
     :param args:  Namespace of parsed command-line options
 
-    Yields path (as str) to the directory
+    Read length and quality statistics are saved for each sample to
+    args.qcdir/<sample_name>.npz in the same pass, and any read filters set
+    in args are applied.
+
+    Yields a tuple of path (as str) to the hashed read file, path (as str) to
+    the read statistics file, the total count of reads that were hashed
+    (None if this is a dry run), and a dictionary of rejected read counts
+    (empty if no filters are set)
     """
-    for _, row in tqdm(
-        dfm.iterrows(), disable=args.disable_tqdm
-    ):  # one subdirectory per sample
-        readfile = list(Path(row["merged_dir"]).glob("*.extendedFrags.fastq"))[0]
+    for sample in tqdm(samples, disable=args.disable_tqdm):  # one file per sample
+        readfile = list(Path(sample.merged_dir).glob("*.extendedFrags.fastq"))[0]
         ofname = (args.hashdir / readfile.name).with_suffix(".fasta")
+        qcfname = args.qcdir / f"{sample.sample_name}.npz"
+        time0 = time.perf_counter()
+        total, filter_stats = None, {}  # type: Optional[int], Dict[str, int]
         if not args.dryrun:
-            hashed_reads = fastq_to_hash_abundance(readfile)
-            SeqIO.write(hashed_reads, ofname, "fasta")
-        yield str(ofname)
+            total, filter_stats = hash_read_file(readfile, ofname, args, qcfname)
+        events.emit(
+            "sample_end",
+            stage="hash",
+            sample=sample.sample_name,
+            seconds=round(time.perf_counter() - time0, 6),
+            reads=total,
+            **filter_stats,
+        )
+        yield (str(ofname), str(qcfname), total, filter_stats)
+
+
+def hash_read_file(
+    readfile: Path, ofname: Path, args: Namespace, qcfname: Optional[Path] = None
+) -> Tuple[int, Dict[str, int]]:
+    """Write hashed reads from a merged read file, and return the read count.
+
+    :param readfile:  Path to FASTQ file of merged reads
+    :param ofname:  Path to output FASTA file of hashed reads
+    :param args:  Namespace of parsed command-line options
+    :param qcfname:  optional Path; if given, read length and quality
+                     statistics are collected in the same pass, and saved here
+
+    Hashed reads are written sorted by hash, with a sidecar file recording
+    totals (see io.write_hashed_reads()). Reads failing the length, N count or
+    expected error filters set in args are not hashed. Returns the count of
+    hashed reads, and a dictionary of rejected read counts by filter (empty
+    if no filters are set).
+    """
+    readqc = None
+    if qcfname is not None:
+        readqc = ReadQC(64 if args.trim_fastq == "phred64" else 33)
+    readfilter = build_read_filter(args)
+    hashed_reads = fastq_to_hash_abundance(
+        readfile, args.hash_algorithm, args.hash_digest_size, readqc, readfilter
+    )
+    total = write_hashed_reads(hashed_reads, ofname)
+    if readqc is not None:
+        readqc.save(qcfname)  # type: ignore
+    filter_stats = {} if readfilter is None else readfilter.stats()
+    return total, filter_stats
+
+
+def aggregate_hash_counts(indir: Path, workers: int = 1) -> Tuple[np.ndarray, ...]:
+    """Return arrays of unique binary read hashes and their total abundance.
+
+    :param indir:  Path to directory containing FASTA files of merged, hashed reads
+    :param workers:  int, number of worker processes
+
+    The hashed read files are split between worker processes, each of which
+    reduces its files to a single array of unique hashes and summed counts;
+    these partial results are then reduced in the same way. Hashes are
+    returned sorted, as a fixed-width bytes array.
+    """
+    fnames = sorted(indir.glob("*.fasta"))
+    workers = max(1, min(workers, len(fnames)))
+    chunks = [fnames[_::workers] for _ in range(workers)]
+    if workers == 1:
+        partials = [reduce_hash_counts(chunks[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            partials = list(executor.map(reduce_hash_counts, chunks))
+    return _reduce_arrays(
+        np.concatenate([_[0] for _ in partials]),
+        np.concatenate([_[1] for _ in partials]),
+    )
+
+
+def reduce_hash_counts(fnames: List[Path]) -> Tuple[np.ndarray, ...]:
+    """Return unique binary read hashes and summed counts for hashed read files.
+
+    :param fnames:  List of Paths to FASTA files of merged, hashed reads
+
+    The files are merge-joined in hash order, so the arrays are built
+    already reduced and sorted.
+    """
+    hashes = []  # type: List[bytes]
+    counts = []  # type: List[int]
+    for hsh, cnt in merge_hashed_reads(fnames):
+        hashes.append(from_hex(hsh))
+        counts.append(cnt)
+    width = max((len(_) for _ in hashes), default=1)
+    return np.array(hashes, dtype=f"S{width}"), np.array(counts, dtype=np.int64)
+
+
+def top_hashes(
+    hashes: np.ndarray, counts: np.ndarray, k: int = 10
+) -> List[Tuple[str, int]]:
+    """Return the k most abundant read hashes, as (hex hash, count) tuples.
+
+    :param hashes:  fixed-width bytes array of binary read hashes
+    :param counts:  array of abundances, one per hash
+    :param k:  int, number of hashes to return
+
+    The top k are selected with np.argpartition, so only those k are sorted.
+    """
+    if len(counts) > k:
+        idxs = np.argpartition(counts, len(counts) - k)[-k:]
+    else:
+        idxs = np.arange(len(counts))
+    top = [(int(counts[_]), to_hex(hashes[_ : _ + 1].tobytes())) for _ in idxs]
+    return [(key, val) for (val, key) in sorted(top, reverse=True)]
 
 
 def count_unique_hashes(indir: Path) -> Dict:
@@ -40,35 +157,71 @@ def count_unique_hashes(indir: Path) -> Dict:
 
     :param indir:  Path to directory containing FASTA files of merged, hashed reads
 
-    Does not return counts of reads with abundance equal to 1
+    Hashes are returned as binary digests; use digest.to_hex() to report them.
     """
-    hashdict = defaultdict(int)  # type: Dict[str, int]
-    for fname in indir.iterdir():
-        with fname.open("r") as ifh:
-            for seqdata in SeqIO.parse(ifh, "fasta"):
-                hsh, cnt = seqdata.id.split("_")
-                hashdict[hsh] += int(cnt)
-    return hashdict
+    return {
+        from_hex(hsh): cnt
+        for hsh, cnt in merge_hashed_reads(sorted(indir.glob("*.fasta")))
+    }
 
 
-def fastq_to_hash_abundance(fpath: Path) -> List[Any]:
+def fastq_to_hash_abundance(
+    fpath: Path,
+    algorithm: str = "md5",
+    digest_size: int = 16,
+    readqc: Optional[ReadQC] = None,
+    readfilter: Optional[ReadFilter] = None,
+) -> List[Any]:
     """Return a list of deduplicated FASTA sequences from FASTQ input.
 
     :param fpath:  Path to FASTQ input file
+    :param algorithm:  str, digest algorithm used to identify sequences
+    :param digest_size:  int, digest length in bytes (blake2b only)
+    :param readqc:  optional ReadQC, to which each read's quality string is added
+    :param readfilter:  optional ReadFilter; reads failing its filters are
+                        not counted (but are added to readqc)
 
     Load the passed FASTQ file and return a list of nonredundant
-    FASTA sequences, whose IDs are the MD5 hash of the sequence,
-    and the abundance of that sequence in the original file.
+    FASTA sequences, whose IDs are the hex digest of the sequence
+    (MD5 by default), and the abundance of that sequence in the
+    original file.
     """
+    digest = get_digest_function(algorithm, digest_size)
+    counter = Counter()  # type: Counter
     with fpath.open("r") as ifh:
-        counter = Counter((str(_.seq.upper()) for _ in SeqIO.parse(ifh, "fastq")))
+        if readfilter is not None:
+            reads = FastqGeneralIterator(ifh)
+            chunk = list(islice(reads, readfilter.chunksize))
+            while chunk:
+                seqs = [_[1].upper() for _ in chunk]
+                quals = [_[2] for _ in chunk]
+                keep = readfilter.filter(seqs, quals)
+                counter.update(seq for seq, kept in zip(seqs, keep) if kept)
+                if readqc is not None:
+                    for qual in quals:
+                        readqc.add(qual)
+                chunk = list(islice(reads, readfilter.chunksize))
+        elif readqc is None:
+            counter.update(_[1].upper() for _ in FastqGeneralIterator(ifh))
+        else:
+            for _, seq, qual in FastqGeneralIterator(ifh):
+                counter[seq.upper()] += 1
+                readqc.add(qual)
     hashed = []
     for key, val in counter.items():
-        hashid = hashlib.md5(key.encode("ascii")).hexdigest()
+        hashid = to_hex(digest(key.encode("ascii")))
         hashed.append(SeqRecord(id=f"{hashid}_{val}", seq=Seq(key)))
     return hashed
 
 
+def sum_hashed_abundance(records: Iterable[SeqRecord]) -> int:
+    """Return the total read count represented by hashed read records.
+
+    :param records:  iterable of SeqRecords with IDs of the form <hash>_<abundance>
+    """
+    return sum(int(_.id.split("_")[1]) for _ in records)
+
+
 def get_hashes_by_sample(indir: Path, args: Namespace) -> pd.DataFrame:
     """Return pandas DataFrame in tidy format with read hash and abundance by sample.
 
@@ -78,11 +231,46 @@ def get_hashes_by_sample(indir: Path, args: Namespace) -> pd.DataFrame:
     data = list()
     for ifname in tqdm(indir.iterdir(), disable=args.disable_tqdm):
         if ifname.suffix == ".fasta":
-            fstem = ifname.stem.split("_")[0]
-            with ifname.open("r") as ifh:
-                for read in SeqIO.parse(ifh, "fasta"):
-                    rhash, abundance = read.id.split("_")
-                    data.append((fstem, rhash, int(abundance)))
+            data.extend(hashed_file_to_rows(ifname))
     return pd.DataFrame(
         data, columns=["sample_name", "read_hash", "abundance"]
     ).set_index("sample_name")
+
+
+def hashed_reads_to_rows(records: Iterable[SeqRecord], fpath: Path) -> List[Tuple]:
+    """Return (sample name, read hash, abundance) tuples for hashed reads.
+
+    :param records:  iterable of SeqRecords with IDs of the form <hash>_<abundance>
+    :param fpath:  Path to the hashed read file the records belong to
+
+    The sample name is taken from the hashed read filename.
+    """
+    fstem = fpath.stem.split("_")[0]
+    rows = []
+    for read in records:
+        rhash, abundance = read.id.split("_")
+        rows.append((fstem, rhash, int(abundance)))
+    return rows
+
+
+def hashed_file_to_rows(fpath: Path) -> List[Tuple]:
+    """Return (sample name, read hash, abundance) tuples for a hashed read file.
+
+    :param fpath:  Path to hashed read FASTA file
+
+    The sample name is taken from the hashed read filename.
+    """
+    fstem = fpath.stem.split("_")[0]
+    return [
+        (fstem, rhash, abundance) for rhash, abundance, _ in read_hashed_reads(fpath)
+    ]
+
+
+def _reduce_arrays(hashes: np.ndarray, counts: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """Return unique hashes and summed counts, using a sort and np.add.reduceat."""
+    if not len(hashes):
+        return hashes, counts
+    order = np.argsort(hashes, kind="stable")
+    hashes, counts = hashes[order], counts[order]
+    starts = np.flatnonzero(np.concatenate(([True], hashes[1:] != hashes[:-1])))
+    return hashes[starts], np.add.reduceat(counts, starts)
@@ -1,25 +1,76 @@
 # -*- coding: utf-8 -*-
 """Module to handle dataframes and data IO."""
 
+import gzip
+import heapq
+import os
+import struct
+import tempfile
+
 from argparse import Namespace
 from pathlib import Path
-from typing import Generator, Optional
+from typing import Any, Dict, Generator, Iterable, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 
+from Bio.SeqRecord import SeqRecord
+
+from .digest import from_hex
+from .manifest import SampleRecord, manifest_to_dataframe
+
+try:
+    import resource
+except ImportError:
+    resource = None  # pylint: disable=invalid-name
+
+try:
+    import pyarrow as pa  # type: ignore
+    import pyarrow.parquet as pq  # type: ignore
+except ImportError:
+    pa = None  # pylint: disable=invalid-name
+
+# Filename suffixes of sample read files
+READ_SUFFIXES = (".fastq", ".fastq.gz", ".fq", ".fq.gz")
+
+# Characters allowed in hexadecimal read hashes
+_HEXDIGITS = frozenset("0123456789abcdefABCDEF")
+
+# Output table formats, and the filename suffix used for each
+TABLE_FORMATS = {
+    "tsv": ".tab",
+    "tsv.gz": ".tab.gz",
+    "parquet": ".parquet",
+    "feather": ".feather",
+}
+
+# Explicit column types for the tidy table of read hash abundance by sample
+READ_TABLE_DTYPES = {"sample_name": str, "read_hash": str, "abundance": "int64"}
+
+# Suffix added to a hashed read file's name for its sidecar metadata file
+HASHED_META_SUFFIX = ".meta"
+
+# Most hashed read files (or partial merges) open at once in a merge-join;
+# the default fan-in is also limited to a quarter of the open file limit
+MERGE_FAN_IN = 256
+
+# Sequence index file header: magic bytes, digest size, number of sequences
+_INDEX_MAGIC = b"PMBCIDX1"
+_INDEX_HEADER = struct.Struct("<8sQQ")
+
 
 def add_sample_subdirs(
-    dfm: pd.DataFrame, root_dir: Optional[Path] = Path(".")
+    samples: List[SampleRecord], root_dir: Optional[Path] = Path(".")
 ) -> Generator:
     """Generate one output directory per sample under the root directory.
 
-    :param dfm:  pd.DataFrame containing one row per sample
+    :param samples:  List of SampleRecords, one per sample
     :param root_dir:  Path to root directory for new output
 
     Yields path (as str) to the directory
     """
-    for idx, _ in dfm.iterrows():  # one subdirectory per sample
-        sample_dir = root_dir / idx
+    for sample in samples:  # one subdirectory per sample
+        sample_dir = root_dir / sample.sample_name
         sample_dir.mkdir(exist_ok=True)
         yield str(sample_dir)
 
@@ -35,9 +86,15 @@ def create_dataframe(args: Namespace) -> pd.DataFrame:
     (path to forward reads for the sample), and "rev_read_path" (path to reverse
     reads for the sample).
     """
-    data = pd.DataFrame(sampledirs_to_paths(args))
-    data.set_index("sample_name", inplace=True)
-    return data
+    return manifest_to_dataframe(create_manifest(args))
+
+
+def create_manifest(args: Namespace) -> List[SampleRecord]:
+    """Return list of SampleRecords for sample files in the input directory.
+
+    :param args:  Namespace of command line arguments
+    """
+    return [SampleRecord(**_) for _ in sampledirs_to_paths(args)]
 
 
 def sampledirs_to_paths(args: Namespace) -> Generator:
@@ -51,15 +108,532 @@ def sampledirs_to_paths(args: Namespace) -> Generator:
     for sample_dir in [
         _ for _ in args.indir.iterdir() if _.is_dir()
     ]:  # One folder per sample
-        sample_name = sample_dir.name.split(args.sample_sep)[0]
+        yield sampledir_to_paths(sample_dir, args.sample_sep)
+
+
+def sampledir_to_paths(
+    sample_dir: Path, sample_sep: str, reads: Optional[Tuple[Path, Path]] = None
+) -> Dict[str, str]:
+    """Return dictionary of data paths for a single sample directory.
+
+    :param sample_dir:  Path to directory holding the sample's two read files
+    :param sample_sep:  str, separator splitting the sample name from the rest
+                        of the directory name
+    :param reads:  optional (forward, reverse) read file paths, e.g. from
+                   read_file_pair(); by default, the directory must hold
+                   only the two read files
+    """
+    sample_name = sample_dir.name.split(sample_sep)[0]
+    if reads is None:
         # sort to ensure fwd, rev order
         freads, rreads = sorted(tuple(sample_dir.iterdir()))
-        # Stringify paths so that BeakerX/pandas can handle them
-        yield dict(
-            [
-                ("sample_name", sample_name),
-                ("sample_dir", str(sample_dir)),
-                ("fwd_read_path", str(freads)),
-                ("rev_read_path", str(rreads)),
-            ]
+    else:
+        freads, rreads = reads
+    # Stringify paths so that BeakerX/pandas can handle them
+    return dict(
+        [
+            ("sample_name", sample_name),
+            ("sample_dir", str(sample_dir)),
+            ("fwd_read_path", str(freads)),
+            ("rev_read_path", str(rreads)),
+        ]
+    )
+
+
+def read_file_pair(sample_dir: Path) -> Optional[Tuple[Path, Path]]:
+    """Return (forward, reverse) read file paths in a sample directory.
+
+    :param sample_dir:  Path to sample directory
+
+    Read files are FASTQ files (named with one of READ_SUFFIXES) with _R1_
+    or _R2_ in their name; hidden files, and any other files, are ignored.
+    None is returned unless there is exactly one read file for each
+    direction. This is the stricter check used in watch mode, where sample
+    directories may still be being written.
+    """
+    reads = [
+        _
+        for _ in sample_dir.iterdir()
+        if not _.name.startswith(".") and _.name.endswith(READ_SUFFIXES)
+    ]
+    fwd = [_ for _ in reads if "_R1_" in _.name]
+    rev = [_ for _ in reads if "_R2_" in _.name]
+    if len(fwd) != 1 or len(rev) != 1:
+        return None
+    return fwd[0], rev[0]
+
+
+def table_path(outdir: Path, stem: str, fmt: str = "tsv") -> Path:
+    """Return path to an output table in the passed format.
+
+    :param outdir:  Path to output directory
+    :param stem:  str, table name without suffix (e.g. "01_input_files")
+    :param fmt:  str, table format (one of TABLE_FORMATS)
+    """
+    return outdir / f"{stem}{TABLE_FORMATS[fmt]}"
+
+
+def write_table(
+    dfm: pd.DataFrame, ofname: Path, fmt: str = "tsv", dtypes: Optional[Dict] = None
+) -> None:
+    """Write dataframe to disk as a table in the passed format.
+
+    :param dfm:  pd.DataFrame to write
+    :param ofname:  Path to output file
+    :param fmt:  str, table format (one of TABLE_FORMATS)
+    :param dtypes:  optional dictionary of column types to enforce on output
+    """
+    with TableWriter(ofname, fmt, dtypes) as writer:
+        writer.write(dfm)
+
+
+def read_table(
+    fname: Path, fmt: str = "tsv", dtypes: Optional[Dict] = None
+) -> pd.DataFrame:
+    """Return dataframe read from a table written by write_table().
+
+    :param fname:  Path to input table
+    :param fmt:  str, table format (one of TABLE_FORMATS)
+    :param dtypes:  optional dictionary of column types (TSV formats only)
+
+    The first column of the table is used as the dataframe index. Column
+    types should be given for TSV tables with read hash columns, as hex
+    digests may otherwise be parsed as numbers.
+    """
+    if fmt in ("tsv", "tsv.gz"):
+        return pd.read_csv(fname, sep="\t", index_col=0, dtype=dtypes, encoding="utf-8")
+    if fmt == "parquet":
+        dfm = pd.read_parquet(fname)
+    else:
+        dfm = pd.read_feather(fname)
+    return dfm.set_index(dfm.columns[0])
+
+
+class TableWriter:
+
+    """Write a table to disk in chunks, in one of TABLE_FORMATS.
+
+    Chunks are passed as dataframes with a named index, which is written as
+    the first column of the table. Every chunk must have the same columns.
+    Compressed TSV and Parquet output are streamed chunk by chunk; Feather
+    output is written as an Arrow IPC file of record batches.
+    """
+
+    def __init__(
+        self, ofname: Path, fmt: str = "tsv", dtypes: Optional[Dict] = None
+    ) -> None:
+        """Open the output table.
+
+        :param ofname:  Path to output file
+        :param fmt:  str, table format (one of TABLE_FORMATS)
+        :param dtypes:  optional dictionary of column types to enforce on output
+        """
+        if fmt not in TABLE_FORMATS:
+            raise ValueError(
+                f"unknown table format {fmt} "
+                f"(expected one of {', '.join(TABLE_FORMATS)})"
+            )
+        if fmt in ("parquet", "feather") and pa is None:
+            raise ImportError(f"the pyarrow package is required for {fmt} tables")
+        self.ofname = ofname
+        self.fmt = fmt
+        self.dtypes = dtypes
+        self.nrows = 0
+        self._started = False
+        self._handle = None  # type: Any
+        self._writer = None  # type: Any
+        self._schema = None  # type: Any
+        self._empty = None  # type: Optional[pd.DataFrame]
+        if fmt == "tsv":
+            self._handle = ofname.open("w", encoding="utf-8")
+        elif fmt == "tsv.gz":
+            self._handle = gzip.open(ofname, "wt", encoding="utf-8")
+        else:
+            self._handle = pa.OSFile(str(ofname), "wb")
+
+    def __enter__(self) -> "TableWriter":
+        """Return the writer, for use as a context manager."""
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Close the writer on leaving the context."""
+        self.close()
+
+    def write(self, dfm: pd.DataFrame) -> None:
+        """Write a chunk of rows to the table.
+
+        :param dfm:  pd.DataFrame of rows to write
+        """
+        dfm = dfm.reset_index()
+        if self.dtypes is not None:
+            dfm = dfm.astype(self.dtypes)
+        if self.fmt in ("tsv", "tsv.gz"):
+            dfm.to_csv(self._handle, sep="\t", index=False, header=not self._started)
+        elif self._writer is None and not len(dfm):
+            # Arrow infers null types for the columns of an empty chunk, which
+            # later rows would not match: the schema is taken from the first
+            # chunk with rows, or from this chunk if none follow
+            self._empty = dfm
+        else:
+            self._write_arrow(dfm)
+        self.nrows += len(dfm)
+        self._started = True
+
+    def _write_arrow(self, dfm: pd.DataFrame) -> None:
+        """Write a chunk of rows to a Parquet or Feather table."""
+        table = pa.Table.from_pandas(dfm, schema=self._schema, preserve_index=False)
+        if self._writer is None:
+            self._schema = table.schema
+            if self.fmt == "parquet":
+                self._writer = pq.ParquetWriter(self._handle, self._schema)
+            else:
+                self._writer = pa.ipc.new_file(self._handle, self._schema)
+        self._writer.write_table(table)
+
+    def flush(self) -> None:
+        """Flush rows written so far to disk (TSV formats only).
+
+        Parquet and Feather tables are not readable until closed.
+        """
+        if self.fmt in ("tsv", "tsv.gz") and self._handle is not None:
+            self._handle.flush()
+
+    def close(self) -> None:
+        """Finish writing the table, and close the output file.
+
+        If no rows were written and column types (or empty chunks) were
+        given, the table is written with a header (or schema) and no rows.
+        """
+        if not self._started and self._handle is not None and self.dtypes:
+            self.write(
+                pd.DataFrame(
+                    {key: pd.Series(dtype=val) for key, val in self.dtypes.items()}
+                ).set_index(next(iter(self.dtypes)))
+            )
+        if self._writer is None and self._empty is not None:
+            self._write_arrow(self._empty)
+            self._empty = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+
+def write_hashed_reads(records: Iterable[SeqRecord], ofname: Path) -> int:
+    """Write hashed reads to FASTA, sorted by read hash, and return the read total.
+
+    :param records:  iterable of SeqRecords with IDs of the form <hash>_<abundance>
+    :param ofname:  Path to output FASTA file
+
+    The output is plain FASTA, with each sequence on a single line, so that
+    the same reads always give an identical file. The sort order, and the
+    total reads and unique sequences, are recorded in a sidecar file (see
+    hashed_meta_path()) on a single line, e.g.
+
+    order=digest reads=1540 unique=32
+
+    As hex digests of one length sort in the same order as the digests
+    themselves, files can be merge-joined by join_hashed_reads() and
+    merge_hashed_reads().
+    """
+    entries = sorted((_.id.split("_")[0], _.id, str(_.seq)) for _ in records)
+    total = sum(int(_[1].split("_")[1]) for _ in entries)
+    with ofname.open("w") as ofh:
+        ofh.writelines(f">{rid}\n{seq}\n" for _, rid, seq in entries)
+    with hashed_meta_path(ofname).open("w") as ofh:
+        ofh.write(f"order=digest reads={total} unique={len(entries)}\n")
+    return total
+
+
+def hashed_meta_path(fpath: Path) -> Path:
+    """Return path to the sidecar metadata file for a hashed read file.
+
+    :param fpath:  Path to hashed read FASTA file
+    """
+    return fpath.with_name(f"{fpath.name}{HASHED_META_SUFFIX}")
+
+
+def read_hashed_meta(fpath: Path) -> Dict[str, Any]:
+    """Return the values recorded in a hashed read file's sidecar metadata.
+
+    :param fpath:  Path to hashed read FASTA file
+
+    Returns an empty dictionary for files without metadata, e.g. those
+    written by earlier versions of pymetabc.
+    """
+    metafile = hashed_meta_path(fpath)
+    if not metafile.is_file():
+        return {}
+    meta = {}  # type: Dict[str, Any]
+    for key, _, val in (_.partition("=") for _ in metafile.read_text().split()):
+        meta[key] = int(val) if val.isdigit() else val
+    return meta
+
+
+def read_hashed_reads(fpath: Path) -> Generator[Tuple[str, int, str], None, None]:
+    """Generate (read hash, abundance, sequence) tuples from a hashed read file.
+
+    :param fpath:  Path to hashed read FASTA file
+
+    Reads are generated in file order; sequences wrapped over several
+    lines are joined.
+    """
+    with fpath.open("r") as ifh:
+        rid, seq = None, []  # type: Optional[str], List[str]
+        for line in ifh:
+            if line.startswith(">"):
+                if rid is not None:
+                    rhash, abundance = rid.split("_")
+                    yield (rhash, int(abundance), "".join(seq))
+                rid, seq = line[1:].split(None, 1)[0], []
+            else:
+                seq.append(line.strip())
+        if rid is not None:
+            rhash, abundance = rid.split("_")
+            yield (rhash, int(abundance), "".join(seq))
+
+
+def merge_fan_in() -> int:
+    """Return default number of files opened at once by a merge-join.
+
+    This is MERGE_FAN_IN, or a quarter of the process's open file limit if
+    that is smaller, leaving descriptors free for other open files.
+    """
+    if resource is None:
+        return MERGE_FAN_IN
+    limit = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+    if limit == resource.RLIM_INFINITY:
+        return MERGE_FAN_IN
+    return max(2, min(MERGE_FAN_IN, limit // 4))
+
+
+def join_hashed_reads(
+    fpaths: List[Path], fan_in: Optional[int] = None
+) -> Generator[Tuple[str, List[int]], None, None]:
+    """Generate each read hash in the passed files, with its abundance in each.
+
+    :param fpaths:  List of Paths to hashed read FASTA files
+    :param fan_in:  int, most files open at once (default: merge_fan_in())
+
+    Yields (read hash, abundances) in hash order, where abundances holds one
+    count per file (zero where the hash is absent), e.g. to compare the
+    output of two runs. Files are merge-joined, holding one read per file in
+    memory; files without sorted metadata are sorted in memory first. When
+    there are more than fan_in files, they are merged in rounds of fan_in
+    files through temporary files, so that any number of files can be joined.
+    """
+    current, counts = None, []  # type: Optional[str], List[int]
+    for rhash, idx, abundance in _merge_sorted_hashes(fpaths, fan_in):
+        if rhash != current:
+            if current is not None:
+                yield (current, counts)
+            current, counts = rhash, [0] * len(fpaths)
+        counts[idx] += abundance
+    if current is not None:
+        yield (current, counts)
+
+
+def merge_hashed_reads(
+    fpaths: List[Path], fan_in: Optional[int] = None
+) -> Generator[Tuple[str, int], None, None]:
+    """Generate each read hash in the passed files, with its total abundance.
+
+    :param fpaths:  List of Paths to hashed read FASTA files
+    :param fan_in:  int, most files open at once (default: merge_fan_in())
+
+    Yields (read hash, abundance) in hash order. As for join_hashed_reads(),
+    files are merge-joined in rounds of at most fan_in files, so memory use
+    does not grow with the number of unique hashes in sorted files.
+    """
+    current, total = None, 0  # type: Optional[str], int
+    for rhash, _, abundance in _merge_sorted_hashes(fpaths, fan_in):
+        if rhash != current:
+            if current is not None:
+                yield (current, total)
+            current, total = rhash, 0
+        total += abundance
+    if current is not None:
+        yield (current, total)
+
+
+def build_sequence_index(indirs: Iterable[Path], ofname: Path) -> int:
+    """Write a sorted, memory-mappable index of hashed read sequences.
+
+    :param indirs:  Iterable of Paths to directories of hashed read FASTA files
+    :param ofname:  Path to output index file
+
+    The index file holds a short header, the sorted binary digests of all
+    unique sequences, an array of offsets into a packed sequence blob, and
+    the blob itself. It is written to a temporary file and renamed into
+    place, so that processes already reading an older index are unaffected.
+
+    Returns the number of sequences in the index.
+    """
+    sequences = {}  # type: Dict[bytes, bytes]
+    for indir in indirs:
+        for fname in sorted(Path(indir).glob("*.fasta")):
+            for rhash, _, seq in read_hashed_reads(fname):
+                sequences[from_hex(rhash)] = seq.encode("ascii")
+    sizes = {len(_) for _ in sequences}
+    if len(sizes) > 1:
+        raise ValueError(f"hashed reads use more than one digest size: {sizes}")
+    digest_size = sizes.pop() if sizes else 0
+
+    # Sorted on the Python side: converting back from a numpy bytes array
+    # would strip trailing null bytes from the digests
+    keys = sorted(sequences)
+    digests = np.array(keys, dtype=f"S{max(digest_size, 1)}")
+    lengths = np.array([len(sequences[_]) for _ in keys], dtype="<u8")
+    offsets = np.zeros(len(digests) + 1, dtype="<u8")
+    np.cumsum(lengths, out=offsets[1:])
+
+    tmpname = ofname.with_name(f".{ofname.name}.{os.getpid()}.tmp")
+    with tmpname.open("wb") as ofh:
+        ofh.write(_INDEX_HEADER.pack(_INDEX_MAGIC, digest_size, len(digests)))
+        ofh.write(digests.tobytes())
+        ofh.write(b"\0" * _index_padding(digest_size * len(digests)))
+        ofh.write(offsets.tobytes())
+        for hsh in keys:
+            ofh.write(sequences[hsh])
+    os.replace(tmpname, ofname)
+    return len(digests)
+
+
+class SequenceIndex:
+
+    """Read-only, memory-mapped lookup of sequences by read hash.
+
+    The index file written by build_sequence_index() is memory-mapped, so
+    only the pages touched by a lookup are read from disk, and any number
+    of processes can share the same index concurrently.
+    """
+
+    def __init__(self, fname: Path) -> None:
+        """Open the index at the passed path.
+
+        :param fname:  Path to index file
+        """
+        self._data = np.memmap(fname, dtype=np.uint8, mode="r")
+        magic, self.digest_size, count = _INDEX_HEADER.unpack_from(self._data, 0)
+        if magic != _INDEX_MAGIC:
+            raise ValueError(f"{fname} is not a pymetabc sequence index")
+        start = _INDEX_HEADER.size
+        self._digests = np.ndarray(
+            (count,),
+            dtype=f"S{max(self.digest_size, 1)}",
+            buffer=self._data,
+            offset=start,
         )
+        start += self.digest_size * count
+        start += _index_padding(self.digest_size * count)
+        self._offsets = np.ndarray(
+            (count + 1,), dtype="<u8", buffer=self._data, offset=start
+        )
+        self._blob_start = start + self._offsets.nbytes
+
+    def __len__(self) -> int:
+        """Return number of sequences in the index."""
+        return len(self._digests)
+
+    def get(self, hexdigest: str) -> Optional[str]:
+        """Return sequence for a single read hash, or None if absent.
+
+        :param hexdigest:  str, hexadecimal read hash
+        """
+        return self.lookup([hexdigest])[hexdigest]
+
+    def lookup(self, hexdigests: Iterable[str]) -> Dict[str, Optional[str]]:
+        """Return dictionary of sequences keyed by read hash.
+
+        :param hexdigests:  Iterable of hexadecimal read hashes
+
+        Hashes that are not in the index (or do not match the index digest
+        size, or are not hexadecimal) map to None. Lookups are a vectorised
+        binary search over the sorted digests.
+        """
+        hexdigests = list(hexdigests)
+        results = dict.fromkeys(hexdigests)  # type: Dict[str, Optional[str]]
+        queries = [
+            _
+            for _ in hexdigests
+            if len(_) == 2 * self.digest_size and _HEXDIGITS.issuperset(_)
+        ]
+        if not queries or not len(self):
+            return results
+        keys = np.array([from_hex(_) for _ in queries], dtype=self._digests.dtype)
+        idxs = np.minimum(np.searchsorted(self._digests, keys), len(self) - 1)
+        found = self._digests[idxs] == keys
+        for query, idx, hit in zip(queries, idxs.tolist(), found.tolist()):
+            if hit:
+                start = self._blob_start + int(self._offsets[idx])
+                end = self._blob_start + int(self._offsets[idx + 1])
+                results[query] = self._data[start:end].tobytes().decode("ascii")
+        return results
+
+
+def _sorted_hashes(fpath: Path, idx: int) -> Iterable[Tuple[str, int, int]]:
+    """Return (read hash, file index, abundance) tuples for a file, in hash order."""
+    entries = ((_[0], idx, _[1]) for _ in read_hashed_reads(fpath))
+    if read_hashed_meta(fpath).get("order") == "digest":
+        return entries
+    return sorted(entries)
+
+
+def _merge_sorted_hashes(
+    fpaths: List[Path], fan_in: Optional[int] = None
+) -> Generator[Tuple[str, int, int], None, None]:
+    """Generate (read hash, file index, abundance) tuples for files, in hash order.
+
+    Groups of fan_in sources are merged into temporary files until no more
+    than fan_in remain, so that at most fan_in files are open at once.
+    """
+    fan_in = merge_fan_in() if fan_in is None else fan_in
+    if fan_in < 2:
+        raise ValueError(f"merge fan-in must be at least 2, not {fan_in}")
+    sources = [(fpath, idx) for idx, fpath in enumerate(fpaths)]  # type: List[Any]
+    with tempfile.TemporaryDirectory(prefix="pymetabc_merge_") as tmpdir:
+        rounds = 0
+        while len(sources) > fan_in:
+            merged = []
+            for start in range(0, len(sources), fan_in):
+                tmpname = Path(tmpdir) / f"{rounds}_{start}.tab"
+                with tmpname.open("w") as ofh:
+                    ofh.writelines(
+                        f"{rhash}\t{idx}\t{abundance}\n"
+                        for rhash, idx, abundance in heapq.merge(
+                            *(_open_sources(sources[start : start + fan_in]))
+                        )
+                    )
+                merged.append(tmpname)
+            for source in sources:
+                if not isinstance(source, tuple):
+                    source.unlink()
+            sources, rounds = merged, rounds + 1
+        yield from heapq.merge(*_open_sources(sources))
+
+
+def _open_sources(sources: List[Any]) -> List[Iterable[Tuple[str, int, int]]]:
+    """Return sorted (read hash, file index, abundance) iterables for merge sources.
+
+    Sources are (hashed read file, file index) tuples, or Paths to partial
+    merges written by _merge_sorted_hashes().
+    """
+    return [
+        _sorted_hashes(*_) if isinstance(_, tuple) else _read_partial_merge(_)
+        for _ in sources
+    ]
+
+
+def _read_partial_merge(fpath: Path) -> Generator[Tuple[str, int, int], None, None]:
+    """Generate (read hash, file index, abundance) tuples from a partial merge."""
+    with fpath.open("r") as ifh:
+        for line in ifh:
+            rhash, idx, abundance = line.split("\t")
+            yield (rhash, int(idx), int(abundance))
+
+
+def _index_padding(nbytes: int) -> int:
+    """Return padding needed to align a block of nbytes to eight bytes."""
+    return -nbytes % 8
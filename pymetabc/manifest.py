@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""Module providing the per-sample manifest consumed by pipeline stages.
+
+Each sample is described by a SampleRecord, and a run by a list of these.
+Stages read and set attributes on the records directly; pandas is used only
+to write the manifest out as a table.
+"""
+
+from typing import Dict, List
+
+import pandas as pd
+
+# Record attributes holding dictionaries of tool-reported statistics; these
+# are expanded to one column per statistic when written as a table
+STATS_FIELDS = ("trim_stats", "merge_stats", "filter_stats")
+
+
+class SampleRecord:
+
+    """Paths, commands and read counts for one sample.
+
+    Attributes other than the sample name and input paths are set by the
+    pipeline stages as they run. Attributes that have not been set are left
+    out of the table written by manifest_to_dataframe().
+    """
+
+    __slots__ = (
+        "sample_name",
+        "sample_dir",
+        "fwd_read_path",
+        "rev_read_path",
+        "trimmed_dir",
+        "trim_cmd",
+        "trim_output",
+        "trim_summary",
+        "trim_stats",
+        "merged_dir",
+        "merge_cmd",
+        "merge_stats",
+        "filter_stats",
+        "hashed_reads",
+        "hashed_total",
+        "read_qc",
+        "thresholded_reads",
+        "thresholded_total",
+    )
+
+    def __init__(
+        self, sample_name: str, sample_dir: str, fwd_read_path: str, rev_read_path: str
+    ) -> None:
+        """Create record for a sample from its input paths.
+
+        :param sample_name:  str, name of the sample
+        :param sample_dir:  str, path to directory of sample input files
+        :param fwd_read_path:  str, path to forward read file
+        :param rev_read_path:  str, path to reverse read file
+        """
+        self.sample_name = sample_name
+        self.sample_dir = sample_dir
+        self.fwd_read_path = fwd_read_path
+        self.rev_read_path = rev_read_path
+
+    def __repr__(self) -> str:
+        """Return string representation of record."""
+        return f"SampleRecord({self.sample_name!r})"
+
+    def as_dict(self) -> Dict:
+        """Return dictionary of the record's set attributes, in table order.
+
+        Statistics dictionaries are expanded in place, keyed by statistic.
+        """
+        data = {}  # type: Dict
+        for field in self.__slots__:
+            if not hasattr(self, field):
+                continue
+            if field in STATS_FIELDS:
+                data.update(getattr(self, field))
+            else:
+                data[field] = getattr(self, field)
+        return data
+
+
+def manifest_to_dataframe(samples: List[SampleRecord]) -> pd.DataFrame:
+    """Return pd.DataFrame with one row per sample, indexed by sample name.
+
+    :param samples:  List of SampleRecords
+    """
+    data = pd.DataFrame([_.as_dict() for _ in samples])
+    if not len(data):
+        data = pd.DataFrame(columns=["sample_name"])
+    return data.set_index("sample_name")
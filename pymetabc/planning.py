@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""Module to estimate the resources a pipeline run will need, before running it.
+
+Read counts for each sample are estimated without reading whole input files:
+the first reads of each forward read file are parsed, and the count is
+scaled up by the ratio of the file's size to the number of (compressed)
+bytes consumed. Runtime, peak memory and intermediate disk use for each
+stage are then predicted from per-read costs.
+
+The per-read costs in STAGE_COSTS are approximate figures for current
+hardware, and are intended for sizing jobs, not as exact predictions.
+"""
+
+import gzip
+import math
+
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Tuple
+
+import pandas as pd
+
+from .manifest import SampleRecord
+
+
+class StageCost(NamedTuple):
+
+    """Approximate per-read costs of one pipeline stage.
+
+    Throughput is in read pairs per second (per thread, for threaded
+    tools); memory is a fixed overhead in bytes plus bytes per unique read
+    held; disk use is in bytes per input read base, written as intermediate
+    files (which --scratch keeps off the output filesystem) or as output.
+    """
+
+    pairs_per_second: float
+    threaded: bool
+    base_memory: float
+    memory_per_unique: float
+    intermediate_per_base: float
+    output_per_base: float
+
+
+STAGE_COSTS = {
+    # trimmomatic: trimmed and untrimmed reads, and the per-read trimlog
+    "trim": StageCost(25000, True, 1.0e9, 0, 2.6, 0),
+    # flash: merged reads are kept; unmerged reads and histograms are not
+    "merge": StageCost(60000, True, 2.5e8, 0, 0.3, 1.2),
+    # Unique sequences are held in a dictionary while hashing
+    "hash": StageCost(300000, False, 1.5e8, 250, 0, 0.1),
+    "threshold": StageCost(2000000, False, 1.5e8, 250, 0, 0.01),
+}
+
+# Threads beyond this add little speed to trimmomatic and flash, which are
+# run one sample at a time
+MAX_USEFUL_TOOL_THREADS = 8
+
+
+class SamplePlan(NamedTuple):
+
+    """Sizes and estimated read count for one sample's input."""
+
+    sample_name: str
+    input_bytes: int
+    read_pairs: int
+    read_length: float
+    unique_fraction: float
+    sampled_reads: int
+
+
+def plan_samples(samples: List[SampleRecord], max_reads: int = 10000) -> pd.DataFrame:
+    """Return pd.DataFrame of estimated input read counts, one row per sample.
+
+    :param samples:  List of SampleRecords, one per sample
+    :param max_reads:  int, number of reads to parse from each forward read file
+    """
+    plans = []
+    for sample in samples:
+        fwd, rev = Path(sample.fwd_read_path), Path(sample.rev_read_path)
+        pairs, length, unique, sampled = estimate_read_count(fwd, max_reads)
+        plans.append(
+            SamplePlan(
+                sample.sample_name,
+                fwd.stat().st_size + rev.stat().st_size,
+                pairs,
+                length,
+                unique,
+                sampled,
+            )
+        )
+    return pd.DataFrame(plans, columns=SamplePlan._fields).set_index("sample_name")
+
+
+def estimate_read_count(fpath: Path, max_reads: int = 10000) -> Tuple:
+    """Return estimated read count, mean read length, unique read fraction, and
+    the number of reads sampled, for a (possibly gzipped) FASTQ file.
+
+    :param fpath:  Path to FASTQ file
+    :param max_reads:  int, maximum number of reads to parse
+
+    If the whole file is read, the read count is exact.
+    """
+    size = fpath.stat().st_size
+    with fpath.open("rb") as raw:
+        ifh = gzip.GzipFile(fileobj=raw) if fpath.suffix == ".gz" else raw
+        nreads, nbases, seqs = 0, 0, set()
+        while nreads < max_reads:
+            lines = [ifh.readline() for _ in range(4)]
+            if not lines[3]:
+                break
+            nreads += 1
+            nbases += len(lines[1].rstrip())
+            seqs.add(lines[1])
+        exhausted = nreads < max_reads
+        consumed = raw.tell()
+    if not nreads:
+        return (0, 0.0, 0.0, 0)
+    total = nreads if exhausted or not consumed else round(nreads * size / consumed)
+    return (total, nbases / nreads, len(seqs) / nreads, nreads)
+
+
+def plan_stages(
+    plan: pd.DataFrame, threads: int, scratch: bool = False
+) -> pd.DataFrame:
+    """Return pd.DataFrame of predicted runtime, peak memory and disk per stage.
+
+    :param plan:  pd.DataFrame of sample read estimates, from plan_samples()
+    :param threads:  int, number of threads passed to third-party tools
+    :param scratch:  bool, True if samples are processed in scratch space
+
+    Samples are processed one at a time, so runtimes are summed over samples
+    and peak memory is that of the largest sample. Output directory disk use
+    is summed over all samples. With scratch space, intermediate files are
+    not written to the output directory, and only the largest sample's files
+    are held in scratch at once (reported as scratch_gb).
+    """
+    rows = []
+    pairs = plan["read_pairs"].astype(float)
+    bases = 2 * pairs * plan["read_length"]
+    largest = float((pairs * plan["unique_fraction"]).max()) if len(plan) else 0.0
+    for stage, cost in STAGE_COSTS.items():
+        rate = cost.pairs_per_second * (
+            min(threads, MAX_USEFUL_TOOL_THREADS) if cost.threaded else 1
+        )
+        intermediate = cost.intermediate_per_base * bases.sum()
+        output = cost.output_per_base * bases.sum()
+        per_sample = (cost.intermediate_per_base + cost.output_per_base) * bases
+        rows.append(
+            (
+                stage,
+                pairs.sum() / rate,
+                (cost.base_memory + cost.memory_per_unique * largest) / 1e9,
+                (output if scratch else intermediate + output) / 1e9,
+                float(per_sample.max()) / 1e9 if scratch and len(plan) else 0.0,
+            )
+        )
+    return pd.DataFrame(
+        rows, columns=["stage", "runtime_s", "peak_memory_gb", "disk_gb", "scratch_gb"]
+    ).set_index("stage")
+
+
+def recommend_settings(stages: pd.DataFrame, threads: int, cpus: int) -> Dict[str, str]:
+    """Return recommended concurrency settings, keyed by setting.
+
+    :param stages:  pd.DataFrame of stage predictions, from plan_stages()
+    :param threads:  int, number of threads requested
+    :param cpus:  int, number of CPUs available
+    """
+    recommended = {}
+    tool_threads = min(cpus, MAX_USEFUL_TOOL_THREADS)
+    recommended["threads"] = (
+        f"{tool_threads} (trimmomatic and flash gain little beyond "
+        f"{MAX_USEFUL_TOOL_THREADS} threads; requested {threads})"
+    )
+    memory = stages["peak_memory_gb"].max()
+    recommended["memory"] = f"{math.ceil(memory * 1.5)} GB (peak {memory:.2f} GB)"
+    disk = stages["disk_gb"].sum()
+    recommended["disk"] = f"{math.ceil(disk * 1.2)} GB in the output directory"
+    scratch = stages["scratch_gb"].max()
+    if scratch:
+        recommended["scratch"] = f"{math.ceil(scratch * 1.5)} GB of scratch space"
+    elif disk > 10:
+        recommended["scratch"] = "consider --scratch to keep intermediates off disk"
+    return recommended
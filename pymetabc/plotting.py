@@ -1,73 +1,127 @@
 # _*_ coding: utf-8 -*-
-"""Module providing plotting functions."""
+"""Module providing plotting functions.
+
+Read hash abundance plots are drawn from tables reduced by the aggregation
+module, so that the size of the plot, and the time taken to render it, do
+not grow with the number of read hashes in the run.
+"""
 
 from pathlib import Path
+from typing import List, Optional, Sequence
 
+import numpy as np
 import pandas as pd
 
 from bokeh.palettes import Category20  # pylint: disable=no-name-in-module
-from bokeh.layouts import gridplot
-from bokeh.models import ColumnDataSource, HoverTool, Legend, LegendItem
+from bokeh.layouts import column, gridplot
+from bokeh.models import ColumnDataSource, Div, HoverTool, Legend, LegendItem
 from bokeh.plotting import figure, output_file, save
-from bokeh.transform import factor_cmap, jitter
 
+from .aggregation import OTHER_HASHES, PLOT_TOP_HASHES, bin_hashes, hash_quantiles
+
+# Colour of the binned read hashes outside the top hashes
+OTHER_COLOUR = "#bbbbbb"
 
-def plot_read_hash_abundances(dfm: pd.DataFrame, ofname: Path) -> None:
+
+def plot_read_hash_abundances(
+    dfm: pd.DataFrame,
+    ofname: Path,
+    top: int = PLOT_TOP_HASHES,
+    datalink: Optional[str] = None,
+) -> None:
     """Plot distribution of unique read counts.
 
     :param dfm:  pd.DataFrame containing one row per sample/hash combination
     :param ofname:  Path to output file for figure
+    :param top:  int, number of most abundant read hashes plotted individually
+    :param datalink:  optional link to the full read table, shown below the plot
+
+    The abundance of each of the top read hashes, and of all other hashes
+    binned together, is drawn as a box of its quantiles over samples, so the
+    size of the plot does not depend on the size of the run.
     """
-    # Set data sources
-    dfm["read_hash"] = dfm["read_hash"].str.slice(0, 6)
-    source = ColumnDataSource(dfm)
-    categories = sorted(set(source.data["read_hash"]))
-    colours = factor_cmap(
-        "read_hash", palette=Category20[len(categories)], factors=categories
+    # Reduce the data to quantiles by hash category (short read hashes are
+    # used as labels)
+    data = hash_quantiles(dfm, top).reset_index()
+    data = data.assign(
+        label=data["read_hash"].str.slice(0, 6),
+        color=_hash_colours(data["read_hash"]),
     )
+    source = ColumnDataSource(data)
+    categories = list(data["label"])
 
-    # Render abundances
-    tooltips = [("sample", "@sample_name"), ("abundance", "@abundance")]
+    # Render abundance quantiles
+    tooltips = [
+        ("read hash", "@read_hash"),
+        ("samples", "@rows"),
+        ("total", "@total"),
+        ("quartiles", "@q25 / @q50 / @q75"),
+        ("range", "@q0 - @q100"),
+    ]
     fig = figure(
         x_range=categories,
-        plot_width=100 * len(categories),
+        plot_width=max(600, 100 * len(categories)),
         plot_height=600,
         title="Unique Read Abundances By Hash",
         y_axis_type="log",
         tooltips=tooltips,
     )
-    fig.scatter(
-        x=jitter("read_hash", width=0.4, range=fig.x_range),
-        y="abundance",
+    fig.segment(x0="label", y0="q0", x1="label", y1="q100", source=source)
+    fig.vbar(
+        x="label",
+        width=0.6,
+        bottom="q25",
+        top="q75",
         source=source,
-        size=10,
         alpha=0.6,
         hover_fill_alpha=1,
-        fill_color=colours,
+        fill_color="color",
+        line_color="black",
+    )
+    fig.scatter(
+        x="label", y="q50", source=source, marker="dash", size=30, color="black"
     )
+    fig.xaxis.major_label_orientation = "vertical"
 
     # Save figure
     output_file(ofname)
-    save(fig)
+    save(_with_datalink(fig, datalink))
 
 
 def plot_sample_hash_abundances(
-    data: pd.DataFrame, ofname: Path, plot_width: int = 1800, plot_height: int = 600
+    data: pd.DataFrame,
+    ofname: Path,
+    plot_width: int = 1800,
+    plot_height: int = 600,
+    top: int = PLOT_TOP_HASHES,
+    datalink: Optional[str] = None,
 ) -> None:
-    """Render bokeh plot of unique read hash abundance in each sample."""
+    """Render bokeh plot of unique read hash abundance in each sample.
+
+    :param data:  pd.DataFrame containing one row per sample/hash combination
+    :param ofname:  Path to write HTML bokeh output
+    :param plot_width:  int, pixel width of plot
+    :param plot_height:  int, pixel height of plot
+    :param top:  int, number of most abundant read hashes plotted individually
+    :param datalink:  optional link to the full read table, shown below the plot
+
+    Hashes outside the top read hashes are summed into one point per sample,
+    so at most top + 1 points are plotted for each sample.
+    """
     # Set data sources
-    data["read_hash"] = data["read_hash"].str.slice(0, 6)
-    data = data.reset_index(level=0)
-    source = ColumnDataSource(data)
-    categories = sorted(set(source.data["read_hash"]))
-    sample_names = sorted(set(source.data["sample_name"]))
+    data = bin_hashes(data, top).reset_index(level=0)
+    data = data.assign(label=data["read_hash"].str.slice(0, 6))
+    categories = list(dict.fromkeys(data["read_hash"]))
+    sample_names = sorted(set(data["sample_name"]))
 
     # HoverTool tooltip
     hover = HoverTool(
         tooltips=[
             ("sample", "@sample_name"),
             ("read hash", "@read_hash"),
+            ("hashes", "@hashes"),
             ("abundance", "@abundance"),
+            ("fraction", "@fraction{0.000}"),
         ]
     )
 
@@ -81,7 +135,7 @@ def plot_sample_hash_abundances(
         tools=[hover, "tap", "box_zoom", "wheel_zoom", "save", "reset"],
     )
     legend_items = []  # holds LegendItems
-    for rhash, color in zip(categories, Category20[len(categories)]):
+    for rhash, color in zip(categories, _hash_colours(categories)):
         dfm = data.loc[data["read_hash"] == rhash]
         rdr = fig.circle(
             "sample_name",
@@ -92,9 +146,9 @@ def plot_sample_hash_abundances(
             fill_color=color,
             muted_color=color,
             muted_alpha=1,
-            source=dfm,
+            source=ColumnDataSource(dfm),
         )
-        legend_items.append(LegendItem(label=rhash, renderers=[rdr]))
+        legend_items.append(LegendItem(label=rhash[:6], renderers=[rdr]))
 
     # Configure plot
     fig.xaxis.major_label_orientation = "vertical"
@@ -102,9 +156,9 @@ def plot_sample_hash_abundances(
     legend.click_policy = "mute"
     fig.add_layout(legend, "left")
 
-    #  Save file
+    #  Save file
     output_file(ofname)
-    save(fig)
+    save(_with_datalink(fig, datalink))
 
 
 def plot_trimmomatic_summary(
@@ -168,3 +222,249 @@ def plot_trimmomatic_summary(
 
     output_file(ofname)
     save(gridplot([[_] for _ in figures]))
+
+
+def plot_read_lengths(
+    data: pd.DataFrame, ofname: Path, plot_width: int = 1200, plot_height: int = 600
+) -> None:
+    """Render bokeh plot of merged read length distribution in each sample.
+
+    :param data:  pd.DataFrame of read count by length, indexed by sample name
+    :param ofname:  Path to write HTML bokeh output
+    :param plot_width:  int, pixel width of plot
+    :param plot_height:  int, pixel height of plot
+
+    Counts are plotted as the proportion of each sample's reads, so that
+    samples of different depth can be compared.
+    """
+    data = data.reset_index(level=0)
+    data = data.assign(
+        proportion=data["count"] / data.groupby("sample_name")["count"].transform("sum")
+    )
+    fig = figure(
+        plot_width=plot_width,
+        plot_height=plot_height,
+        title="Merged Read Length Distribution",
+        x_axis_label="read length",
+        y_axis_label="proportion of reads",
+        tooltips=[
+            ("sample", "@sample_name"),
+            ("length", "@length"),
+            ("reads", "@count"),
+        ],
+    )
+    for idx, (_, dfm) in enumerate(data.groupby("sample_name")):
+        fig.line(
+            "length",
+            "proportion",
+            source=ColumnDataSource(dfm),
+            color=Category20[20][idx % 20],
+            alpha=0.7,
+        )
+    output_file(ofname)
+    save(fig)
+
+
+def plot_read_quality(
+    data: pd.DataFrame, ofname: Path, plot_width: int = 1200, plot_height: int = 600
+) -> None:
+    """Render bokeh plot of median quality by merged read position, per sample.
+
+    :param data:  pd.DataFrame of quality summaries by position, indexed by sample
+    :param ofname:  Path to write HTML bokeh output
+    :param plot_width:  int, pixel width of plot
+    :param plot_height:  int, pixel height of plot
+    """
+    data = data.reset_index(level=0)
+    fig = figure(
+        plot_width=plot_width,
+        plot_height=plot_height,
+        title="Merged Read Quality by Position",
+        x_axis_label="position",
+        y_axis_label="median quality",
+        tooltips=[
+            ("sample", "@sample_name"),
+            ("position", "@position"),
+            ("reads", "@reads"),
+            ("mean", "@mean"),
+            ("quartiles", "@q25 / @median / @q75"),
+        ],
+    )
+    for idx, (_, dfm) in enumerate(data.groupby("sample_name")):
+        fig.line(
+            "position",
+            "median",
+            source=ColumnDataSource(dfm),
+            color=Category20[20][idx % 20],
+            alpha=0.7,
+        )
+    output_file(ofname)
+    save(fig)
+
+
+def plot_read_hash_abundances_static(
+    dfm: pd.DataFrame, ofname: Path, top: int = PLOT_TOP_HASHES
+) -> None:
+    """Write static image of the distribution of unique read counts.
+
+    :param dfm:  pd.DataFrame containing one row per sample/hash combination
+    :param ofname:  Path to output image file
+    :param top:  int, number of most abundant read hashes plotted individually
+
+    Requires the optional matplotlib package.
+    """
+    plt = _get_pyplot()
+    data = hash_quantiles(dfm, top)
+    categories = list(data.index.str.slice(0, 6))
+    fig, axis = plt.subplots(figsize=(max(6, len(categories)), 6))
+    positions = np.arange(len(categories))
+    axis.vlines(positions, data["q0"], data["q100"], color="black")
+    axis.bar(
+        positions,
+        data["q75"] - data["q25"],
+        bottom=data["q25"],
+        color=_hash_colours(data.index),
+        edgecolor="black",
+        alpha=0.6,
+    )
+    axis.scatter(positions, data["q50"], marker="_", s=400, color="black")
+    axis.set_xticks(positions)
+    axis.set_xticklabels(categories, rotation="vertical")
+    if len(data):  # an empty axis cannot be log-scaled
+        axis.set_yscale("log")
+    axis.set_title("Unique Read Abundances By Hash")
+    fig.savefig(ofname, bbox_inches="tight")
+    plt.close(fig)
+
+
+def plot_sample_hash_abundances_static(
+    data: pd.DataFrame, ofname: Path, top: int = PLOT_TOP_HASHES
+) -> None:
+    """Write static image of unique read hash abundance in each sample.
+
+    :param data:  pd.DataFrame containing one row per sample/hash combination
+    :param ofname:  Path to output image file
+    :param top:  int, number of most abundant read hashes plotted individually
+
+    Requires the optional matplotlib package.
+    """
+    plt = _get_pyplot()
+    data = bin_hashes(data, top).reset_index(level=0)
+    sample_names = sorted(set(data["sample_name"]))
+    positions = {name: idx for idx, name in enumerate(sample_names)}
+    categories = list(dict.fromkeys(data["read_hash"]))
+    fig, axis = plt.subplots(figsize=(max(6, len(sample_names) / 4), 6))
+    for rhash, color in zip(categories, _hash_colours(categories)):
+        dfm = data.loc[data["read_hash"] == rhash]
+        axis.scatter(
+            dfm["sample_name"].map(positions),
+            dfm["abundance"],
+            alpha=0.7,
+            color=color,
+            label=rhash[:6],
+        )
+    axis.set_xticks(range(len(sample_names)))
+    axis.set_xticklabels(sample_names, rotation="vertical")
+    if len(data):  # an empty axis cannot be log-scaled
+        axis.set_yscale("log")
+        axis.legend(loc="center left", bbox_to_anchor=(1, 0.5), fontsize="small")
+    axis.set_title("Unique Read Abundance by Sample")
+    fig.savefig(ofname, bbox_inches="tight")
+    plt.close(fig)
+
+
+def plot_trimmomatic_summary_static(data: pd.DataFrame, ofname: Path) -> None:
+    """Write static image of trimmomatic summary data.
+
+    :param data:  pd.DataFrame containing one row per sample
+    :param ofname:  Path to output image file
+
+    Each trimmomatic measure is plotted in its own panel, stacked vertically.
+    Requires the optional matplotlib package.
+    """
+    plt = _get_pyplot()
+    data = data.sort_index()
+    columns = data.loc[:, "Input Read Pairs":"Dropped Read Percent"].columns
+    fig, axes = plt.subplots(
+        len(columns), 1, sharex=True, squeeze=False, figsize=(12, 2 * len(columns))
+    )
+    for axis, colname in zip(axes[:, 0], columns):
+        axis.scatter(range(len(data)), data[colname], alpha=0.4)
+        axis.set_title(colname, fontsize="small")
+    axes[-1, 0].set_xticks(range(len(data)))
+    axes[-1, 0].set_xticklabels(data.index, rotation="vertical")
+    fig.savefig(ofname, bbox_inches="tight")
+    plt.close(fig)
+
+
+def plot_read_lengths_static(data: pd.DataFrame, ofname: Path) -> None:
+    """Write static image of merged read length distribution in each sample.
+
+    :param data:  pd.DataFrame of read count by length, indexed by sample name
+    :param ofname:  Path to output image file
+
+    Requires the optional matplotlib package.
+    """
+    plt = _get_pyplot()
+    fig, axis = plt.subplots(figsize=(12, 6))
+    for _, dfm in data.groupby(level=0):
+        axis.plot(dfm["length"], dfm["count"] / dfm["count"].sum(), alpha=0.7)
+    axis.set_xlabel("read length")
+    axis.set_ylabel("proportion of reads")
+    axis.set_title("Merged Read Length Distribution")
+    fig.savefig(ofname, bbox_inches="tight")
+    plt.close(fig)
+
+
+def plot_read_quality_static(data: pd.DataFrame, ofname: Path) -> None:
+    """Write static image of quality by merged read position, over all samples.
+
+    :param data:  pd.DataFrame of quality summaries by position, indexed by sample
+    :param ofname:  Path to output image file
+
+    The median of each sample is drawn as a line, over the range of the
+    samples' interquartile ranges. Requires the optional matplotlib package.
+    """
+    plt = _get_pyplot()
+    fig, axis = plt.subplots(figsize=(12, 6))
+    if len(data):
+        spread = data.groupby("position").agg({"q25": "min", "q75": "max"})
+        axis.fill_between(spread.index, spread["q25"], spread["q75"], alpha=0.2)
+    for _, dfm in data.groupby(level=0):
+        axis.plot(dfm["position"], dfm["median"], alpha=0.7)
+    axis.set_xlabel("position")
+    axis.set_ylabel("median quality")
+    axis.set_title("Merged Read Quality by Position")
+    fig.savefig(ofname, bbox_inches="tight")
+    plt.close(fig)
+
+
+def _hash_colours(read_hashes: Sequence[str]) -> List[str]:
+    """Return a plot colour for each hash category, in order.
+
+    Read hashes take Category20 colours in turn; OTHER_HASHES is grey.
+    """
+    palette = Category20[20]
+    return [
+        OTHER_COLOUR if rhash == OTHER_HASHES else palette[idx % len(palette)]
+        for idx, rhash in enumerate(read_hashes)
+    ]
+
+
+def _with_datalink(fig, datalink: Optional[str]):
+    """Return figure, with a link to its full data below it if one is given."""
+    if datalink is None:
+        return fig
+    return column(fig, Div(text=f'Full data: <a href="{datalink}">{datalink}</a>'))
+
+
+def _get_pyplot():
+    """Return matplotlib.pyplot, using a non-interactive backend."""
+    try:
+        import matplotlib  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        raise ImportError("the matplotlib package is required for static plots")
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt  # pylint: disable=import-outside-toplevel
+
+    return plt
@@ -0,0 +1,505 @@
+# -*- coding: utf-8 -*-
+"""Module to preview a run's dominant sequences and sample depths, quickly.
+
+A preview reads a fixed number of read pairs from the start of each
+sample's files (or all of them), and trims and merges them in the manner
+of the pipeline, without running trimmomatic or flash:
+
+- reads are clipped where they run into the read-through adapter from the
+  trimmomatic adapter file (PrefixPE/1 and PrefixPE/2 sequences), then
+  quality trimmed with the pipeline's trimmomatic settings (sliding window,
+  leading and trailing quality, minimum length). Pairs are dropped unless
+  both reads survive.
+- pairs are merged with an ungapped overlap merge in the manner of flash
+  with outies allowed (-O): the alignment of the forward read with the
+  reverse complement of the reverse read that has the lowest mismatch
+  density is found, among alignments overlapping by at least MIN_OVERLAP
+  called (non-N) bases with at most MAX_MISMATCH_DENSITY mismatches per
+  base. Mismatched bases are taken from the read with the higher quality.
+  When the reverse read starts before the forward read, or ends before it,
+  the reads have run through a short insert, and only the insert (from
+  the start of the forward read to the end of the reverse read) is kept.
+
+Merged reads are hashed with the run's digest, so previewed hashes match
+the hash IDs of the full run's output whenever the quick trim and merge
+give the same sequence as trimmomatic and flash.
+
+Merged read hashes are streamed through sketching.HeavyHitters and
+sketching.HyperLogLog, so memory use is bounded however many reads are
+previewed, and sample sketches are merged for run-level estimates.
+"""
+
+import gzip
+
+from argparse import Namespace
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice, repeat
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from Bio import SeqIO
+from Bio.SeqIO.QualityIO import FastqGeneralIterator
+
+from .digest import get_digest_function, to_hex
+from .manifest import SampleRecord
+from .planning import estimate_read_count
+from .sketching import HeavyHitters, HyperLogLog, digest_keys
+from .trimmomatic import TRIM_LEADING, TRIM_MINLEN, TRIM_TRAILING, TRIM_WINDOW
+
+# flash defaults: minimum overlap, and maximum mismatches per overlapping base
+MIN_OVERLAP = 10
+MAX_MISMATCH_DENSITY = 0.25
+
+# Adapter bases matched anywhere in a read, and the fewest matched at its end
+ADAPTER_SEED = 12
+MIN_ADAPTER = 8
+
+# Number of read pairs merged and sketched at once, and merged in one block
+CHUNK_SIZE = 10000
+MERGE_BLOCK = 1000
+
+_REVCOMP = str.maketrans("ACGT", "TGCA")
+_N = ord("N")
+
+# Padding for quality strings, above any quality threshold
+_QUAL_PAD = "~"
+
+ReadPair = Tuple[str, str, str, str]
+
+
+class SamplePreview(NamedTuple):
+
+    """Sketches of the merged read hashes previewed from one sample."""
+
+    sample_name: str
+    pairs_read: int
+    pairs_merged: int
+    read_pairs: int
+    hitters: HeavyHitters
+    distinct: HyperLogLog
+
+
+def read_adapters(fpath: Path) -> Tuple[str, str]:
+    """Return the adapters read into by forward and reverse reads.
+
+    :param fpath:  Path to trimmomatic adapter FASTA file
+
+    The file must hold palindrome-mode adapters named Prefix*/1 and
+    Prefix*/2 (e.g. TruSeq3-PE.fa). A forward read that runs through the
+    insert reads into the reverse complement of the /2 adapter, and a
+    reverse read into the reverse complement of the /1 adapter.
+    """
+    if not Path(fpath).is_file():
+        raise ValueError(f"adapter file {fpath} does not exist")
+    prefixes = {
+        record.id[-1]: str(record.seq.reverse_complement()).upper()
+        for record in SeqIO.parse(str(fpath), "fasta")
+        if record.id.startswith("Prefix") and record.id[-2:] in ("/1", "/2")
+    }
+    if set(prefixes) != {"1", "2"}:
+        raise ValueError(f"{fpath} does not hold Prefix*/1 and Prefix*/2 adapters")
+    return prefixes["2"], prefixes["1"]
+
+
+def clip_adapter(seq: str, adapter: str) -> int:
+    """Return length of a read before it runs into the passed adapter.
+
+    :param seq:  str, read sequence
+    :param adapter:  str, adapter sequence the read would run into
+
+    The read is clipped at the first exact match to the first ADAPTER_SEED
+    bases of the adapter, or at a match of at least MIN_ADAPTER adapter
+    bases ending the read.
+    """
+    if not adapter:
+        return len(seq)
+    pos = seq.find(adapter[:ADAPTER_SEED])
+    if pos >= 0:
+        return pos
+    for size in range(min(ADAPTER_SEED, len(seq)) - 1, MIN_ADAPTER - 1, -1):
+        if seq.endswith(adapter[:size]):
+            return len(seq) - size
+    return len(seq)
+
+
+def quality_bounds(quals: List[str], offset: int = 33) -> Tuple[np.ndarray, ...]:
+    """Return start and end of the part of each read kept by quality trimming.
+
+    :param quals:  List of read quality strings
+    :param offset:  int, quality encoding offset (33 or 64)
+
+    Trimming follows the pipeline's trimmomatic steps: each read is cut at
+    the first window of TRIM_WINDOW[0] bases with mean quality below
+    TRIM_WINDOW[1] (keeping those bases at the start of the window that meet
+    the required quality), then bases below TRIM_LEADING and TRIM_TRAILING
+    quality are removed from each end. Reads are processed together, padded
+    to the same length.
+    """
+    window, required = TRIM_WINDOW
+    lengths = np.array([len(_) for _ in quals], dtype=np.int64)
+    width = max(int(lengths.max(initial=0)), window)
+    qual = (
+        _as_array([_.ljust(width, _QUAL_PAD) for _ in quals], width).astype(np.int64)
+        - offset
+    )
+    positions = np.arange(width)
+    rows = np.arange(len(quals))[:, None]
+
+    # Cut at the first failing window that lies within the read
+    sums = np.zeros((len(quals), width + 1), dtype=np.int64)
+    np.cumsum(qual, axis=1, out=sums[:, 1:])
+    fails = (sums[:, window:] - sums[:, :-window] < window * required) & (
+        positions[: width - window + 1] + window <= lengths[:, None]
+    )
+    failed = fails.any(axis=1)
+    first = fails.argmax(axis=1)
+    inwindow = np.minimum(first[:, None] + np.arange(window), width - 1)
+    kept = np.cumprod(qual[rows, inwindow] >= required, axis=1).sum(axis=1)
+    cut = np.where(failed, first + kept, lengths)
+    cut[lengths < window] = 0
+
+    # Remove low quality bases from each end
+    called = (qual >= TRIM_LEADING) & (positions < cut[:, None])
+    starts = np.where(called.any(axis=1), called.argmax(axis=1), cut)
+    called = (qual >= TRIM_TRAILING) & (positions < cut[:, None])
+    ends = np.where(called.any(axis=1), width - called[:, ::-1].argmax(axis=1), 0)
+    return starts, np.maximum(ends, starts)
+
+
+def trim_pairs(
+    pairs: List[ReadPair], adapters: Tuple[str, str], offset: int = 33
+) -> List[Optional[ReadPair]]:
+    """Return adapter-clipped, quality-trimmed read pairs.
+
+    :param pairs:  List of (forward sequence, forward quality, reverse
+                   sequence, reverse quality) tuples
+    :param adapters:  (forward, reverse) read-through adapters, from
+                      read_adapters()
+    :param offset:  int, quality encoding offset (33 or 64)
+
+    Pairs in which either read is shorter than TRIM_MINLEN after trimming
+    are returned as None.
+    """
+    clipped = []
+    for fwd, fwdqual, rev, revqual in pairs:
+        fwdlen, revlen = clip_adapter(fwd, adapters[0]), clip_adapter(rev, adapters[1])
+        clipped.append((fwd[:fwdlen], fwdqual[:fwdlen], rev[:revlen], revqual[:revlen]))
+    if not clipped:
+        return []
+    fwdstarts, fwdends = quality_bounds([_[1] for _ in clipped], offset)
+    revstarts, revends = quality_bounds([_[3] for _ in clipped], offset)
+    trimmed = []  # type: List[Optional[ReadPair]]
+    for (fwd, fwdqual, rev, revqual), fstart, fend, rstart, rend in zip(
+        clipped,
+        fwdstarts.tolist(),
+        fwdends.tolist(),
+        revstarts.tolist(),
+        revends.tolist(),
+    ):
+        if min(fend - fstart, rend - rstart) < TRIM_MINLEN:
+            trimmed.append(None)
+        else:
+            trimmed.append(
+                (
+                    fwd[fstart:fend],
+                    fwdqual[fstart:fend],
+                    rev[rstart:rend],
+                    revqual[rstart:rend],
+                )
+            )
+    return trimmed
+
+
+def merge_pairs(pairs: List[ReadPair], max_overlap: int = 300) -> List[Optional[str]]:
+    """Return merged sequence for each read pair, or None if it does not merge.
+
+    :param pairs:  List of (forward sequence, forward quality, reverse
+                   sequence, reverse quality) tuples
+    :param max_overlap:  int, maximum overlap length (-M in flash); longer
+                         overlaps are allowed, with their mismatch density
+                         taken over max_overlap bases, as in flash
+
+    Alignments are described by the offset of the reverse complemented
+    reverse read from the start of the forward read; negative offsets are
+    read-through alignments in which the reverse read starts before the
+    forward read. Pairs are merged in blocks of MERGE_BLOCK, with reads of
+    any length padded with N to the longest in the block: the called and
+    matching bases at every offset are counted for the whole block at once,
+    as cross-correlations of per-base indicator arrays computed by FFT.
+    """
+    merged = [None] * len(pairs)  # type: List[Optional[str]]
+    for start in range(0, len(pairs), MERGE_BLOCK):
+        block = pairs[start : start + MERGE_BLOCK]
+        merged[start : start + len(block)] = _merge_block(block, max_overlap)
+    return merged
+
+
+def _merge_block(pairs: List[ReadPair], max_overlap: int) -> List[Optional[str]]:
+    """Return merged sequence for each read pair in a block, or None."""
+    if not pairs:
+        return []
+    fwdlens = np.array([len(_[0]) for _ in pairs], dtype=np.int64)
+    revlens = np.array([len(_[2]) for _ in pairs], dtype=np.int64)
+    fwdwidth, revwidth = int(fwdlens.max()), int(revlens.max())
+    fwd = _as_array([_[0].ljust(fwdwidth, "N") for _ in pairs], fwdwidth)
+    fwdqual = _as_array([_[1].ljust(fwdwidth, "!") for _ in pairs], fwdwidth)
+    rev = _as_array(
+        [_[2][::-1].translate(_REVCOMP).ljust(revwidth, "N") for _ in pairs], revwidth
+    )
+    revqual = _as_array([_[3][::-1].ljust(revwidth, "!") for _ in pairs], revwidth)
+
+    # Count called and matching bases at every offset, by cross-correlation:
+    # the forward read base at position i is compared with the reverse read
+    # base at i - offset, and offset k is held in column k % size
+    size = _fft_size(fwdwidth + revwidth)
+    called = _correlate(fwd != _N, rev != _N, size)
+    matches = sum(
+        _correlate(fwd == base, rev == base, size, spectrum=True) for base in b"ACGT"
+    )
+    matches = np.rint(np.fft.irfft(matches, size, axis=1))
+    offsets = np.arange(MIN_OVERLAP - revwidth, fwdwidth - MIN_OVERLAP + 1)
+    called, matches = called[:, offsets % size], matches[:, offsets % size]
+    effective = np.minimum(called, max_overlap)
+    density = np.where(
+        effective >= MIN_OVERLAP, (called - matches) / np.maximum(effective, 1), np.inf
+    )
+    best = density.argmin(axis=1)
+    ok = density[np.arange(len(pairs)), best] <= MAX_MISMATCH_DENSITY
+    best = offsets[best]
+
+    # Build merged reads from the start of the forward read to the end of
+    # the reverse read, taking the higher quality base where both are called
+    cols = np.arange(size)
+    revcols = cols - best[:, None]
+    onrev = (revcols >= 0) & (revcols < revlens[:, None])
+    revcols = np.clip(revcols, 0, revwidth - 1)
+    rows = np.arange(len(pairs))[:, None]
+    revbases, revquals = rev[rows, revcols], revqual[rows, revcols]
+    fwdbases = np.full((len(pairs), size), _N, dtype=np.uint8)
+    fwdquals = np.zeros((len(pairs), size), dtype=np.uint8)
+    fwdbases[:, :fwdwidth], fwdquals[:, :fwdwidth] = fwd, fwdqual
+    onfwd = cols < fwdlens[:, None]
+    use_rev = (
+        onrev & (revbases != _N) & (~onfwd | (fwdbases == _N) | (revquals > fwdquals))
+    )
+    seqs = np.where(use_rev, revbases, fwdbases)
+    lengths = best + revlens
+    return [
+        seq[:length].tobytes().decode("ascii") if merge else None
+        for seq, length, merge in zip(seqs, lengths.tolist(), ok.tolist())
+    ]
+
+
+def _fft_size(length: int) -> int:
+    """Return the smallest length of at least length with no prime factor above 5.
+
+    FFTs of such lengths are much faster than those with large prime factors.
+    """
+    size = length
+    while True:
+        rest = size
+        for factor in (2, 3, 5):
+            while not rest % factor:
+                rest //= factor
+        if rest == 1:
+            return size
+        size += 1
+
+
+def _correlate(
+    fwd: np.ndarray, rev: np.ndarray, size: int, spectrum: bool = False
+) -> np.ndarray:
+    """Return cross-correlation of boolean arrays at every offset, by row.
+
+    Column k holds the number of positions i where fwd[i] and rev[i - k]
+    are both true, with negative offsets wrapped to the end. If spectrum is
+    True, the Fourier transform of the correlation is returned instead, so
+    that correlations can be summed before the inverse transform.
+    """
+    product = np.fft.rfft(fwd, size, axis=1) * np.conj(np.fft.rfft(rev, size, axis=1))
+    if spectrum:
+        return product
+    return np.rint(np.fft.irfft(product, size, axis=1))
+
+
+def preview_sample(
+    sample: SampleRecord,
+    max_pairs: int,
+    algorithm: str = "md5",
+    digest_size: int = 16,
+    max_overlap: int = 300,
+    capacity: int = 100,
+    adapters: Optional[Tuple[str, str]] = None,
+    phred_offset: int = 33,
+) -> SamplePreview:
+    """Return SamplePreview of the merged read hashes in a sample.
+
+    :param sample:  SampleRecord for the sample
+    :param max_pairs:  int, maximum number of read pairs to read (0 for all)
+    :param algorithm:  str, digest algorithm used to identify sequences
+    :param digest_size:  int, digest length in bytes (blake2b only)
+    :param max_overlap:  int, maximum overlap considered when merging
+    :param capacity:  int, number of candidate heavy hitters held
+    :param adapters:  (forward, reverse) read-through adapters clipped from
+                      reads before quality trimming, from read_adapters()
+    :param phred_offset:  int, read quality encoding offset (33 or 64)
+    """
+    digest = get_digest_function(algorithm, digest_size)
+    hitters, distinct = HeavyHitters(capacity), HyperLogLog()
+    pairs_read, pairs_merged = 0, 0
+    limit = max_pairs or None
+    with gzip.open(sample.fwd_read_path, "rt") as fwdfh, gzip.open(
+        sample.rev_read_path, "rt"
+    ) as revfh:
+        reads = islice(
+            zip(FastqGeneralIterator(fwdfh), FastqGeneralIterator(revfh)), limit
+        )
+        chunk = list(islice(reads, CHUNK_SIZE))
+        while chunk:
+            pairs_read += len(chunk)
+            trimmed = trim_pairs(
+                [
+                    (fwd[1].upper(), fwd[2], rev[1].upper(), rev[2])
+                    for fwd, rev in chunk
+                ],
+                adapters or ("", ""),
+                phred_offset,
+            )
+            seqs = [
+                _
+                for _ in merge_pairs([_ for _ in trimmed if _ is not None], max_overlap)
+                if _ is not None
+            ]
+            pairs_merged += len(seqs)
+            digests = [digest(_.encode("ascii")) for _ in seqs]
+            hitters.update(digests, seqs)
+            if digests:
+                distinct.update(digest_keys(digests))
+            chunk = list(islice(reads, CHUNK_SIZE))
+    if max_pairs and pairs_read == max_pairs:
+        read_pairs = estimate_read_count(Path(sample.fwd_read_path), max_pairs)[0]
+    else:
+        read_pairs = pairs_read
+    return SamplePreview(
+        sample.sample_name, pairs_read, pairs_merged, read_pairs, hitters, distinct
+    )
+
+
+def preview_samples(
+    samples: List[SampleRecord], args: Namespace
+) -> List[SamplePreview]:
+    """Return SamplePreviews for each sample, previewed in parallel.
+
+    :param samples:  List of SampleRecords, one per sample
+    :param args:  Namespace of parsed command-line options
+
+    Reads are clipped of the adapters in args.trim_adapters, and trimmed
+    for quality encoded as args.trim_fastq. Samples are previewed on
+    args.threads worker processes.
+    """
+    adapters = read_adapters(args.trim_adapters)
+    jobs = (
+        samples,
+        repeat(args.preview_reads),
+        repeat(args.hash_algorithm),
+        repeat(args.hash_digest_size),
+        repeat(args.merge_maxoverlap),
+        repeat(max(100, 4 * args.preview_top)),
+        repeat(adapters),
+        repeat(64 if args.trim_fastq == "phred64" else 33),
+    )
+    workers = max(1, min(args.threads, len(samples)))
+    if workers == 1:
+        return list(map(preview_sample, *jobs))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(preview_sample, *jobs))
+
+
+def merge_previews(previews: List[SamplePreview]) -> Tuple[HeavyHitters, HyperLogLog]:
+    """Return run-level heavy hitters and distinct count from sample previews.
+
+    :param previews:  List of SamplePreviews, one per sample
+    """
+    hitters, distinct = HeavyHitters(), HyperLogLog()
+    for preview in previews:
+        hitters.capacity = max(hitters.capacity, preview.hitters.capacity)
+        hitters.merge(preview.hitters)
+        distinct.merge(preview.distinct)
+    return hitters, distinct
+
+
+def preview_tables(
+    previews: List[SamplePreview], top: int = 10
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Return sample summary, top hashes by sample, and top hashes for the run.
+
+    :param previews:  List of SamplePreviews, one per sample
+    :param top:  int, number of top hashes to report for each sample and run
+
+    Abundances are estimated over the previewed read pairs; fractions are of
+    the merged pairs previewed.
+    """
+    summary, sample_rows = [], []
+    for preview in previews:
+        ranked = preview.hitters.top(top)
+        for rank, (dgst, abundance, seq) in enumerate(ranked, 1):
+            sample_rows.append(
+                (
+                    preview.sample_name,
+                    rank,
+                    to_hex(dgst),
+                    abundance,
+                    abundance / preview.pairs_merged,
+                    seq,
+                )
+            )
+        summary.append(
+            (
+                preview.sample_name,
+                preview.pairs_read,
+                (
+                    preview.pairs_merged / preview.pairs_read
+                    if preview.pairs_read
+                    else 0.0
+                ),
+                preview.read_pairs,
+                round(preview.distinct.estimate()),
+                to_hex(ranked[0][0]) if ranked else "",
+                ranked[0][1] / preview.pairs_merged if ranked else 0.0,
+            )
+        )
+
+    hitters, _ = merge_previews(previews)
+    run_rows = [
+        (rank, to_hex(dgst), abundance, abundance / hitters.sketch.total, seq)
+        for rank, (dgst, abundance, seq) in enumerate(hitters.top(top), 1)
+    ]
+    hash_columns = ["read_hash", "est_abundance", "est_fraction", "sequence"]
+    return (
+        pd.DataFrame(
+            summary,
+            columns=[
+                "sample_name",
+                "pairs_previewed",
+                "merged_fraction",
+                "est_read_pairs",
+                "est_unique_hashes",
+                "top_hash",
+                "top_fraction",
+            ],
+        ).set_index("sample_name"),
+        pd.DataFrame(
+            sample_rows, columns=["sample_name", "rank"] + hash_columns
+        ).set_index("sample_name"),
+        pd.DataFrame(run_rows, columns=["rank"] + hash_columns).set_index("rank"),
+    )
+
+
+def _as_array(strings: List[str], length: int) -> np.ndarray:
+    """Return strings of equal length as a 2D uint8 array of ASCII codes."""
+    return np.frombuffer("".join(strings).encode("ascii"), dtype=np.uint8).reshape(
+        -1, length
+    )
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""Module to match, strip and demultiplex primers on hashed reads.
+
+Primer matching is applied to the unique sequences in the hashed read
+files, rather than to raw reads, and the result for each unique sequence is
+cached, so each distinct sequence is matched once per run. Candidate primers
+for a sequence are found with an index of exact primer segments (by the
+pigeonhole principle, a primer with at most m mismatches has at least one of
+m + 1 segments matching exactly), and then checked base by base.
+"""
+
+from argparse import Namespace
+from collections import Counter, defaultdict
+from itertools import product
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import pandas as pd
+
+from Bio.Seq import Seq
+from Bio.SeqRecord import SeqRecord
+from tqdm import tqdm
+
+from .digest import get_digest_function, to_hex
+from .hashing import hashed_reads_to_rows
+from .io import (
+    READ_TABLE_DTYPES,
+    TableWriter,
+    read_hashed_reads,
+    table_path,
+    write_hashed_reads,
+)
+from .manifest import SampleRecord
+
+# IUPAC nucleotide codes, and the bases each one matches
+IUPAC_CODES = {
+    "A": "A",
+    "C": "C",
+    "G": "G",
+    "T": "T",
+    "U": "T",
+    "R": "AG",
+    "Y": "CT",
+    "S": "CG",
+    "W": "AT",
+    "K": "GT",
+    "M": "AC",
+    "B": "CGT",
+    "D": "AGT",
+    "H": "ACT",
+    "V": "ACG",
+    "N": "ACGT",
+}
+
+# Maximum number of concrete sequences a degenerate primer segment may expand to
+MAX_SEGMENT_EXPANSIONS = 4096
+
+
+class Marker(NamedTuple):
+
+    """Forward and reverse primers for one marker."""
+
+    name: str
+    forward: str
+    reverse: str
+
+
+class PrimerMatcher:
+
+    """Index of primers anchored at the start of a sequence.
+
+    Primers may contain IUPAC degenerate bases, and are matched with up to
+    max_mismatches substitutions. To match primers at the end of a sequence,
+    index and query the reversed sequences.
+    """
+
+    def __init__(self, primers: Dict[str, str], max_mismatches: int = 2) -> None:
+        """Build segment index for the passed primers.
+
+        :param primers:  dictionary of primer sequences, keyed by name
+        :param max_mismatches:  int, maximum substitutions allowed in a match
+        """
+        self.primers = {key: val.upper() for key, val in primers.items()}
+        self.max_mismatches = max_mismatches
+        self._index = defaultdict(set)  # (start, k-mer) -> primer names
+        self._segments = set()  # (start, end) of each indexed segment
+        for name, primer in self.primers.items():
+            for start, end in _segments(len(primer), max_mismatches + 1):
+                self._segments.add((start, end))
+                for kmer in _expand(primer[start:end]):
+                    self._index[(start, kmer)].add(name)
+
+    def match(self, seq: str) -> List[Tuple[str, int]]:
+        """Return primers matching the start of seq, as (name, mismatches).
+
+        :param seq:  str, sequence to match
+
+        Matches are sorted by increasing number of mismatches.
+        """
+        candidates = set()  # names of primers sharing a segment with seq
+        for start, end in self._segments:
+            candidates.update(self._index.get((start, seq[start:end]), ()))
+        matches = []
+        for name in candidates:
+            mismatches = count_mismatches(self.primers[name], seq)
+            if mismatches <= self.max_mismatches:
+                matches.append((name, mismatches))
+        return sorted(matches, key=lambda _: (_[1], _[0]))
+
+
+class MarkerMatcher:
+
+    """Assign sequences to markers by their forward and reverse primers."""
+
+    def __init__(self, markers: List[Marker], max_mismatches: int = 2) -> None:
+        """Build primer indexes for the passed markers.
+
+        :param markers:  List of Markers
+        :param max_mismatches:  int, maximum substitutions allowed per primer
+        """
+        self.markers = {_.name: _ for _ in markers}
+        self._fwd = PrimerMatcher({_.name: _.forward for _ in markers}, max_mismatches)
+        # Reverse primers are found at the 3' end of a merged read as their
+        # reverse complement; these are indexed reversed, anchored at the end
+        self._rev = PrimerMatcher(
+            {_.name: reverse_complement(_.reverse)[::-1] for _ in markers},
+            max_mismatches,
+        )
+
+    def assign(self, seq: str) -> Optional[Tuple[str, str]]:
+        """Return (marker name, primer-trimmed sequence), or None if unassigned.
+
+        :param seq:  str, merged read sequence
+
+        Sequences are tried in the passed orientation, and then as their
+        reverse complement. The trimmed sequence is always returned in the
+        forward primer orientation.
+        """
+        for query in (seq, reverse_complement(seq)):
+            rev_matches = dict(self._rev.match(query[::-1]))
+            for name, _ in self._fwd.match(query):
+                if name in rev_matches:
+                    marker = self.markers[name]
+                    trimmed = query[
+                        len(marker.forward) : len(query) - len(marker.reverse)
+                    ]
+                    if trimmed:
+                        return (name, trimmed)
+        return None
+
+
+def count_mismatches(primer: str, seq: str) -> int:
+    """Return count of positions in seq incompatible with the (IUPAC) primer.
+
+    :param primer:  str, primer sequence, possibly with degenerate bases
+    :param seq:  str, sequence aligned with the primer at its start
+
+    Positions beyond the end of seq count as mismatches.
+    """
+    mismatches = max(0, len(primer) - len(seq))
+    for pbase, sbase in zip(primer, seq):
+        if sbase not in IUPAC_CODES.get(pbase, pbase):
+            mismatches += 1
+    return mismatches
+
+
+def reverse_complement(seq: str) -> str:
+    """Return reverse complement of a (possibly degenerate) sequence."""
+    return str(Seq(seq).reverse_complement())
+
+
+def parse_primer_file(fpath: Path) -> List[Marker]:
+    """Return list of Markers from a tab-separated primer file.
+
+    :param fpath:  Path to primer file
+
+    Each non-blank line that does not start with "#" gives a marker name,
+    forward primer, and reverse primer, separated by tabs. Both primers are
+    written 5'-3', as ordered.
+    """
+    markers = []
+    with fpath.open("r") as ifh:
+        for line in [_.strip() for _ in ifh if _.strip()]:
+            if line.startswith("#"):
+                continue
+            name, forward, reverse = line.split("\t")[:3]
+            markers.append(Marker(name, forward.upper(), reverse.upper()))
+    return markers
+
+
+def demultiplex_hashed_reads(
+    samples: List[SampleRecord], args: Namespace
+) -> pd.DataFrame:
+    """Split each sample's hashed reads by marker, with primers removed.
+
+    :param samples:  List of SampleRecords, one per sample
+    :param args:  Namespace of parsed command-line options
+
+    For each marker, primer-trimmed reads are re-hashed and written to a
+    FASTA file per sample under args.primerdir/<marker>, and their
+    abundances are written to the table 06_<marker>_reads. Matching is
+    carried out once for each unique sequence in the run.
+
+    Returns pd.DataFrame of assigned read counts by marker, for each sample.
+    """
+    markers = parse_primer_file(args.primers)
+    matcher = MarkerMatcher(markers, args.primer_mismatches)
+    digest = get_digest_function(args.hash_algorithm, args.hash_digest_size)
+    for marker in markers:
+        (args.primerdir / marker.name).mkdir(exist_ok=True)
+    writers = {
+        _.name: TableWriter(
+            table_path(args.outdir, f"06_{_.name}_reads", args.table_format),
+            args.table_format,
+            READ_TABLE_DTYPES,
+        )
+        for _ in markers
+    }
+
+    assigned = {}  # type: Dict[str, Optional[Tuple[str, str]]]
+    counts = {}
+    try:
+        for sample in tqdm(samples, disable=args.disable_tqdm):
+            readfile = Path(sample.hashed_reads)
+            by_marker = defaultdict(Counter)  # type: Dict[str, Counter]
+            unassigned = 0
+            for _, abundance, seq in read_hashed_reads(readfile):
+                if seq not in assigned:
+                    assigned[seq] = matcher.assign(seq)
+                if assigned[seq] is None:
+                    unassigned += abundance
+                else:
+                    name, trimmed = assigned[seq]  # type: ignore
+                    by_marker[name][trimmed] += abundance
+            for marker in markers:
+                hashed = [
+                    SeqRecord(
+                        id=f"{to_hex(digest(key.encode('ascii')))}_{val}", seq=Seq(key)
+                    )
+                    for key, val in by_marker[marker.name].items()
+                ]
+                ofname = args.primerdir / marker.name / readfile.name
+                write_hashed_reads(hashed, ofname)
+                writers[marker.name].write(
+                    pd.DataFrame(
+                        hashed_reads_to_rows(hashed, readfile),
+                        columns=["sample_name", "read_hash", "abundance"],
+                    ).set_index("sample_name")
+                )
+            counts[sample.sample_name] = {
+                **{_.name: sum(by_marker[_.name].values()) for _ in markers},
+                "unassigned": unassigned,
+            }
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    data = pd.DataFrame.from_dict(counts, orient="index")
+    data.index.name = "sample_name"
+    return data
+
+
+def _expand(seq: str) -> List[str]:
+    """Return all concrete sequences matched by a degenerate sequence."""
+    choices = [IUPAC_CODES.get(_, _) for _ in seq]
+    nexpansions = 1
+    for choice in choices:
+        nexpansions *= len(choice)
+    if nexpansions > MAX_SEGMENT_EXPANSIONS:
+        raise ValueError(f"primer segment {seq} is too degenerate to index")
+    return ["".join(_) for _ in product(*choices)]
+
+
+def _segments(length: int, nsegments: int) -> List[Tuple[int, int]]:
+    """Return (start, end) of nsegments near-equal segments covering length."""
+    nsegments = max(1, min(nsegments, length))
+    bounds = [length * _ // nsegments for _ in range(nsegments + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
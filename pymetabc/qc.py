@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""Module to collect merged read length and quality statistics.
+
+Statistics are accumulated as NumPy arrays while merged reads are hashed, so
+they need no extra pass over the FASTQ files. For each sample, a histogram
+of read lengths and a matrix of quality score counts by read position are
+kept, and saved compactly as a compressed .npz file. Per-position quality
+summaries (mean and quantiles) are computed from the count matrix when the
+run-level tables are built.
+"""
+
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+# Quality quantiles reported for each read position
+QUALITY_QUANTILES = {"q10": 0.1, "q25": 0.25, "median": 0.5, "q75": 0.75, "q90": 0.9}
+
+
+class ReadQC:
+
+    """Read length histogram and per-position quality counts for one sample.
+
+    lengths[n] is the count of reads of length n; qualities[p, q] is the
+    count of reads with quality score q at (zero-based) position p. Quality
+    strings are buffered and added in chunks, so the arrays are updated with
+    a few vectorised operations per chunk rather than per read.
+    """
+
+    __slots__ = ("offset", "chunksize", "lengths", "qualities", "_buffer")
+
+    def __init__(self, offset: int = 33, chunksize: int = 10000) -> None:
+        """Create empty statistics.
+
+        :param offset:  int, ASCII offset of quality scores (33 or 64)
+        :param chunksize:  int, number of reads to buffer between updates
+        """
+        self.offset = offset
+        self.chunksize = chunksize
+        self.lengths = np.zeros(0, dtype=np.int64)
+        self.qualities = np.zeros((0, 0), dtype=np.int64)
+        self._buffer = []
+
+    def add(self, quality: str) -> None:
+        """Add the quality string of one read.
+
+        :param quality:  str, FASTQ quality string for the read
+        """
+        self._buffer.append(quality)
+        if len(self._buffer) >= self.chunksize:
+            self.flush()
+
+    def flush(self) -> None:
+        """Add buffered reads to the length and quality arrays."""
+        if not self._buffer:
+            return
+        lengths = np.fromiter((len(_) for _ in self._buffer), dtype=np.int64)
+        scores = (
+            np.frombuffer("".join(self._buffer).encode("ascii"), dtype=np.uint8).astype(
+                np.int64
+            )
+            - self.offset
+        )
+        self._buffer = []
+        # Position of each base within its read
+        starts = np.cumsum(lengths) - lengths
+        positions = np.arange(len(scores)) - np.repeat(starts, lengths)
+
+        self.lengths = _add_padded(self.lengths, np.bincount(lengths))
+        nquals = max(self.qualities.shape[1], int(scores.max(initial=0)) + 1)
+        counts = np.bincount(
+            positions * nquals + scores, minlength=int(lengths.max()) * nquals
+        ).reshape(-1, nquals)
+        self.qualities = _add_padded(self.qualities, counts)
+
+    def save(self, fpath: Path) -> None:
+        """Write statistics to a compressed .npz file.
+
+        :param fpath:  Path to output file
+        """
+        self.flush()
+        with fpath.open("wb") as ofh:
+            np.savez_compressed(ofh, lengths=self.lengths, qualities=self.qualities)
+
+
+def load_read_qc(fpath: Path) -> ReadQC:
+    """Return ReadQC with statistics loaded from a .npz file.
+
+    :param fpath:  Path to file written by ReadQC.save()
+    """
+    readqc = ReadQC()
+    with np.load(fpath) as data:
+        readqc.lengths = data["lengths"]
+        readqc.qualities = data["qualities"]
+    return readqc
+
+
+def read_length_table(fpaths: Iterable[Path]) -> pd.DataFrame:
+    """Return pd.DataFrame of read count by length, for each sample.
+
+    :param fpaths:  iterable of Paths to per-sample .npz files, named by sample
+
+    Only lengths with at least one read are included.
+    """
+    rows = []
+    for fpath in sorted(fpaths):
+        lengths = load_read_qc(fpath).lengths
+        for length in np.flatnonzero(lengths):
+            rows.append((fpath.stem, int(length), int(lengths[length])))
+    return pd.DataFrame(rows, columns=["sample_name", "length", "count"]).set_index(
+        "sample_name"
+    )
+
+
+def read_quality_table(fpaths: Iterable[Path]) -> pd.DataFrame:
+    """Return pd.DataFrame of quality score summaries by read position, per sample.
+
+    :param fpaths:  iterable of Paths to per-sample .npz files, named by sample
+
+    For each position, the number of reads covering it, and the mean and
+    QUALITY_QUANTILES of quality scores at that position, are reported.
+    """
+    tables = []
+    for fpath in sorted(fpaths):
+        qualities = load_read_qc(fpath).qualities
+        reads = qualities.sum(axis=1)
+        table = pd.DataFrame(
+            {
+                "sample_name": fpath.stem,
+                "position": np.arange(len(qualities)) + 1,
+                "reads": reads,
+                "mean": qualities @ np.arange(qualities.shape[1]) / reads,
+            }
+        )
+        cumulative = qualities.cumsum(axis=1)
+        for colname, quantile in QUALITY_QUANTILES.items():
+            table[colname] = np.argmax(cumulative >= quantile * reads[:, None], axis=1)
+        tables.append(table)
+    if not tables:
+        return pd.DataFrame(
+            columns=["position", "reads", "mean"] + list(QUALITY_QUANTILES),
+            index=pd.Index([], name="sample_name"),
+        )
+    return pd.concat(tables).set_index("sample_name")
+
+
+def _add_padded(total: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Return sum of two count arrays, zero-padding each to the larger shape."""
+    shape = tuple(max(_) for _ in zip(total.shape, counts.shape))
+    result = np.zeros(shape, dtype=np.int64)
+    result[tuple(slice(0, _) for _ in total.shape)] += total
+    result[tuple(slice(0, _) for _ in counts.shape)] += counts
+    return result
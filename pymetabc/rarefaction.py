@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""Module to rarefy read hash abundances, and compute rarefaction curves.
+
+Each sample's vector of read hash counts is subsampled without replacement
+by multivariate hypergeometric sampling, for many iterations at once. Every
+sample is given its own child seed spawned from a single run seed, so results
+are reproducible whatever the number of worker processes.
+
+Rarefaction curves are computed in the same pass: every iteration at each
+requested depth is drawn from the sample's counts in a single vectorised
+call, so the cost of a curve does not grow with Python-level loops over
+iterations.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .io import TableWriter
+
+# Explicit column types for the tidy table of rarefied read hash abundances
+RAREFIED_TABLE_DTYPES = {
+    "sample_name": str,
+    "iteration": "int64",
+    "read_hash": str,
+    "abundance": "int64",
+}
+
+
+class RarefactionJob(NamedTuple):
+
+    """Read hash counts and rarefaction parameters for one sample."""
+
+    sample_name: str
+    hashes: np.ndarray
+    counts: np.ndarray
+    depth: int
+    iterations: int
+    curve_depths: Tuple[int, ...]
+    seed: np.random.SeedSequence
+
+
+def rarefy_readtable(
+    readtable: pd.DataFrame,
+    depth: int,
+    iterations: int = 100,
+    seed: Optional[int] = None,
+    curve_depths: Iterable[int] = (),
+    workers: int = 1,
+    writer: Optional[TableWriter] = None,
+) -> pd.DataFrame:
+    """Rarefy read hash abundances in each sample, and return rarefaction curves.
+
+    :param readtable:  pd.DataFrame of read hash abundance, indexed by sample name
+    :param depth:  int, number of reads to subsample from each sample
+    :param iterations:  int, number of subsamples to draw for each sample
+    :param seed:  int, seed for the run (None for a random seed)
+    :param curve_depths:  Iterable of depths at which to report richness
+    :param workers:  int, number of worker processes
+    :param writer:  optional TableWriter; if given, the rarefied abundances
+                    are written to it sample by sample, in sparse (tidy) form
+                    with one row per sample, iteration and observed hash
+
+    Samples with fewer than depth reads are not rarefied, and curve depths
+    greater than a sample's read count are skipped for that sample.
+
+    Returns pd.DataFrame of mean and standard deviation of the number of
+    observed hashes, by sample and depth.
+    """
+    curve_depths = tuple(sorted(set(curve_depths) | {depth}, reverse=True))
+    groups = sorted(readtable.groupby(level=0), key=lambda _: _[0])
+    seeds = np.random.SeedSequence(seed).spawn(len(groups))
+    jobs = [
+        RarefactionJob(
+            name,
+            group["read_hash"].values,
+            group["abundance"].values.astype(np.int64),
+            depth,
+            iterations,
+            curve_depths,
+            seedseq,
+        )
+        for (name, group), seedseq in zip(groups, seeds)
+    ]
+
+    workers = max(1, min(workers, len(jobs)))
+    curves = []
+    if workers == 1:
+        results = map(rarefy_sample, jobs)
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = executor.map(rarefy_sample, jobs)
+    try:
+        for rarefied, curve in results:
+            if writer is not None:
+                writer.write(rarefied)
+            curves.append(curve)
+    finally:
+        if workers > 1:
+            executor.shutdown()
+
+    if curves:
+        return pd.concat(curves)
+    return pd.DataFrame(
+        columns=["depth", "richness_mean", "richness_sd"],
+        index=pd.Index([], name="sample_name"),
+    )
+
+
+def rarefy_sample(job: RarefactionJob) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Return rarefied abundances and rarefaction curve for one sample.
+
+    :param job:  RarefactionJob describing the sample
+
+    Returns a tuple of (rarefied abundances in sparse tidy form, richness by
+    depth), both indexed by sample name.
+    """
+    rng = np.random.default_rng(job.seed)
+    total = int(job.counts.sum())
+    rarefied = np.zeros((0, len(job.counts)), dtype=np.int64)
+    curve = []
+    for depth in [_ for _ in job.curve_depths if _ <= total]:
+        # Draw every iteration at this depth from the sample in one call
+        draws = rng.multivariate_hypergeometric(
+            job.counts, depth, size=job.iterations, method="marginals"
+        )
+        richness = (draws > 0).sum(axis=1)
+        curve.append((job.sample_name, depth, richness.mean(), richness.std()))
+        if depth == job.depth:
+            rarefied = draws
+
+    iteration, column = np.nonzero(rarefied)
+    rarefied_table = pd.DataFrame(
+        {
+            "sample_name": job.sample_name,
+            "iteration": iteration,
+            "read_hash": job.hashes[column],
+            "abundance": rarefied[iteration, column],
+        },
+        columns=list(RAREFIED_TABLE_DTYPES),
+    ).set_index("sample_name")
+    curve_table = pd.DataFrame(
+        curve, columns=["sample_name", "depth", "richness_mean", "richness_sd"]
+    ).set_index("sample_name")
+    return rarefied_table, curve_table
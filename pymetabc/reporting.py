@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""Module to build reports from the tables written by the pipeline.
+
+Report jobs read their input from the saved stage tables, rather than from
+the pipeline's in-memory dataframes, so they can be run in parallel worker
+processes once the pipeline has finished.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import pandas as pd
+
+from . import io, plotting
+from .aggregation import PLOT_TOP_HASHES
+
+# Report modes: interactive bokeh HTML, static images, summary table only, none
+REPORT_MODES = ("interactive", "static", "summary", "none")
+
+
+class ReportJob(NamedTuple):
+
+    """A single report output, built from one saved table."""
+
+    plotfunc: Callable
+    infname: Path
+    fmt: str
+    dtypes: Optional[Dict]
+    ofname: Path
+    options: Optional[Dict] = None
+
+
+def build_report_jobs(
+    outdir: Path,
+    fmt: str,
+    mode: str,
+    top: int = PLOT_TOP_HASHES,
+    readstem: str = "05_thresholded_reads",
+) -> List[ReportJob]:
+    """Return list of plotting jobs for the passed report mode.
+
+    :param outdir:  Path to pipeline output directory
+    :param fmt:  str, format of the pipeline's output tables
+    :param mode:  str, report mode (one of REPORT_MODES)
+    :param top:  int, number of most abundant read hashes plotted individually
+    :param readstem:  str, name of the read hash table to plot abundances from
+
+    Only the "interactive" and "static" modes produce plotting jobs. Read
+    hash abundance plots show the top read hashes, with all others binned;
+    interactive plots link to the full read table, which sits beside them.
+    """
+    if mode == "interactive":
+        funcs = (
+            plotting.plot_trimmomatic_summary,
+            plotting.plot_read_hash_abundances,
+            plotting.plot_sample_hash_abundances,
+            plotting.plot_read_lengths,
+            plotting.plot_read_quality,
+        )
+        suffix = ".html"
+    elif mode == "static":
+        funcs = (
+            plotting.plot_trimmomatic_summary_static,
+            plotting.plot_read_hash_abundances_static,
+            plotting.plot_sample_hash_abundances_static,
+            plotting.plot_read_lengths_static,
+            plotting.plot_read_quality_static,
+        )
+        suffix = ".png"
+    else:
+        return []
+
+    trimmed = io.table_path(outdir, "02_trimmed", fmt)
+    lengths = io.table_path(outdir, "04_read_lengths", fmt)
+    quality = io.table_path(outdir, "04_read_quality", fmt)
+    reads = io.table_path(outdir, readstem, fmt)
+    options = {"top": top}  # type: Dict
+    if mode == "interactive":
+        options["datalink"] = reads.name
+    return [
+        ReportJob(funcs[0], trimmed, fmt, None, outdir / f"02_summaries{suffix}"),
+        ReportJob(funcs[3], lengths, fmt, None, outdir / f"04_read_lengths{suffix}"),
+        ReportJob(funcs[4], quality, fmt, None, outdir / f"04_read_quality{suffix}"),
+        ReportJob(
+            funcs[1],
+            reads,
+            fmt,
+            io.READ_TABLE_DTYPES,
+            outdir / f"05_abundance_by_hash{suffix}",
+            options,
+        ),
+        ReportJob(
+            funcs[2],
+            reads,
+            fmt,
+            io.READ_TABLE_DTYPES,
+            outdir / f"05_abundance_by_sample{suffix}",
+            options,
+        ),
+    ]
+
+
+def run_report_jobs(jobs: List[ReportJob], workers: int = 1) -> List[Path]:
+    """Run plotting jobs, in parallel worker processes if workers > 1.
+
+    :param jobs:  List of ReportJobs
+    :param workers:  int, maximum number of worker processes
+
+    Returns the list of paths to report outputs, in job order.
+    """
+    workers = min(workers, len(jobs))
+    if workers <= 1:
+        return [run_report_job(_) for _ in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(run_report_job, jobs))
+
+
+def run_report_job(job: ReportJob) -> Path:
+    """Run a single plotting job, reading its input from disk.
+
+    :param job:  ReportJob to run
+    """
+    data = io.read_table(job.infname, job.fmt, job.dtypes)
+    job.plotfunc(data, job.ofname, **(job.options or {}))
+    return job.ofname
+
+
+def summarise_read_hashes(readtable: pd.DataFrame) -> pd.DataFrame:
+    """Return pd.DataFrame summarising thresholded read hashes for each sample.
+
+    :param readtable:  pd.DataFrame of thresholded read hash abundance by sample
+
+    The summary gives the number of read hashes and reads surviving the
+    threshold, and the most abundant read hash, for each sample.
+    """
+    columns = ["thresholded_hashes", "thresholded_reads", "top_hash", "top_abundance"]
+    if not len(readtable):
+        return pd.DataFrame(columns=columns, index=pd.Index([], name="sample_name"))
+    ranked = readtable.sort_values("abundance", ascending=False)
+    grouped = ranked.groupby(level=0)
+    summary = pd.DataFrame(
+        {
+            "thresholded_hashes": grouped["abundance"].size(),
+            "thresholded_reads": grouped["abundance"].sum(),
+            "top_hash": grouped["read_hash"].first(),
+            "top_abundance": grouped["abundance"].first(),
+        },
+        columns=columns,
+    )
+    summary.index.name = "sample_name"
+    return summary
+
+
+def write_summary_report(
+    outdir: Path, fmt: str, readstem: str = "05_thresholded_reads"
+) -> Path:
+    """Write a per-sample summary table from the saved thresholded read table.
+
+    :param outdir:  Path to pipeline output directory
+    :param fmt:  str, format of the pipeline's output tables
+    :param readstem:  str, name of the read hash table to summarise
+
+    Returns the path to the summary table.
+    """
+    readtable = io.read_table(
+        io.table_path(outdir, readstem, fmt), fmt, io.READ_TABLE_DTYPES
+    )
+    ofname = io.table_path(outdir, "05_summary", fmt)
+    io.write_table(summarise_read_hashes(readtable), ofname, fmt)
+    return ofname
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""Module to process samples in local scratch space, publishing final outputs.
+
+When a scratch directory is given, each sample is trimmed, merged and hashed
+in its own temporary directory under it (e.g. node-local disk or tmpfs), so
+that the many small writes made by trimmomatic and flash do not touch the
+output filesystem. Only the files needed downstream are then published to
+the output directory:
+
+- the trimmomatic summary, to <trim_dir>/<sample>/summary.txt
+- the flash merged reads, to <merge_dir>/<sample>/<name>.extendedFrags.fastq
+- the hashed reads, to <hash_dir>/<name>.extendedFrags.fasta, with its
+  sidecar metadata file
+- the read length and quality statistics, to <qc_dir>/<sample>.npz
+
+Each file is copied alongside its destination under a temporary name, and
+renamed into place, so a published file is never seen partially written.
+All other intermediates (trimmed and untrimmed reads, the trimmomatic log,
+flash's notCombined and histogram files) are removed with the scratch
+directory.
+"""
+
+import os
+import shutil
+import subprocess
+import time
+
+from argparse import Namespace
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Generator, List
+
+from tqdm import tqdm
+
+from . import events
+from .flash import generate_flash_commands, parse_flash_stats
+from .hashing import hash_read_file
+from .io import hashed_meta_path
+from .manifest import SampleRecord
+from .trimmomatic import generate_trimmomatic_commands, parse_trimmomatic_summary
+
+
+def process_samples_in_scratch(
+    samples: List[SampleRecord], args: Namespace
+) -> Generator:
+    """Trim, merge and hash each sample in scratch space, in turn.
+
+    :param samples:  List of SampleRecords, one per sample; trimmed_dir and
+                     merged_dir must already be set
+    :param args:  Namespace of parsed command-line options
+
+    Yields each SampleRecord once its outputs have been published, updated
+    as by the trimming, merging and hashing stages.
+    """
+    for sample in tqdm(samples, disable=args.disable_tqdm):
+        time0 = time.perf_counter()
+        process_sample_in_scratch(sample, args)
+        events.emit(
+            "sample_end",
+            stage="scratch",
+            sample=sample.sample_name,
+            seconds=round(time.perf_counter() - time0, 6),
+            reads=sample.hashed_total,
+        )
+        yield sample
+
+
+def process_sample_in_scratch(sample: SampleRecord, args: Namespace) -> SampleRecord:
+    """Trim, merge and hash a single sample in scratch space.
+
+    :param sample:  SampleRecord for the sample; trimmed_dir and merged_dir
+                    must already be set
+    :param args:  Namespace of parsed command-line options
+
+    Returns the SampleRecord, updated with the trimmomatic and flash commands
+    that were run (which refer to scratch paths), the read statistics they
+    reported, and the paths to the published outputs.
+    """
+    with TemporaryDirectory(
+        prefix=f"pymetabc_{sample.sample_name}_", dir=args.scratch
+    ) as tmpdir:
+        # Stand-in record pointing the tool commands at scratch
+        local = SampleRecord(
+            sample.sample_name,
+            sample.sample_dir,
+            sample.fwd_read_path,
+            sample.rev_read_path,
+        )
+        local.trimmed_dir = os.path.join(tmpdir, "trimmed")
+        local.merged_dir = os.path.join(tmpdir, "merged")
+        os.mkdir(local.trimmed_dir)
+        os.mkdir(local.merged_dir)
+
+        # Trim reads
+        cmd, _ = next(generate_trimmomatic_commands([local], args))
+        _run_tool(cmd)
+        sample.trim_cmd = cmd
+        sample.trim_output = sample.trimmed_dir
+        sample.trim_summary = os.path.join(sample.trimmed_dir, "summary.txt")
+        sample.trim_stats = parse_trimmomatic_summary(
+            Path(local.trimmed_dir) / "summary.txt"
+        )
+        publish_file(Path(local.trimmed_dir) / "summary.txt", Path(sample.trim_summary))
+
+        # Merge trimmed reads
+        cmd, _ = next(generate_flash_commands([local], args))
+        result = _run_tool(cmd)
+        sample.merge_cmd = cmd
+        sample.merge_stats = parse_flash_stats(result.stdout.decode("utf-8"))
+        readfile = list(Path(local.merged_dir).glob("*.extendedFrags.fastq"))[0]
+
+        # Hash merged reads
+        ofname = Path(tmpdir) / readfile.with_suffix(".fasta").name
+        qcfname = Path(tmpdir) / f"{sample.sample_name}.npz"
+        sample.hashed_total, sample.filter_stats = hash_read_file(
+            readfile, ofname, args, qcfname
+        )
+        sample.hashed_reads = str(args.hashdir / ofname.name)
+        sample.read_qc = str(args.qcdir / qcfname.name)
+        publish_file(readfile, Path(sample.merged_dir) / readfile.name)
+        publish_file(ofname, Path(sample.hashed_reads))
+        publish_file(
+            hashed_meta_path(ofname), hashed_meta_path(Path(sample.hashed_reads))
+        )
+        publish_file(qcfname, Path(sample.read_qc))
+    return sample
+
+
+def publish_file(src: Path, dest: Path) -> None:
+    """Copy src to dest so that dest appears atomically.
+
+    :param src:  Path to file to publish
+    :param dest:  Path to published file
+
+    The file is first moved to a hidden temporary name in the destination
+    directory, which may be a copy if src is on another filesystem, and then
+    renamed to dest with os.replace().
+    """
+    partial = dest.with_name(f".{dest.name}.partial")
+    try:
+        shutil.move(str(src), str(partial))
+        os.replace(partial, dest)
+    finally:
+        if partial.exists():
+            partial.unlink()
+
+
+def _run_tool(cmd: List[str]) -> subprocess.CompletedProcess:
+    """Run a third-party tool command, raising an error if it fails."""
+    return subprocess.run(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=False, check=True
+    )
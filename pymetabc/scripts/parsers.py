@@ -10,6 +10,11 @@ from pathlib import Path
 from typing import List, Optional
 
 from pymetabc import ADAPTER_PATH
+from pymetabc.aggregation import PLOT_TOP_HASHES
+from pymetabc.contamination import CONTROL_MODES
+from pymetabc.digest import DIGEST_ALGORITHMS
+from pymetabc.io import TABLE_FORMATS
+from pymetabc.reporting import REPORT_MODES
 
 
 def parse_cmdline(argv: Optional[List] = None) -> Namespace:
@@ -25,6 +30,27 @@ def parse_cmdline(argv: Optional[List] = None) -> Namespace:
     if argv is None:  # Use command-line
         argv = sys.argv[1:]
     parser = build_parser()
+    args = parser.parse_args([str(_) for _ in argv])
+    if args.batch is None and (args.indir is None or args.outdir is None):
+        parser.error("indir and outdir are required unless --batch is given")
+    if args.batch is not None and args.watch:
+        parser.error("--batch cannot be combined with --watch")
+    if args.preview and (args.dryrun or args.watch):
+        parser.error("--preview cannot be combined with --dryrun or --watch")
+    if args.report_top < 1:
+        parser.error("--report_top must be at least 1")
+    return args
+
+
+def parse_index_cmdline(argv: Optional[List] = None) -> Namespace:
+    """Return Namespace parsed from pymetabc-index commmand-line options.
+
+    :param argv:  List of command-line options
+                  (used for testing)
+    """
+    if argv is None:  # Use command-line
+        argv = sys.argv[1:]
+    parser = build_index_parser()
     return parser.parse_args([str(_) for _ in argv])
 
 
@@ -67,7 +93,109 @@ def build_parser() -> ArgumentParser:
         dest="dryrun",
         action="store_true",
         default=False,
-        help="do not run third-party tools (for testing)",
+        help="estimate read counts, runtime, memory and disk use, then stop",
+    )
+    parser_main.add_argument(
+        "--preview",
+        dest="preview",
+        action="store_true",
+        default=False,
+        help="estimate the most abundant merged read hashes and sample depths "
+        "from a sample of reads, without trimming or merging, then stop",
+    )
+    parser_main.add_argument(
+        "--preview_reads",
+        action="store",
+        dest="preview_reads",
+        default=10000,
+        type=int,
+        help="number of read pairs previewed per sample (0 for all)",
+    )
+    parser_main.add_argument(
+        "--preview_top",
+        action="store",
+        dest="preview_top",
+        default=10,
+        type=int,
+        help="number of most abundant hashes reported per sample and run",
+    )
+    parser_main.add_argument(
+        "--scratch",
+        action="store",
+        dest="scratch",
+        default=None,
+        type=Path,
+        help="node-local scratch directory (e.g. tmpfs) in which to trim, merge "
+        "and hash each sample; only final outputs are copied to the output "
+        "directory",
+    )
+    parser_main.add_argument(
+        "--watch",
+        dest="watch",
+        action="store_true",
+        default=False,
+        help="watch the input directory, processing each sample directory "
+        "(*-ds.*) as soon as its read files are complete",
+    )
+    parser_main.add_argument(
+        "--watch_interval",
+        action="store",
+        dest="watch_interval",
+        default=60.0,
+        type=float,
+        help="seconds between polls of the input directory in watch mode",
+    )
+    parser_main.add_argument(
+        "--watch_timeout",
+        action="store",
+        dest="watch_timeout",
+        default=3600.0,
+        type=float,
+        help="seconds without a new sample after which watch mode stops",
+    )
+    parser_main.add_argument(
+        "--batch",
+        action="store",
+        dest="batch",
+        default=None,
+        type=Path,
+        help="tab-separated file of input and output directory pairs, one "
+        "pair per line, to process in place of indir and outdir",
+    )
+    parser_main.add_argument(
+        "--batch_workers",
+        action="store",
+        dest="batch_workers",
+        default=1,
+        type=int,
+        help="number of samples, from any input directory, to process at once "
+        "in batch mode (threads are shared between them)",
+    )
+    parser_main.add_argument(
+        "--batch_summary",
+        action="store",
+        dest="batch_summary",
+        default=None,
+        type=Path,
+        help="path to combined read accounting table for all batch outputs",
+    )
+    parser_main.add_argument(
+        "--table_format",
+        action="store",
+        dest="table_format",
+        default="tsv",
+        choices=tuple(TABLE_FORMATS),
+        type=str,
+        help="format for output tables (parquet and feather require pyarrow)",
+    )
+    parser_main.add_argument(
+        "--events",
+        action="store",
+        dest="events",
+        default=None,
+        type=str,
+        help="write progress events as JSON lines to this file, or to a socket "
+        "given as tcp://host:port or unix:///path",
     )
     parser_main.add_argument(
         "--disable_tqdm",
@@ -81,6 +209,7 @@ def build_parser() -> ArgumentParser:
     parser_main.add_argument(
         action="store",
         dest="indir",
+        nargs="?",
         default=None,
         type=Path,
         help="input directory of FASTQ files",
@@ -88,6 +217,7 @@ def build_parser() -> ArgumentParser:
     parser_main.add_argument(
         action="store",
         dest="outdir",
+        nargs="?",
         default=None,
         type=Path,
         help="output directory for results",
@@ -171,6 +301,71 @@ def build_parser() -> ArgumentParser:
         type=str,
         help="directory name for merged read hashing output",
     )
+    parser_main.add_argument(
+        "--qc_dir",
+        action="store",
+        dest="qc_dir",
+        default="04_qc",
+        type=str,
+        help="directory name for merged read length and quality statistics",
+    )
+    parser_main.add_argument(
+        "--hash_algorithm",
+        action="store",
+        dest="hash_algorithm",
+        default="md5",
+        choices=DIGEST_ALGORITHMS,
+        type=str,
+        help="digest algorithm used to identify unique merged reads",
+    )
+    parser_main.add_argument(
+        "--hash_digest_size",
+        action="store",
+        dest="hash_digest_size",
+        default=16,
+        type=int,
+        help="digest length in bytes (blake2b only)",
+    )
+    parser_main.add_argument(
+        "--hash_min_length",
+        action="store",
+        dest="hash_min_length",
+        default=None,
+        type=int,
+        help="discard merged reads shorter than this before hashing",
+    )
+    parser_main.add_argument(
+        "--hash_max_length",
+        action="store",
+        dest="hash_max_length",
+        default=None,
+        type=int,
+        help="discard merged reads longer than this before hashing",
+    )
+    parser_main.add_argument(
+        "--hash_max_ns",
+        action="store",
+        dest="hash_max_ns",
+        default=None,
+        type=int,
+        help="discard merged reads with more N bases than this before hashing",
+    )
+    parser_main.add_argument(
+        "--hash_max_ee",
+        action="store",
+        dest="hash_max_ee",
+        default=None,
+        type=float,
+        help="discard merged reads with more expected errors than this "
+        "before hashing",
+    )
+    parser_main.add_argument(
+        "--index",
+        dest="index",
+        action="store_true",
+        default=False,
+        help="build a memory-mapped hash to sequence index of hashed reads",
+    )
 
     # Thresholding
     parser_main.add_argument(
@@ -197,23 +392,254 @@ def build_parser() -> ArgumentParser:
         type=int,
         help="threshold minimum abundance in a run",
     )
-    # To be recovered when a control abundance threshold method is
-    # implemented
-    # parser_main.add_argument(
-    #     "--thresh_controls",
-    #     action="store",
-    #     dest="thresh_controls",
-    #     default="",
-    #     type=str,
-    #     help="list of control sample names",
-    # )
-    # parser_main.add_argument(
-    #     "--thresh_percentile",
-    #     action="store",
-    #     dest="thresh_percentile",
-    #     default=0.95,
-    #     type=float,
-    #     help="threshold control percentile",
-    # )
+    parser_main.add_argument(
+        "--thresh_controls",
+        action="store",
+        dest="thresh_controls",
+        nargs="+",
+        default=None,
+        type=str,
+        help="control sample names or glob patterns (e.g. 'EB_*'); if given, "
+        "contamination seen in the controls is removed from the other samples",
+    )
+    parser_main.add_argument(
+        "--thresh_percentile",
+        action="store",
+        dest="thresh_percentile",
+        default=0.95,
+        type=float,
+        help="percentile of each hash's abundance across controls taken as its "
+        "contamination level",
+    )
+    parser_main.add_argument(
+        "--control_mode",
+        action="store",
+        dest="control_mode",
+        default="subtract",
+        choices=CONTROL_MODES,
+        type=str,
+        help="subtract contamination levels from sample abundances, or zero "
+        "(flag) abundances at or below them",
+    )
+    # Chimera removal
+    parser_main.add_argument(
+        "--chimeras",
+        dest="chimeras",
+        action="store_true",
+        default=False,
+        help="flag and remove chimeras from each sample's thresholded reads; "
+        "contamination removal, rarefaction and reports then use the "
+        "non-chimeric reads",
+    )
+    parser_main.add_argument(
+        "--chimera_dir",
+        action="store",
+        dest="chimera_dir",
+        default="05_nonchimeric",
+        type=str,
+        help="directory name for non-chimeric read output",
+    )
+    parser_main.add_argument(
+        "--chimera_abskew",
+        action="store",
+        dest="chimera_abskew",
+        default=2.0,
+        type=float,
+        help="minimum abundance of a chimera's parents, relative to the chimera",
+    )
+    parser_main.add_argument(
+        "--chimera_min_diffs",
+        action="store",
+        dest="chimera_min_diffs",
+        default=3,
+        type=int,
+        help="minimum number of differences by which a two-parent model must "
+        "beat the closest single parent to flag a chimera",
+    )
+    # Primer demultiplexing
+    parser_main.add_argument(
+        "--primers",
+        action="store",
+        dest="primers",
+        default=None,
+        type=Path,
+        help="tab-separated file of marker name, forward and reverse primers; "
+        "if given, hashed reads are demultiplexed by marker",
+    )
+    parser_main.add_argument(
+        "--primer_dir",
+        action="store",
+        dest="primer_dir",
+        default="06_primers",
+        type=str,
+        help="directory name for primer-trimmed read output",
+    )
+    parser_main.add_argument(
+        "--primer_mismatches",
+        action="store",
+        dest="primer_mismatches",
+        default=2,
+        type=int,
+        help="maximum mismatches allowed in each primer match",
+    )
+
+    # Reporting
+    parser_main.add_argument(
+        "--report",
+        action="store",
+        dest="report",
+        default="interactive",
+        choices=REPORT_MODES,
+        type=str,
+        help="report mode: interactive bokeh HTML, static images (requires "
+        "matplotlib), per-sample summary table only, or none",
+    )
+    parser_main.add_argument(
+        "--report_top",
+        action="store",
+        dest="report_top",
+        default=PLOT_TOP_HASHES,
+        type=int,
+        help="number of most abundant read hashes plotted individually; all "
+        "other hashes are binned together",
+    )
+
+    # Read accounting
+    parser_main.add_argument(
+        "--validate_counts",
+        dest="validate_counts",
+        action="store_true",
+        default=False,
+        help="fail if read counts do not reconcile between stages",
+    )
+
+    # Rarefaction
+    parser_main.add_argument(
+        "--rarefy_depth",
+        action="store",
+        dest="rarefy_depth",
+        default=None,
+        type=int,
+        help="number of reads to subsample from each sample; if given, "
+        "thresholded read hash abundances are rarefied",
+    )
+    parser_main.add_argument(
+        "--rarefy_iterations",
+        action="store",
+        dest="rarefy_iterations",
+        default=100,
+        type=int,
+        help="number of rarefaction subsamples to draw for each sample",
+    )
+    parser_main.add_argument(
+        "--rarefy_seed",
+        action="store",
+        dest="rarefy_seed",
+        default=None,
+        type=int,
+        help="random seed for rarefaction (default random)",
+    )
+    parser_main.add_argument(
+        "--rarefy_curve_depths",
+        action="store",
+        dest="rarefy_curve_depths",
+        nargs="+",
+        default=[],
+        type=int,
+        help="additional depths at which to report rarefied hash richness",
+    )
+
+    return parser_main
+
+
+def build_index_parser() -> ArgumentParser:
+    """Return ArgumentParser for pymetabc-index."""
+    # Parent parser
+    parser_main = ArgumentParser(
+        prog="pymetabc-index", formatter_class=ArgumentDefaultsHelpFormatter
+    )
+    parser_main.add_argument(
+        "-l",
+        "--logfile",
+        dest="logfile",
+        action="store",
+        default=None,
+        type=Path,
+        help="path to logfile output",
+    )
+    parser_main.add_argument(
+        "-v",
+        "--verbose",
+        dest="verbose",
+        action="store_true",
+        default=False,
+        help="Report verbose output to log",
+    )
+    subparsers = parser_main.add_subparsers(
+        title="subcommands", dest="subcommand", metavar="{build,lookup}"
+    )
+    subparsers.required = True
+
+    # Build an index from hashed read directories
+    parser_build = subparsers.add_parser(
+        "build",
+        formatter_class=ArgumentDefaultsHelpFormatter,
+        help="build sequence index from hashed read FASTA files",
+    )
+    parser_build.add_argument(
+        action="store", dest="index", type=Path, help="path to output index file"
+    )
+    parser_build.add_argument(
+        action="store",
+        dest="indirs",
+        nargs="+",
+        type=Path,
+        help="directories of hashed read FASTA files",
+    )
+
+    # Look up sequences for read hashes in an index
+    parser_lookup = subparsers.add_parser(
+        "lookup",
+        formatter_class=ArgumentDefaultsHelpFormatter,
+        help="write sequences for read hashes",
+    )
+    parser_lookup.add_argument(
+        action="store", dest="index", type=Path, help="path to sequence index file"
+    )
+    parser_lookup.add_argument(
+        action="store",
+        dest="hashes",
+        nargs="*",
+        default=[],
+        type=str,
+        help="read hashes to look up",
+    )
+    parser_lookup.add_argument(
+        "-i",
+        "--infile",
+        action="store",
+        dest="infile",
+        default=None,
+        type=str,
+        help="file of read hashes to look up, one per line ('-' for STDIN)",
+    )
+    parser_lookup.add_argument(
+        "-o",
+        "--outfile",
+        action="store",
+        dest="outfile",
+        default=None,
+        type=Path,
+        help="path to output file (default STDOUT)",
+    )
+    parser_lookup.add_argument(
+        "--format",
+        action="store",
+        dest="format",
+        default="fasta",
+        choices=("fasta", "tab"),
+        type=str,
+        help="output format",
+    )
 
     return parser_main
@@ -5,15 +5,51 @@ import sys
 import time
 
 from argparse import Namespace
+from contextlib import ExitStack
 from logging import Logger
-from typing import List, Optional
-
-from pymetabc import flash, hashing, io, plotting, thresholding, trimmomatic
+from multiprocessing import cpu_count
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from tqdm import tqdm
+
+from pymetabc import (
+    accounting,
+    batching,
+    chimeras,
+    contamination,
+    events,
+    flash,
+    hashing,
+    io,
+    planning,
+    preview,
+    primers,
+    qc,
+    rarefaction,
+    reporting,
+    scratch,
+    thresholding,
+    trimmomatic,
+    watch,
+)
+
+from pymetabc.manifest import SampleRecord, manifest_to_dataframe
 
 from .logger import build_logger
 from .parsers import parse_cmdline
 from .. import __version__
 
+# Tables with one row per sample, added to batch by batch in watch mode
+STAGE_TABLES = (
+    "01_input_files",
+    "02_trimmed",
+    "03_merged",
+    "04_hashed",
+    "05_thresholded",
+    "05_read_accounting",
+)
+
 
 #  Main function: run as the pymetabc script
 def run_main(argv: Optional[List] = None, logger: Optional[Logger] = None) -> int:
@@ -48,8 +84,37 @@ def run_main(argv: Optional[List] = None, logger: Optional[Logger] = None) -> in
     if logger is None:
         logger = build_logger(f"pymetabc {__version__}", args)
 
-    # Run the pipeline
-    returnval = run_pipeline(args, logger)
+    # Open structured event stream, if requested
+    try:
+        stream = events.open_event_stream(args.events)
+    except (OSError, ValueError):
+        logger.error("Could not open %s for events", args.events, exc_info=True)
+        raise SystemExit(1)
+    previous = events.set_stream(stream)
+    events.emit(
+        "run_start",
+        version=__version__,
+        indir=args.indir,
+        outdir=args.outdir,
+        batch=args.batch,
+    )
+
+    # Run the pipeline, on one input directory or a batch
+    try:
+        if args.batch is None:
+            returnval = run_pipeline(args, logger)
+        else:
+            returnval = run_batch(args, logger)
+    except Exception as exc:
+        events.emit("run_failed", error=repr(exc))
+        raise
+    else:
+        events.emit(
+            "run_end", returnval=returnval, seconds=round(time.time() - time0, 6)
+        )
+    finally:
+        events.set_stream(previous)
+        stream.close()
 
     # Report how it ended
     logger.info("Completed. time taken: %.3f", (time.time() - time0))
@@ -68,7 +133,162 @@ def run_pipeline(args: Namespace, logger: Logger) -> int:
     for key, val in vars(args).items():
         logger.info("\t%s:\t%s", key, val)
 
-    # Create output directories
+    create_output_dirs(args, logger)
+
+    # Process input data, either all at once or as samples arrive
+    readfname = io.table_path(args.outdir, "05_thresholded_reads", args.table_format)
+    if args.watch:
+        samples = watch_input(args, logger, readfname)
+    else:
+        samples = collect_samples(args, logger)
+
+        # On a dry run, estimate the resources the run would need, and stop
+        if args.dryrun:
+            return plan_run(samples, args, logger)
+
+        # On a preview, estimate dominant hashes from a sample of reads, and stop
+        if args.preview:
+            return preview_run(samples, args, logger)
+
+        # Trim, merge, hash and threshold reads; thresholded reads by sample are
+        # written to disk as each sample is processed
+        process_samples(samples, args, logger)
+        write_qc_tables(samples, args, logger)
+        logger.info("Writing thresholded read hashes to %s", readfname)
+        with io.TableWriter(
+            readfname, args.table_format, io.READ_TABLE_DTYPES
+        ) as writer:
+            threshold_samples(samples, args, logger, writer)
+        logger.info("\tTotal sample:hash combinations: %d", writer.nrows)
+
+    return summarise_run(samples, args, logger, readfname)
+
+
+def run_batch(args: Namespace, logger: Logger) -> int:
+    """Run the pymetabc pipeline on each input directory in a batch manifest.
+
+    :param args:  Namespace of command-line arguments
+    :param logger:  Logger for output
+
+    Samples from all input directories are trimmed, merged and hashed on one
+    shared pool of args.batch_workers processes. Each input directory's
+    samples are thresholded and reported, in its own output directory, as
+    soon as all of them have been hashed. While the pool is still busy with
+    other samples, finishing an input directory uses only one worker's share
+    of args.threads, so that the CPUs are not oversubscribed.
+    """
+    # Report calling arguments
+    logger.info("pymetabc called with arguments:")
+    for key, val in vars(args).items():
+        logger.info("\t%s:\t%s", key, val)
+
+    entries = batching.read_batch_manifest(args.batch)
+    logger.info("Batch of %d input directories from %s", len(entries), args.batch)
+    members = []  # (arguments, samples) for each input directory
+    for entry in entries:
+        logger.info("Input directory %s -> %s", entry.indir, entry.outdir)
+        entry_args = batching.entry_namespace(args, entry)
+        create_output_dirs(entry_args, logger)
+        members.append((entry_args, collect_samples(entry_args, logger)))
+
+    # On a dry run, estimate the resources each member would need, and stop
+    if args.dryrun:
+        for entry_args, samples in members:
+            plan_run(samples, entry_args, logger)
+        return 0
+
+    # On a preview, estimate dominant hashes for each member, and stop
+    if args.preview:
+        for entry_args, samples in members:
+            preview_run(samples, entry_args, logger)
+        return 0
+
+    # Trim, merge and hash all samples on a shared pool of workers, and finish
+    # each input directory once all its samples are done
+    logger.info("Stages 2-4: Trim, merge and hash reads for all input directories")
+    logger.info("\tProcessing %d samples at once", args.batch_workers)
+    if args.scratch is not None:
+        logger.info("\tScratch root: %s", args.scratch)
+        args.scratch.mkdir(parents=True, exist_ok=True)
+    jobs = [
+        (sample, batching.worker_namespace(entry_args, args.batch_workers))
+        for entry_args, samples in members
+        for sample in samples
+    ]
+    owners = [
+        (member, idx)
+        for member, (_, samples) in enumerate(members)
+        for idx in range(len(samples))
+    ]
+    remaining = [len(samples) for _, samples in members]
+    returnval = 0
+    with events.stage("batch", samples=len(jobs)):
+        for job, sample in tqdm(
+            batching.process_batch_samples(jobs, args.batch_workers),
+            total=len(jobs),
+            disable=args.disable_tqdm,
+        ):
+            member, idx = owners[job]
+            entry_args, samples = members[member]
+            samples[idx] = sample
+            events.emit(
+                "sample_end",
+                stage="batch",
+                sample=sample.sample_name,
+                outdir=entry_args.outdir,
+                reads=sample.hashed_total,
+            )
+            remaining[member] -= 1
+            if not remaining[member]:
+                logger.info("Finishing output for %s", entry_args.outdir)
+                finish_args = entry_args
+                if sum(remaining):
+                    finish_args = batching.worker_namespace(
+                        entry_args, args.batch_workers
+                    )
+                returnval = max(
+                    returnval, finish_batch_member(samples, finish_args, logger)
+                )
+
+    # Combine read accounting for all input directories, if requested
+    if args.batch_summary is not None:
+        logger.info("Writing combined read accounting to %s", args.batch_summary)
+        io.write_table(
+            batching.combine_read_accounting(
+                [entry_args.outdir for entry_args, _ in members], args.table_format
+            ),
+            args.batch_summary,
+            args.table_format,
+        )
+    return returnval
+
+
+def finish_batch_member(
+    samples: List[SampleRecord], args: Namespace, logger: Logger
+) -> int:
+    """Threshold and report hashed reads for one input directory in a batch.
+
+    :param samples:  List of SampleRecords for the input directory, trimmed,
+                     merged and hashed
+    :param args:  Namespace of arguments for the input directory
+    :param logger:  Logger for output
+    """
+    write_stage_tables(samples, args, logger)
+    write_qc_tables(samples, args, logger)
+    readfname = io.table_path(args.outdir, "05_thresholded_reads", args.table_format)
+    logger.info("Writing thresholded read hashes to %s", readfname)
+    with io.TableWriter(readfname, args.table_format, io.READ_TABLE_DTYPES) as writer:
+        threshold_samples(samples, args, logger, writer)
+    logger.info("\tTotal sample:hash combinations: %d", writer.nrows)
+    return summarise_run(samples, args, logger, readfname)
+
+
+def create_output_dirs(args: Namespace, logger: Logger) -> None:
+    """Create output directories, recording their paths in args.
+
+    :param args:  Namespace of command-line arguments
+    :param logger:  Logger for output
+    """
     logger.info("Creating output directories:")
     logger.info("\tOutput root: %s", args.outdir)
     args.outdir.mkdir(exist_ok=True)
@@ -81,101 +301,518 @@ def run_pipeline(args: Namespace, logger: Logger) -> int:
     args.hashdir = args.outdir / args.hash_dir
     logger.info("\tHashing output: %s", args.hashdir)
     args.hashdir.mkdir(exist_ok=True)
+    args.qcdir = args.outdir / args.qc_dir
+    logger.info("\tRead statistics output: %s", args.qcdir)
+    args.qcdir.mkdir(exist_ok=True)
     args.threshdir = args.outdir / args.thresh_dir
     logger.info("\tThresholding output: %s", args.threshdir)
     args.threshdir.mkdir(exist_ok=True)
 
-    # Process input data
+
+def collect_samples(args: Namespace, logger: Logger) -> List[SampleRecord]:
+    """Return SampleRecords for the input directory, writing the input table.
+
+    :param args:  Namespace of command-line arguments
+    :param logger:  Logger for output
+    """
     logger.info("Stage 1: Process input data")
-    dfm = io.create_dataframe(args)
-    logger.info("\tFound %d samples:", len(dfm))
-    logger.info("\t\t%s, ...", ", ".join(sorted(list(dfm.index))[:5]))
+    with events.stage("input", outdir=args.outdir) as counts:
+        samples = io.create_manifest(args)
+        counts["samples"] = len(samples)
+    logger.info("\tFound %d samples:", len(samples))
+    logger.info("\t\t%s, ...", ", ".join(sorted(_.sample_name for _ in samples)[:5]))
 
     # Write table of input file paths to disk
-    ofname = args.outdir / "01_input_files.tab"
+    ofname = io.table_path(args.outdir, "01_input_files", args.table_format)
     logger.info("Writing input file paths to %s", ofname)
-    dfm.to_csv(ofname, sep="\t", encoding="utf-8")
-
-    # Trim reads
-    logger.info("Stage 2: Trim input reads")
-    dfm["trimmed_dir"] = list(io.add_sample_subdirs(dfm, args.trimdir))
-    trimmomatic.run_trimmomatic(dfm, args)
-
-    # Parse read summaries into dataframe
-    logger.info("\tParsing trimmomatic output")
-    dfm = trimmomatic.collect_trimmomatic_summaries(dfm)
-
-    # Write table of trimmed read data to disk
-    ofname = args.outdir / "02_trimmed.tab"
-    logger.info("Writing trimmed data table to %s", ofname)
-    dfm.to_csv(ofname, sep="\t", encoding="utf-8")
-
-    # Write bokeh plot of trimmomatic summary data to disk
-    ofname = args.outdir / "02_summaries.html"
-    logger.info("Writing trimmomatic summaries plot to %s", ofname)
-    plotting.plot_trimmomatic_summary(dfm, ofname)
-
-    # Merge trimmed reads
-    logger.info("Stage 3: Merge trimmed reads")
-    dfm["merged_dir"] = list(io.add_sample_subdirs(dfm, args.mergedir))
-    logger.info("\tMerging reads with flash")
-    dfm = flash.run_flash(dfm, args)
-
-    # Write table of merged read data to disk
-    ofname = args.outdir / "03_merged.tab"
-    logger.info("Writing merged data table to %s", ofname)
-    dfm.to_csv(ofname, sep="\t", encoding="utf-8")
-
-    # Hash merged reads
-    logger.info("Stage 4: Hash merged reads")
-    logger.info("\tHashing merged reads")
-    dfm["hashed_reads"] = list(hashing.add_hashed_reads(dfm, args))
-
-    # Write table of merged read data to disk
-    ofname = args.outdir / "04_hashed.tab"
-    logger.info("Writing hashed data table to %s", ofname)
-    dfm.to_csv(ofname, sep="\t", encoding="utf-8")
+    io.write_table(manifest_to_dataframe(samples), ofname, args.table_format)
+    return samples
 
-    # How many unique hashes are there?
-    uhashes = hashing.count_unique_hashes(args.hashdir)
-    logger.info("\tThere are %d unique merged reads", len(uhashes))
-    logger.info("\tMost abundant read hashes:")
-    top10 = sorted([(val, key) for (key, val) in uhashes.items()], reverse=True)[:10]
-    for val, key in top10:
-        logger.info("\t\t%s: %d", key, val)
 
-    # Threshold merged reads
-    logger.info("Stage 5: Threshold merged reads")
-    logger.info("\tThreshold mode: %s", args.thresh_mode)
-    dfm["thresholded_reads"] = list(thresholding.add_thresholded_reads(dfm, args))
+def summarise_run(
+    samples: List[SampleRecord], args: Namespace, logger: Logger, readfname: Path
+) -> int:
+    """Index, check, rarefy and demultiplex thresholded reads, and write reports.
 
-    # Write table of thresholded data to disk
-    ofname = args.outdir / "05_thresholded.tab"
-    logger.info("Writing thresholded data table to %s", ofname)
-    dfm.to_csv(ofname, sep="\t", encoding="utf-8")
+    :param samples:  List of SampleRecords for all samples in the run
+    :param args:  Namespace of command-line arguments
+    :param logger:  Logger for output
+    :param readfname:  Path to thresholded read hash table
 
-    # Write table of thresholded reads by sample to disk
-    ofname = args.outdir / "05_thresholded_reads.tab"
-    logger.info("Writing thresholded read hashes to %s", ofname)
-    readtable = hashing.get_hashes_by_sample(args.threshdir, args)
-    readtable.to_csv(ofname, sep="\t", encoding="utf-8")
-    logger.info("\tTotal sample:hash combinations: %d", len(readtable))
+    If chimeras are removed, contamination removal, rarefaction and reports
+    use the non-chimeric read hash table in place of readfname.
+    """
+    readstem = "05_thresholded_reads"
+
+    # Build hash to sequence index, if requested
+    if args.index and not args.dryrun:
+        ofname = args.outdir / "04_hashed.idx"
+        logger.info("Writing hash to sequence index to %s", ofname)
+        count = io.build_sequence_index([args.hashdir], ofname)
+        logger.info("\tIndexed %d unique sequences", count)
 
     # How many unique hashes are there?
-    uhashes = hashing.count_unique_hashes(args.threshdir)
+    uhashes, ucounts = hashing.aggregate_hash_counts(args.hashdir, args.threads)
+    logger.info("\tThere are %d unique merged reads", len(uhashes))
+    logger.info("\tMost abundant read hashes:")
+    for key, val in hashing.top_hashes(uhashes, ucounts, 10):
+        logger.info("\t\t%s: %d", key, val)
+
+    # How many unique hashes survived thresholding?
+    uhashes, ucounts = hashing.aggregate_hash_counts(args.threshdir, args.threads)
     logger.info("\t%d unique hashes survived the threshold", len(uhashes))
     logger.info("\tMost abundant thresholded read hashes:")
-    top10 = sorted([(val, key) for (key, val) in uhashes.items()], reverse=True)[:10]
-    for val, key in top10:
+    for key, val in hashing.top_hashes(uhashes, ucounts, 10):
         logger.info("\t\t%s: %d", key, val)
 
-    # Plot read abundance by hash and sample
-    ofname = args.outdir / "05_abundance_by_hash.html"
-    logger.info("Plotting read abundance by hash to %s", ofname)
-    plotting.plot_read_hash_abundances(readtable, ofname)
+    # Check read counts recorded at each stage reconcile
+    counts = accounting.reconcile_read_counts(manifest_to_dataframe(samples))
+    unreconciled = accounting.unreconciled_samples(counts)
+    if unreconciled:
+        logger.warning(
+            "\tRead counts do not reconcile for %d samples: %s",
+            len(unreconciled),
+            ", ".join(unreconciled),
+        )
+        if args.validate_counts:
+            logger.error("Read count validation failed (exiting)")
+            return 1
+    else:
+        logger.info("\tRead counts reconcile for all samples")
+
+    # Flag and remove chimeras from thresholded reads, if requested
+    if args.chimeras and not args.dryrun:
+        logger.info("Removing chimeras from thresholded reads")
+        args.chimeradir = args.outdir / args.chimera_dir
+        logger.info("\tNon-chimeric output: %s", args.chimeradir)
+        args.chimeradir.mkdir(exist_ok=True)
+        with events.stage("chimeras", samples=len(samples)) as counts:
+            flagged = chimeras.remove_chimeras(samples, args)
+            counts["flagged"] = len(flagged)
+        ofname = io.table_path(args.outdir, "05_chimeras", args.table_format)
+        logger.info("Writing flagged chimeras to %s", ofname)
+        io.write_table(
+            flagged, ofname, args.table_format, chimeras.CHIMERA_TABLE_DTYPES
+        )
+        logger.info(
+            "\tFlagged %d chimeric hashes (%d reads)",
+            len(flagged),
+            flagged["abundance"].sum(),
+        )
+        readstem = "05_nonchimeric_reads"
+        readfname = io.table_path(args.outdir, readstem, args.table_format)
+        logger.info("\tLater stages use non-chimeric reads from %s", readfname)
+
+    # Remove contamination seen in control samples, if requested
+    if args.thresh_controls and not args.dryrun:
+        logger.info("Removing contamination seen in controls (%s)", args.control_mode)
+        controls = contamination.find_controls(samples, args.thresh_controls)
+        logger.info(
+            "\tFound %d control samples: %s",
+            len(controls),
+            ", ".join(_.sample_name for _ in controls),
+        )
+        if not controls:
+            logger.warning("\tNo samples match the control names; not removing")
+        else:
+            with events.stage("controls", controls=len(controls)) as counts:
+                profile = contamination.build_control_profile(
+                    contamination.read_control_abundances(controls),
+                    args.thresh_percentile,
+                )
+                matrix = contamination.hash_matrix(
+                    io.read_table(readfname, args.table_format, io.READ_TABLE_DTYPES)
+                )
+                stems = {Path(_.hashed_reads).stem.split("_")[0] for _ in controls}
+                cleaned, report = contamination.remove_contamination(
+                    matrix[~matrix.index.isin(stems)], profile, args.control_mode
+                )
+                counts["reads_removed"] = int(report["reads_removed"].sum())
+            logger.info("\t%d hashes seen in controls", len(profile.hashes))
+            ofname = io.table_path(args.outdir, "05_control_profile", args.table_format)
+            logger.info("Writing control contamination profile to %s", ofname)
+            io.write_table(
+                contamination.profile_table(profile), ofname, args.table_format
+            )
+            ofname = io.table_path(
+                args.outdir, "05_decontaminated_matrix", args.table_format
+            )
+            logger.info("Writing decontaminated abundance matrix to %s", ofname)
+            io.write_table(cleaned, ofname, args.table_format)
+            ofname = io.table_path(args.outdir, "05_contamination", args.table_format)
+            logger.info("Writing contamination report to %s", ofname)
+            io.write_table(report, ofname, args.table_format)
+            logger.info(
+                "\tRemoved %d reads from %d samples",
+                report["reads_removed"].sum(),
+                (report["reads_removed"] > 0).sum(),
+            )
+
+    # Rarefy thresholded read hash abundances, if requested
+    if args.rarefy_depth is not None and not args.dryrun:
+        logger.info("Rarefying thresholded reads to depth %d", args.rarefy_depth)
+        logger.info(
+            "\t%d iterations (seed: %s)", args.rarefy_iterations, args.rarefy_seed
+        )
+        readtable = io.read_table(readfname, args.table_format, io.READ_TABLE_DTYPES)
+        ofname = io.table_path(args.outdir, "05_rarefied_reads", args.table_format)
+        logger.info("Writing rarefied read hashes to %s", ofname)
+        with events.stage("rarefy", samples=len(samples)):
+            with io.TableWriter(
+                ofname, args.table_format, rarefaction.RAREFIED_TABLE_DTYPES
+            ) as writer:
+                curves = rarefaction.rarefy_readtable(
+                    readtable,
+                    args.rarefy_depth,
+                    args.rarefy_iterations,
+                    args.rarefy_seed,
+                    args.rarefy_curve_depths,
+                    args.threads,
+                    writer,
+                )
+        ofname = io.table_path(args.outdir, "05_rarefaction_curves", args.table_format)
+        logger.info("Writing rarefaction curves to %s", ofname)
+        io.write_table(curves, ofname, args.table_format)
+        skipped = sorted(
+            set(readtable.index)
+            - set(curves[curves["depth"] == args.rarefy_depth].index)
+        )
+        if skipped:
+            logger.warning(
+                "\t%d samples have fewer than %d reads and were not rarefied: %s",
+                len(skipped),
+                args.rarefy_depth,
+                ", ".join(skipped),
+            )
+
+    # Demultiplex hashed reads by marker primers, if requested
+    if args.primers is not None and not args.dryrun:
+        logger.info("Stage 6: Demultiplex hashed reads by primer")
+        args.primerdir = args.outdir / args.primer_dir
+        logger.info("\tPrimer-trimmed output: %s", args.primerdir)
+        args.primerdir.mkdir(exist_ok=True)
+        with events.stage("primers", samples=len(samples)):
+            assignments = primers.demultiplex_hashed_reads(samples, args)
+        ofname = io.table_path(args.outdir, "06_primer_assignment", args.table_format)
+        logger.info("Writing primer assignment table to %s", ofname)
+        io.write_table(assignments, ofname, args.table_format)
+        for colname, total in assignments.sum().items():
+            logger.info("\t\t%s: %d reads", colname, total)
+
+    # Build reports from the saved tables
+    logger.info("Writing reports (mode: %s)", args.report)
+    with events.stage("report", mode=args.report):
+        if args.report != "none":
+            ofname = reporting.write_summary_report(
+                args.outdir, args.table_format, readstem
+            )
+            logger.info("\tWrote per-sample summary to %s", ofname)
+        jobs = reporting.build_report_jobs(
+            args.outdir, args.table_format, args.report, args.report_top, readstem
+        )
+        for ofname in reporting.run_report_jobs(jobs, args.threads):
+            logger.info("\tWrote plot to %s", ofname)
+
+    return 0
+
 
-    ofname = args.outdir / "05_abundance_by_sample.html"
-    logger.info("Plotting read abundance by sample to %s", ofname)
-    plotting.plot_sample_hash_abundances(readtable, ofname)
+def plan_run(samples: List[SampleRecord], args: Namespace, logger: Logger) -> int:
+    """Estimate and report the resources needed to process the input samples.
 
+    :param samples:  List of SampleRecords, one per sample
+    :param args:  Namespace of command-line arguments
+    :param logger:  Logger for output
+    """
+    logger.info("Dry run: estimating resources needed")
+    plan = planning.plan_samples(samples)
+    ofname = io.table_path(args.outdir, "00_plan", args.table_format)
+    logger.info("\tWriting estimated read counts to %s", ofname)
+    io.write_table(plan, ofname, args.table_format)
+    logger.info("\tEstimated total read pairs: %d", plan["read_pairs"].sum())
+
+    stages = planning.plan_stages(plan, args.threads, args.scratch is not None)
+    ofname = io.table_path(args.outdir, "00_plan_stages", args.table_format)
+    logger.info("\tWriting predicted stage resources to %s", ofname)
+    io.write_table(stages, ofname, args.table_format)
+    for stage, row in stages.iterrows():
+        logger.info(
+            "\t\t%s: %.0fs, %.2f GB memory, %.2f GB disk, %.2f GB scratch",
+            stage,
+            row["runtime_s"],
+            row["peak_memory_gb"],
+            row["disk_gb"],
+            row["scratch_gb"],
+        )
+    logger.info("\tPredicted total runtime: %.0fs", stages["runtime_s"].sum())
+
+    logger.info("\tRecommended settings:")
+    for setting, value in planning.recommend_settings(
+        stages, args.threads, cpu_count()
+    ).items():
+        logger.info("\t\t%s: %s", setting, value)
     return 0
+
+
+def preview_run(samples: List[SampleRecord], args: Namespace, logger: Logger) -> int:
+    """Estimate and report dominant read hashes and depth for the input samples.
+
+    :param samples:  List of SampleRecords, one per sample
+    :param args:  Namespace of command-line arguments
+    :param logger:  Logger for output
+    """
+    logger.info(
+        "Preview: sketching up to %s read pairs per sample",
+        args.preview_reads or "all",
+    )
+    with events.stage("preview", samples=len(samples)) as counts:
+        previews = preview.preview_samples(samples, args)
+        counts["pairs"] = sum(_.pairs_read for _ in previews)
+    summary, sample_hashes, run_hashes = preview.preview_tables(
+        previews, args.preview_top
+    )
+    for stem, table in (
+        ("00_preview_samples", summary),
+        ("00_preview_sample_hashes", sample_hashes),
+        ("00_preview_run_hashes", run_hashes),
+    ):
+        ofname = io.table_path(args.outdir, stem, args.table_format)
+        logger.info("\tWriting %s to %s", stem, ofname)
+        io.write_table(table, ofname, args.table_format)
+    logger.info("\tEstimated total read pairs: %d", summary["est_read_pairs"].sum())
+    _, distinct = preview.merge_previews(previews)
+    logger.info("\tEstimated unique merged reads: %d", round(distinct.estimate()))
+    logger.info("\tMost abundant hashes across the run (estimated fraction):")
+    for read_hash, row in run_hashes.set_index("read_hash").iterrows():
+        logger.info("\t\t%s\t%.3f", read_hash, row["est_fraction"])
+    return 0
+
+
+def watch_input(args: Namespace, logger: Logger, readfname: Path) -> List[SampleRecord]:
+    """Process samples as they are written to the input directory.
+
+    :param args:  Namespace of command-line arguments
+    :param logger:  Logger for output
+    :param readfname:  Path to thresholded read hash table
+
+    Each batch of newly complete samples is trimmed, merged, hashed and
+    thresholded as soon as it is found, and its rows are added to the input,
+    stage and thresholded read tables, which are held open while watching.
+    Watching stops once no new sample has been found for args.watch_timeout
+    seconds, and the read statistics tables are then written for the run.
+
+    Returns a list of SampleRecords for all processed samples.
+    """
+    logger.info("Stage 1: Watch input directory for samples")
+    logger.info(
+        "\tPolling every %ss, stopping after %ss without a new sample",
+        args.watch_interval,
+        args.watch_timeout,
+    )
+    watcher = watch.SampleWatcher(args.indir, args.sample_sep)
+    samples = []  # type: List[SampleRecord]
+    logger.info("Writing thresholded read hashes to %s", readfname)
+    with ExitStack() as stack:
+        writer = stack.enter_context(
+            io.TableWriter(readfname, args.table_format, io.READ_TABLE_DTYPES)
+        )
+        writers = {
+            stem: stack.enter_context(
+                io.TableWriter(
+                    io.table_path(args.outdir, stem, args.table_format),
+                    args.table_format,
+                )
+            )
+            for stem in STAGE_TABLES
+        }  # type: Dict[str, io.TableWriter]
+        for batch in watcher.watch(args.watch_interval, args.watch_timeout):
+            logger.info(
+                "\tFound %d new samples: %s",
+                len(batch),
+                ", ".join(_.sample_name for _ in batch),
+            )
+            samples.extend(batch)
+            write_manifest_table("01_input_files", batch, args, logger, writers)
+            process_samples(batch, args, logger, writers)
+            threshold_samples(batch, args, logger, writer, writers)
+            for table in [writer] + list(writers.values()):
+                table.flush()
+            logger.info("\tProcessed %d samples", len(samples))
+    logger.info("\tNo new samples found; stopped watching")
+    logger.info("\tTotal sample:hash combinations: %d", writer.nrows)
+    write_qc_tables(samples, args, logger)
+    return samples
+
+
+def process_samples(
+    batch: List[SampleRecord],
+    args: Namespace,
+    logger: Logger,
+    writers: Optional[Dict[str, io.TableWriter]] = None,
+) -> None:
+    """Trim, merge and hash reads for a batch of samples.
+
+    :param batch:  List of SampleRecords to process
+    :param args:  Namespace of command-line arguments
+    :param logger:  Logger for output
+    :param writers:  optional TableWriters for the stage tables, keyed by
+                     table name; if given, the batch is added to them,
+                     otherwise the stage tables are written for the batch
+    """
+    if args.scratch is not None and not args.dryrun:
+        # Trim, merge and hash each sample in scratch, publishing final outputs
+        logger.info("Stages 2-4: Trim, merge and hash reads in scratch space")
+        logger.info("\tScratch root: %s", args.scratch)
+        args.scratch.mkdir(parents=True, exist_ok=True)
+        for sample, trimdir, mergedir in zip(
+            batch,
+            io.add_sample_subdirs(batch, args.trimdir),
+            io.add_sample_subdirs(batch, args.mergedir),
+        ):
+            sample.trimmed_dir, sample.merged_dir = trimdir, mergedir
+        with events.stage("scratch", samples=len(batch)):
+            for sample in scratch.process_samples_in_scratch(batch, args):
+                logger.info("\t\tPublished outputs for %s", sample.sample_name)
+        write_stage_tables(batch, args, logger, writers)
+    else:
+        # Trim reads
+        logger.info("Stage 2: Trim input reads")
+        for sample, trimdir in zip(batch, io.add_sample_subdirs(batch, args.trimdir)):
+            sample.trimmed_dir = trimdir
+        with events.stage("trim", samples=len(batch)):
+            trimmomatic.run_trimmomatic(batch, args)
+
+        # Parse read summaries into sample records
+        logger.info("\tParsing trimmomatic output")
+        trimmomatic.collect_trimmomatic_summaries(batch)
+
+        # Write table of trimmed read data to disk
+        write_manifest_table("02_trimmed", batch, args, logger, writers)
+
+        # Merge trimmed reads
+        logger.info("Stage 3: Merge trimmed reads")
+        for sample, mergedir in zip(batch, io.add_sample_subdirs(batch, args.mergedir)):
+            sample.merged_dir = mergedir
+        logger.info("\tMerging reads with flash")
+        with events.stage("merge", samples=len(batch)):
+            flash.run_flash(batch, args)
+
+        # Write table of merged read data to disk
+        write_manifest_table("03_merged", batch, args, logger, writers)
+
+        # Hash merged reads
+        logger.info("Stage 4: Hash merged reads")
+        logger.info("\tHashing merged reads")
+        with events.stage("hash", samples=len(batch)):
+            for sample, (readfile, qcfile, total, filter_stats) in zip(
+                batch, hashing.add_hashed_reads(batch, args)
+            ):
+                sample.hashed_reads, sample.hashed_total = readfile, total
+                sample.filter_stats = filter_stats
+                sample.read_qc = qcfile
+
+        # Write table of hashed read data to disk
+        write_manifest_table("04_hashed", batch, args, logger, writers)
+
+
+def write_stage_tables(
+    samples: List[SampleRecord],
+    args: Namespace,
+    logger: Logger,
+    writers: Optional[Dict[str, io.TableWriter]] = None,
+) -> None:
+    """Write trimmed, merged and hashed data tables for processed samples.
+
+    :param samples:  List of SampleRecords processed
+    :param args:  Namespace of command-line arguments
+    :param logger:  Logger for output
+    :param writers:  optional TableWriters for the stage tables, keyed by
+                     table name, to which the samples are added
+    """
+    for stem in ("02_trimmed", "03_merged", "04_hashed"):
+        write_manifest_table(stem, samples, args, logger, writers)
+
+
+def write_manifest_table(
+    stem: str,
+    samples: List[SampleRecord],
+    args: Namespace,
+    logger: Logger,
+    writers: Optional[Dict[str, io.TableWriter]] = None,
+) -> None:
+    """Write a data table of SampleRecords, or add them to an open table.
+
+    :param stem:  str, table name (one of STAGE_TABLES)
+    :param samples:  List of SampleRecords to write
+    :param args:  Namespace of command-line arguments
+    :param logger:  Logger for output
+    :param writers:  optional TableWriters keyed by table name; if given,
+                     the samples are added to the open table (as in watch
+                     mode), otherwise the table is written for the samples
+    """
+    ofname = io.table_path(args.outdir, stem, args.table_format)
+    if writers is None:
+        logger.info("Writing %s data table to %s", stem[3:].replace("_", " "), ofname)
+        io.write_table(manifest_to_dataframe(samples), ofname, args.table_format)
+    else:
+        logger.info("Adding %d samples to %s", len(samples), ofname)
+        writers[stem].write(manifest_to_dataframe(samples))
+
+
+def write_qc_tables(
+    samples: List[SampleRecord], args: Namespace, logger: Logger
+) -> None:
+    """Write tables of merged read length and quality statistics.
+
+    :param samples:  List of SampleRecords for all samples in the run
+    :param args:  Namespace of command-line arguments
+    :param logger:  Logger for output
+
+    Only the statistics files recorded for the passed samples are read, so
+    files left in args.qcdir by earlier runs are ignored.
+    """
+    qcfiles = sorted(Path(_.read_qc) for _ in samples if _.read_qc)
+    ofname = io.table_path(args.outdir, "04_read_lengths", args.table_format)
+    logger.info("Writing merged read length table to %s", ofname)
+    io.write_table(qc.read_length_table(qcfiles), ofname, args.table_format)
+    ofname = io.table_path(args.outdir, "04_read_quality", args.table_format)
+    logger.info("Writing merged read quality table to %s", ofname)
+    io.write_table(qc.read_quality_table(qcfiles), ofname, args.table_format)
+
+
+def threshold_samples(
+    batch: List[SampleRecord],
+    args: Namespace,
+    logger: Logger,
+    writer: io.TableWriter,
+    writers: Optional[Dict[str, io.TableWriter]] = None,
+) -> None:
+    """Threshold hashed reads for a batch of samples.
+
+    :param batch:  List of SampleRecords to process
+    :param args:  Namespace of command-line arguments
+    :param logger:  Logger for output
+    :param writer:  TableWriter for thresholded read hash abundances
+    :param writers:  optional TableWriters for the stage tables, keyed by
+                     table name; if given, the batch is added to them,
+                     otherwise the stage tables are written for the batch
+    """
+    logger.info("Stage 5: Threshold merged reads")
+    logger.info("\tThreshold mode: %s", args.thresh_mode)
+    with events.stage("threshold", samples=len(batch)):
+        for sample, (readfile, total) in zip(
+            batch, thresholding.add_thresholded_reads(batch, args, writer)
+        ):
+            sample.thresholded_reads, sample.thresholded_total = readfile, total
+
+    # Write table of thresholded data to disk
+    write_manifest_table("05_thresholded", batch, args, logger, writers)
+
+    # Reconcile read counts recorded at each stage
+    counts = accounting.reconcile_read_counts(manifest_to_dataframe(batch))
+    ofname = io.table_path(args.outdir, "05_read_accounting", args.table_format)
+    if writers is None:
+        logger.info("Writing read accounting table to %s", ofname)
+        io.write_table(counts, ofname, args.table_format)
+    else:
+        logger.info("Adding %d samples to %s", len(batch), ofname)
+        writers["05_read_accounting"].write(counts)
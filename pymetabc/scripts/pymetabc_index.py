@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""Implements pymetabc-index script for building and querying sequence indexes."""
+
+import sys
+
+from argparse import Namespace
+from logging import Logger
+from typing import Iterable, List, Optional
+
+from pymetabc import io
+
+from .logger import build_logger
+from .parsers import parse_index_cmdline
+from .. import __version__
+
+
+def run_main(argv: Optional[List] = None, logger: Optional[Logger] = None) -> int:
+    """Run pymetabc-index as a script.
+
+    :param argv:  List of arguments as if from command-line,
+                  (used for testing)
+    :param logger:  Logger object
+                  (used for testing)
+
+    The build subcommand writes a memory-mapped hash to sequence index from
+    one or more directories of hashed read FASTA files; the lookup subcommand
+    writes the sequences for a batch of read hashes.
+    """
+    # If testing, a List was passed, and is processed. Otherwise we collect sys.argv
+    if argv is None:
+        args = parse_index_cmdline()
+    else:
+        args = parse_index_cmdline(argv)
+
+    # Set up logging (if necessary; when testing a logger is passed)
+    if logger is None:
+        logger = build_logger(f"pymetabc-index {__version__}", args)
+
+    if args.subcommand == "build":
+        return subcmd_build(args, logger)
+    return subcmd_lookup(args, logger)
+
+
+def subcmd_build(args: Namespace, logger: Logger) -> int:
+    """Build sequence index from directories of hashed reads.
+
+    :param args:  Namespace of command-line arguments
+    :param logger:  Logger for output
+    """
+    logger.info("Indexing hashed reads in %s", ", ".join(map(str, args.indirs)))
+    count = io.build_sequence_index(args.indirs, args.index)
+    logger.info("Wrote %d sequences to %s", count, args.index)
+    return 0
+
+
+def subcmd_lookup(args: Namespace, logger: Logger) -> int:
+    """Write sequences for read hashes from a sequence index.
+
+    :param args:  Namespace of command-line arguments
+    :param logger:  Logger for output
+
+    Read hashes may be given as FASTA-style IDs (<hash>_<abundance>); the
+    abundance suffix is ignored.
+    """
+    hashes = list(args.hashes)
+    if args.infile == "-":
+        hashes.extend(read_hashes(sys.stdin))
+    elif args.infile is not None:
+        with open(args.infile, "r") as ifh:
+            hashes.extend(read_hashes(ifh))
+    hashes = list(dict.fromkeys(_.split("_")[0] for _ in hashes))
+
+    sequences = io.SequenceIndex(args.index).lookup(hashes)
+    missing = [key for key, val in sequences.items() if val is None]
+    if missing:
+        logger.warning("%d read hashes not found in %s", len(missing), args.index)
+
+    ofh = sys.stdout if args.outfile is None else args.outfile.open("w")
+    try:
+        for key, val in sequences.items():
+            if val is None:
+                continue
+            if args.format == "fasta":
+                ofh.write(f">{key}\n{val}\n")
+            else:
+                ofh.write(f"{key}\t{val}\n")
+    finally:
+        if ofh is not sys.stdout:
+            ofh.close()
+    return 0
+
+
+def read_hashes(lines: Iterable[str]) -> List[str]:
+    """Return list of read hashes from lines of text, skipping blank lines."""
+    return [_.strip() for _ in lines if _.strip()]
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""Module providing bounded-memory sketches of read hash abundance.
+
+CountMinSketch estimates the abundance of any read hash from a fixed-size
+table of counters: estimates are never too low, and exceed the true count
+by at most e / width of the total count, except with probability
+exp(-depth). HeavyHitters keeps a bounded set of candidate hashes, ranked
+by their CountMinSketch estimates, to report the most abundant hashes.
+HyperLogLog estimates the number of distinct hashes, with a relative
+standard error of about 1.04 / sqrt(2 ** precision).
+
+Sketches take the binary digests produced by digest.get_digest_function(),
+so their estimates are keyed by the same hashes as pipeline output. Updates
+are vectorised over batches of digests, and sketches with the same
+parameters can be merged, e.g. to combine samples into run-level estimates.
+"""
+
+import hashlib
+
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# Bytes of each digest used to place it in a sketch
+_KEY_BYTES = 16
+
+
+def digest_keys(digests: List[bytes]) -> np.ndarray:
+    """Return (n, 2) uint64 array of sketch keys for n binary digests.
+
+    :param digests:  List of binary digests
+
+    Digests shorter than 16 bytes (e.g. short blake2b digests) are extended
+    by hashing them again.
+    """
+    if all(len(_) >= _KEY_BYTES for _ in digests):
+        buf = b"".join(_[:_KEY_BYTES] for _ in digests)
+    else:
+        buf = b"".join(
+            hashlib.blake2b(_, digest_size=_KEY_BYTES).digest() for _ in digests
+        )
+    return np.frombuffer(buf, dtype="<u8").reshape(-1, 2)
+
+
+class CountMinSketch:
+
+    """Count-min sketch of abundances, keyed by digest_keys()."""
+
+    __slots__ = ("width", "depth", "table", "total")
+
+    def __init__(self, width: int = 2**16, depth: int = 4) -> None:
+        """Create an empty sketch.
+
+        :param width:  int, counters per row
+        :param depth:  int, number of rows
+        """
+        if width < 1 or depth < 1:
+            raise ValueError(f"width and depth must be positive, got {width}, {depth}")
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.total = 0
+
+    def update(self, keys: np.ndarray, counts: Optional[np.ndarray] = None) -> None:
+        """Add counts for the passed keys.
+
+        :param keys:  (n, 2) uint64 array from digest_keys()
+        :param counts:  optional array of n counts (default: one per key)
+        """
+        if counts is None:
+            counts = np.ones(len(keys), dtype=np.int64)
+        for row, cols in enumerate(self._columns(keys)):
+            np.add.at(self.table[row], cols, counts)
+        self.total += int(counts.sum())
+
+    def estimate(self, keys: np.ndarray) -> np.ndarray:
+        """Return array of estimated counts for the passed keys.
+
+        :param keys:  (n, 2) uint64 array from digest_keys()
+        """
+        cols = self._columns(keys)
+        return self.table[np.arange(self.depth)[:, None], cols].min(axis=0)
+
+    def merge(self, other: "CountMinSketch") -> None:
+        """Add the counts in another sketch with the same width and depth.
+
+        :param other:  CountMinSketch to merge into this one
+        """
+        if self.table.shape != other.table.shape:
+            raise ValueError("cannot merge count-min sketches of different sizes")
+        self.table += other.table
+        self.total += other.total
+
+    def _columns(self, keys: np.ndarray) -> np.ndarray:
+        """Return (depth, n) array of each key's column in each row.
+
+        Columns are derived from the two halves of the key by double hashing.
+        """
+        rows = np.arange(self.depth, dtype=np.uint64)[:, None]
+        cols = (keys[:, 0] + rows * keys[:, 1]) % np.uint64(self.width)
+        return cols.astype(np.intp)
+
+
+class HeavyHitters:
+
+    """Most abundant digests, ranked by a CountMinSketch.
+
+    At most capacity candidate digests are held, with a sequence for each.
+    """
+
+    __slots__ = ("capacity", "sketch", "candidates")
+
+    def __init__(self, capacity: int = 100, width: int = 2**16, depth: int = 4) -> None:
+        """Create an empty set of heavy hitters.
+
+        :param capacity:  int, maximum number of candidate digests held
+        :param width:  int, counters per row of the sketch
+        :param depth:  int, number of rows in the sketch
+        """
+        self.capacity = capacity
+        self.sketch = CountMinSketch(width, depth)
+        # Sequence for each candidate digest
+        self.candidates = {}
+
+    def update(self, digests: List[bytes], sequences: List[str]) -> None:
+        """Count a batch of digests.
+
+        :param digests:  List of binary digests, one per read
+        :param sequences:  List of the sequences the digests were taken from
+        """
+        if not digests:
+            return
+        self.sketch.update(digest_keys(digests))
+        self.candidates.update(zip(digests, sequences))
+        self._prune()
+
+    def top(self, count: int) -> List[Tuple[bytes, int, str]]:
+        """Return (digest, estimated abundance, sequence) for the top digests.
+
+        :param count:  int, number of digests to return
+
+        Digests are ordered by decreasing abundance, then by digest.
+        """
+        digests = list(self.candidates)
+        if not digests:
+            return []
+        estimates = self.sketch.estimate(digest_keys(digests))
+        ranked = sorted(zip(-estimates, digests))[:count]
+        return [(_, int(-est), self.candidates[_]) for est, _ in ranked]
+
+    def merge(self, other: "HeavyHitters") -> None:
+        """Add the counts and candidates of another set of heavy hitters.
+
+        :param other:  HeavyHitters with a sketch of the same size
+        """
+        self.sketch.merge(other.sketch)
+        self.candidates.update(other.candidates)
+        self._prune()
+
+    def _prune(self) -> None:
+        """Keep only the capacity candidates with the highest estimates."""
+        if len(self.candidates) <= self.capacity:
+            return
+        digests = list(self.candidates)
+        estimates = self.sketch.estimate(digest_keys(digests))
+        keep = np.argpartition(-estimates, self.capacity)[: self.capacity]
+        self.candidates = {digests[_]: self.candidates[digests[_]] for _ in keep}
+
+
+class HyperLogLog:
+
+    """HyperLogLog estimate of the number of distinct keys."""
+
+    __slots__ = ("precision", "registers")
+
+    def __init__(self, precision: int = 12) -> None:
+        """Create an empty estimator.
+
+        :param precision:  int, log2 of the number of registers (4 to 18)
+        """
+        if not 4 <= precision <= 18:
+            raise ValueError(f"precision must be between 4 and 18, got {precision}")
+        self.precision = precision
+        self.registers = np.zeros(2**precision, dtype=np.uint8)
+
+    def update(self, keys: np.ndarray) -> None:
+        """Add the passed keys.
+
+        :param keys:  (n, 2) uint64 array from digest_keys()
+        """
+        bits = 64 - self.precision
+        values = keys[:, 1]
+        idxs = (values >> np.uint64(bits)).astype(np.intp)
+        ranks = bits - _bit_length(values & np.uint64((1 << bits) - 1)) + 1
+        np.maximum.at(self.registers, idxs, ranks.astype(np.uint8))
+
+    def estimate(self) -> float:
+        """Return the estimated number of distinct keys added."""
+        size = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / size)
+        raw = alpha * size * size / np.sum(2.0 ** -self.registers.astype(np.float64))
+        zeros = np.count_nonzero(self.registers == 0)
+        if raw <= 2.5 * size and zeros:
+            # Linear counting is more accurate for small cardinalities
+            return float(size * np.log(size / zeros))
+        return float(raw)
+
+    def merge(self, other: "HyperLogLog") -> None:
+        """Add the keys of another estimator with the same precision.
+
+        :param other:  HyperLogLog to merge into this one
+        """
+        if self.precision != other.precision:
+            raise ValueError("cannot merge HyperLogLogs of different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+
+def _bit_length(values: np.ndarray) -> np.ndarray:
+    """Return the bit length of each value in a uint64 array."""
+    values = values.copy()
+    lengths = np.zeros(len(values), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        big = values >= (np.uint64(1) << np.uint64(shift))
+        lengths[big] += shift
+        values[big] >>= np.uint64(shift)
+    return lengths + (values > 0)
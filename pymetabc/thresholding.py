@@ -1,33 +1,61 @@
 # -*- coding: utf-8 -*-
 """Module to threshold merged, hashed reads."""
 
+import time
+
 from argparse import Namespace
 from pathlib import Path
-from typing import Generator
+from typing import Generator, List, Optional
 
 import pandas as pd
 
-from Bio import SeqIO
+from Bio.Seq import Seq
+from Bio.SeqRecord import SeqRecord
 from tqdm import tqdm
 
+from . import events
+from .hashing import hashed_reads_to_rows
+from .io import TableWriter, read_hashed_reads, write_hashed_reads
+from .manifest import SampleRecord
+
 
-def add_thresholded_reads(dfm: pd.DataFrame, args: Namespace) -> Generator:
+def add_thresholded_reads(
+    samples: List[SampleRecord], args: Namespace, writer: Optional[TableWriter] = None
+) -> Generator:
     """Generate one output directory per sample under the root directory.
 
-    :param dfm:  pd.DataFrame containing one row per sample
+    :param samples:  List of SampleRecords, one per sample
     :param args:  Namespace of parsed command-line options
+    :param writer:  optional TableWriter; if given, the thresholded read
+                    hash abundances for each sample are written to it as
+                    that sample is processed
 
-    Yields path (as str) to the directory
+    Yields a tuple of path (as str) to the thresholded read file, and the
+    total count of reads that survived thresholding (None if this is a dry run)
     """
-    for _, row in tqdm(
-        dfm.iterrows(), disable=args.disable_tqdm
-    ):  # one subdirectory per sample
-        readfile = Path(row["hashed_reads"])
+    for sample in tqdm(samples, disable=args.disable_tqdm):  # one file per sample
+        readfile = Path(sample.hashed_reads)
         ofname = args.threshdir / readfile.name
+        time0 = time.perf_counter()
+        total = None
         if not args.dryrun:
-            thresholded_reads = thresh_cutoff(readfile, args)
-            SeqIO.write(thresholded_reads, ofname, "fasta")
-        yield str(ofname)
+            thresholded_reads = list(thresh_cutoff(readfile, args))
+            total = write_hashed_reads(thresholded_reads, ofname)
+            if writer is not None:
+                writer.write(
+                    pd.DataFrame(
+                        hashed_reads_to_rows(thresholded_reads, ofname),
+                        columns=["sample_name", "read_hash", "abundance"],
+                    ).set_index("sample_name")
+                )
+        events.emit(
+            "sample_end",
+            stage="threshold",
+            sample=sample.sample_name,
+            seconds=round(time.perf_counter() - time0, 6),
+            reads=total,
+        )
+        yield (str(ofname), total)
 
 
 def thresh_cutoff(readfile: Path, args: Namespace) -> Generator:
@@ -38,8 +66,6 @@ def thresh_cutoff(readfile: Path, args: Namespace) -> Generator:
 
     This method uses a hard threshold specified in args.thresh_cutoff.
     """
-    with readfile.open("r") as ifh:
-        for record in SeqIO.parse(ifh, "fasta"):
-            _, abd = record.id.split("_")
-            if int(abd) > args.thresh_cutoff:
-                yield record
+    for rhash, abundance, seq in read_hashed_reads(readfile):
+        if abundance > args.thresh_cutoff:
+            yield SeqRecord(Seq(seq), id=f"{rhash}_{abundance}", description="")
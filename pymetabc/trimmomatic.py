@@ -3,43 +3,54 @@
 import os
 
 import subprocess
+import time
 
 from argparse import Namespace
 from pathlib import Path
-from typing import Generator
-
-import pandas as pd
+from typing import Dict, Generator, List, Union
 
 from tqdm import tqdm
 
+from . import events
+from .manifest import SampleRecord
+
+# Quality trimming applied after adapter clipping: sliding window size and
+# required mean quality, minimum leading and trailing base quality, and
+# minimum length of reads kept
+TRIM_WINDOW = (5, 20)
+TRIM_LEADING = 5
+TRIM_TRAILING = 5
+TRIM_MINLEN = 50
+
 
-def collect_trimmomatic_summaries(dfm: pd.DataFrame) -> pd.DataFrame:
-    """Return pd.DataFrame summarising trimmomatic output for each run.
+def collect_trimmomatic_summaries(samples: List[SampleRecord]) -> List[SampleRecord]:
+    """Return SampleRecords updated with trimmomatic output for each run.
 
-    :param dfm:  pd.DataFrame containing one row per sample
+    :param samples:  List of SampleRecords, one per sample
 
-    Generates nine new series (columns) for each row in the input
-    dataframe corresponding to the trimmomatic summary output for each file
+    Sets the path to the trimmomatic summary file, and the nine statistics
+    reported in it, for each sample
     """
-    # Generate series of trimmomatic summary paths and process
-    dfm["trim_summary"] = dfm["trimmed_dir"].apply(os.path.join, args=("summary.txt",))
-    # Parse summary files into dataframe
-    dfm = dfm.apply(parse_trimmomatic_summary, axis=1)
-    return dfm
+    for sample in samples:
+        sample.trim_summary = os.path.join(sample.trimmed_dir, "summary.txt")
+        sample.trim_stats = parse_trimmomatic_summary(Path(sample.trim_summary))
+    return samples
 
 
-def generate_trimmomatic_commands(dfm: pd.DataFrame, args: Namespace) -> Generator:
+def generate_trimmomatic_commands(
+    samples: List[SampleRecord], args: Namespace
+) -> Generator:
     """Return generator of trimmomatic commands.
 
-    :param dfm:  pd.DataFrame containing one row per sample
+    :param samples:  List of SampleRecords, one per sample
     :param args:  Namespace of parsed command-line arguments
 
     Yields command (as List[str]) for each sample, in turn
     """
     cmd_base = ["trimmomatic", "PE", "-threads", args.threads, f"-{args.trim_fastq}"]
-    for _, row in dfm.iterrows():
-        outdir = Path(row["trimmed_dir"])
-        fpath, rpath = Path(row["fwd_read_path"]), Path(row["rev_read_path"])
+    for sample in samples:
+        outdir = Path(sample.trimmed_dir)
+        fpath, rpath = Path(sample.fwd_read_path), Path(sample.rev_read_path)
         paths = [
             fpath,
             rpath,
@@ -51,10 +62,10 @@ def generate_trimmomatic_commands(dfm: pd.DataFrame, args: Namespace) -> Generat
         logs = ["-trimlog", outdir / "trimlog.log", "-summary", outdir / "summary.txt"]
         trimmer = [
             f"ILLUMINACLIP:{args.trim_adapters}:2:30:10",
-            "SLIDINGWINDOW:5:20",
-            "LEADING:5",
-            "TRAILING:5",
-            "MINLEN:50",
+            f"SLIDINGWINDOW:{TRIM_WINDOW[0]}:{TRIM_WINDOW[1]}",
+            f"LEADING:{TRIM_LEADING}",
+            f"TRAILING:{TRIM_TRAILING}",
+            f"MINLEN:{TRIM_MINLEN}",
         ]
         yield (
             list(map(str, cmd_base + logs + paths + trimmer)),  # type: ignore
@@ -62,36 +73,36 @@ def generate_trimmomatic_commands(dfm: pd.DataFrame, args: Namespace) -> Generat
         )
 
 
-def parse_trimmomatic_summary(dfm: pd.DataFrame) -> pd.DataFrame:
-    """Return DataFrame modified to include trimmomatic summary output.
+def parse_trimmomatic_summary(fpath: Path) -> Dict[str, Union[int, float]]:
+    """Return dictionary of statistics from a trimmomatic summary file.
 
-    :param dfm:  pd.DataFrame containing one row per sample
+    :param fpath:  Path to trimmomatic summary file
     """
-    fpath = Path(dfm["trim_summary"])
+    stats = {}  # type: Dict[str, Union[int, float]]
     with fpath.open("r") as ifh:
         for line in [_.strip() for _ in ifh if _.strip()]:
             key, val = line.split(": ")
             if "." in val:
-                dfm[key] = float(val)
+                stats[key] = float(val)
             else:
-                dfm[key] = int(val)
-    return dfm
+                stats[key] = int(val)
+    return stats
 
 
-def run_trimmomatic(dfm: pd.DataFrame, args: Namespace) -> pd.DataFrame:
+def run_trimmomatic(samples: List[SampleRecord], args: Namespace) -> List[SampleRecord]:
     """Run trimmomatic on a dataset.
 
-    :param dfm:  pd.DataFrame containing one row per sample
+    :param samples:  List of SampleRecords, one per sample
     :param args:  Namespace, parsed command-line arguments
 
-    Returns modified dataframe with the trimmomatic command that was
-    applied, and the path to the output directory as new columns
+    Returns SampleRecords updated with the trimmomatic command that was
+    applied, and the path to the output directory
     """
-    cmdlist = []
-    trimdirs = []
-    for cmd, trimdir in tqdm(
-        generate_trimmomatic_commands(dfm, args), disable=args.disable_tqdm
+    for sample, (cmd, trimdir) in tqdm(
+        zip(samples, generate_trimmomatic_commands(samples, args)),
+        disable=args.disable_tqdm,
     ):
+        time0 = time.perf_counter()
         if not args.dryrun:
             subprocess.run(
                 cmd,
@@ -100,9 +111,12 @@ def run_trimmomatic(dfm: pd.DataFrame, args: Namespace) -> pd.DataFrame:
                 shell=False,
                 check=True,
             )
-        cmdlist.append(cmd)
-        trimdirs.append(str(trimdir))
-
-    dfm["trim_cmd"] = cmdlist
-    dfm["trim_output"] = trimdirs
-    return dfm
+        sample.trim_cmd = cmd
+        sample.trim_output = str(trimdir)
+        events.emit(
+            "sample_end",
+            stage="trim",
+            sample=sample.sample_name,
+            seconds=round(time.perf_counter() - time0, 6),
+        )
+    return samples
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""Module to watch an input directory for samples as they are written.
+
+Sample directories are expected in the BaseSpace download layout, one
+directory per sample named <sample><sample_sep>-ds.<id>, each holding a
+forward and reverse read file. A sample is ready for processing when its
+directory holds one forward and one reverse read file (as found by
+io.read_file_pair()), neither of which is empty or has changed size since
+the previous poll.
+"""
+
+import time
+
+from pathlib import Path
+from typing import Generator, List, Tuple
+
+from .io import read_file_pair, sampledir_to_paths
+from .manifest import SampleRecord
+
+# Glob pattern matching BaseSpace sample directories
+SAMPLE_DIR_PATTERN = "*-ds.*"
+
+
+class SampleWatcher:
+
+    """Report sample directories in an input directory once they are complete.
+
+    Each sample directory is reported once, by the first poll at which it is
+    found to be complete.
+    """
+
+    def __init__(self, indir: Path, sample_sep: str) -> None:
+        """Watch the passed input directory.
+
+        :param indir:  Path to input directory of sample directories
+        :param sample_sep:  str, separator splitting the sample name from the
+                            rest of the directory name
+        """
+        self.indir = indir
+        self.sample_sep = sample_sep
+        self._sizes = {}  # sample dir -> (file name, size) pairs at last poll
+        self._reported = set()  # sample dirs already returned by poll
+
+    def poll(self) -> List[SampleRecord]:
+        """Return SampleRecords for samples that have become complete.
+
+        Read file sizes are recorded at every poll, so a sample is complete
+        at the earliest on the second poll after its files appear.
+        """
+        ready = []
+        for sample_dir in sorted(self.indir.glob(SAMPLE_DIR_PATTERN)):
+            if sample_dir in self._reported or not sample_dir.is_dir():
+                continue
+            sizes = _read_file_sizes(sample_dir)
+            if sizes and sizes == self._sizes.get(sample_dir):
+                self._reported.add(sample_dir)
+                ready.append(
+                    SampleRecord(
+                        **sampledir_to_paths(
+                            sample_dir, self.sample_sep, read_file_pair(sample_dir)
+                        )
+                    )
+                )
+            else:
+                self._sizes[sample_dir] = sizes
+        return ready
+
+    def watch(self, interval: float, timeout: float) -> Generator:
+        """Poll the input directory until no new sample completes for a while.
+
+        :param interval:  float, seconds to wait between polls
+        :param timeout:  float, seconds without a newly complete sample after
+                         which watching stops
+
+        Yields a list of newly complete SampleRecords after each poll that
+        finds any.
+        """
+        last = time.monotonic()
+        while True:
+            ready = self.poll()
+            if ready:
+                yield ready
+                last = time.monotonic()
+            elif time.monotonic() - last >= timeout:
+                return
+            time.sleep(interval)
+
+
+def _read_file_sizes(sample_dir: Path) -> Tuple[Tuple[str, int], ...]:
+    """Return (name, size) of a sample directory's two read files.
+
+    An empty tuple is returned unless the directory holds a forward and a
+    reverse read file, neither empty.
+    """
+    files = read_file_pair(sample_dir)
+    if files is None:
+        return ()
+    sizes = tuple((_.name, _.stat().st_size) for _ in files)
+    if not all(_[1] for _ in sizes):
+        return ()
+    return sizes
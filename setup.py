@@ -88,11 +88,21 @@ setuptools.setup(
     url="http://widdowquinn.github.io/pymetabc/",  # project home page
     download_url="https://github.com/widdowquinn/pymetabc/releases",
     scripts=[],
-    entry_points={"console_scripts": ["pymetabc = pymetabc.scripts.pymetabc:run_main"]},
+    entry_points={
+        "console_scripts": [
+            "pymetabc = pymetabc.scripts.pymetabc:run_main",
+            "pymetabc-index = pymetabc.scripts.pymetabc_index:run_main",
+        ]
+    },
     packages=setuptools.find_packages(),
     package_data={"pymetabc": ["pymetabc/data/TruSeq3-PE.fa"]},
     include_package_date=True,
-    install_requires=["biopython", "bokeh", "pandas", "tqdm"],
+    install_requires=["biopython", "bokeh", "numpy>=1.18", "pandas", "tqdm"],
+    extras_require={
+        "xxhash": ["xxhash"],
+        "arrow": ["pyarrow"],
+        "static": ["matplotlib"],
+    },
     classifiers=[
         "Development Status :: 4 - Beta",
         "Environment :: Console",
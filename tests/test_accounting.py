@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Test reconciliation of read counts across pipeline stages.
+
+Intended to be run from repository root with pytest -v
+"""
+
+import unittest
+
+import pandas as pd
+
+from pymetabc.accounting import reconcile_read_counts, unreconciled_samples
+
+
+class TestReconcileReadCounts(unittest.TestCase):
+
+    """Class defining tests of per-stage read count reconciliation."""
+
+    def setUp(self) -> None:
+        """Define stage counts for reconciled and unreconciled samples.
+
+        S1 reconciles; S2 loses reads between trimming and flash, and between
+        flash and hashing; S3 has no hashing filters, and S4 no counts.
+        """
+        self.dfm = pd.DataFrame(
+            {
+                "Input Read Pairs": [100, 100, 50, None],
+                "Both Surviving Reads": [90, 90, 45, None],
+                "Total pairs": [90, 88, 45, None],
+                "Combined pairs": [80, 80, 40, None],
+                "rejected_reads": [5, 5, None, None],
+                "hashed_total": [75, 70, 40, None],
+                "thresholded_total": [60, 60, 30, None],
+            },
+            index=pd.Index(["S1", "S2", "S3", "S4"], name="sample_name"),
+        )
+
+    def test_losses(self) -> None:
+        """Test reads lost between stages are counted."""
+        data = reconcile_read_counts(self.dfm)
+        self.assertEqual(data.loc["S1", "lost_trimming"], 10)
+        self.assertEqual(data.loc["S1", "lost_handoff"], 0)
+        self.assertEqual(data.loc["S1", "unmerged"], 10)
+        self.assertEqual(data.loc["S1", "lost_hashing"], 0)
+        self.assertEqual(data.loc["S1", "below_threshold"], 15)
+        self.assertEqual(data.loc["S2", "lost_handoff"], 2)
+        self.assertEqual(data.loc["S2", "unmerged"], 8)
+        self.assertEqual(data.loc["S2", "lost_hashing"], 5)
+        self.assertEqual(data.loc["S3", "lost_hashing"], 0)
+
+    def test_reconciled(self) -> None:
+        """Test only samples with complete, unbalanced counts are reported."""
+        data = reconcile_read_counts(self.dfm)
+        self.assertEqual(data["reconciled"].tolist(), [True, False, True, False])
+        self.assertEqual(unreconciled_samples(data), ["S2"])
+
+    def test_missing_stages(self) -> None:
+        """Test stages absent from the pipeline dataframe give missing counts."""
+        data = reconcile_read_counts(self.dfm.drop(columns=["thresholded_total"]))
+        self.assertTrue(data["below_threshold"].isnull().all())
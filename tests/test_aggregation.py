@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""Test reduction of read hash abundance tables for plotting.
+
+Intended to be run from repository root with pytest -v
+"""
+
+import shutil
+import unittest
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from pymetabc.aggregation import (
+    OTHER_HASHES,
+    bin_hashes,
+    hash_quantiles,
+    rank_hashes,
+    sample_totals,
+)
+from pymetabc.plotting import (
+    plot_read_hash_abundances,
+    plot_read_hash_abundances_static,
+    plot_sample_hash_abundances,
+    plot_sample_hash_abundances_static,
+)
+
+try:
+    import matplotlib  # type: ignore  # noqa: F401
+
+    HAVE_MATPLOTLIB = True
+except ImportError:
+    HAVE_MATPLOTLIB = False
+
+
+def random_readtable(samples: int, hashes: int, seed: int = 0) -> pd.DataFrame:
+    """Return read table with random abundances for every sample/hash pair."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "read_hash": np.tile([f"{_:032x}" for _ in range(hashes)], samples),
+            "abundance": rng.integers(1, 1000, samples * hashes),
+        },
+        index=pd.Index(
+            np.repeat([f"S{_}" for _ in range(samples)], hashes), name="sample_name"
+        ),
+    )
+
+
+class TestAggregation(unittest.TestCase):
+
+    """Class defining tests of top hash ranking, binning and quantiles."""
+
+    def setUp(self) -> None:
+        """Define a small read table."""
+        self.readtable = pd.DataFrame(
+            {
+                "read_hash": ["cc", "aa", "bb", "dd", "aa", "bb", "ee"],
+                "abundance": [50, 10, 30, 5, 40, 20, 1],
+            },
+            index=pd.Index(["S1"] * 4 + ["S2"] * 3, name="sample_name"),
+        )
+
+    def test_rank_hashes(self) -> None:
+        """Test hashes are ranked by total abundance, with ties broken by hash."""
+        self.assertEqual(list(rank_hashes(self.readtable, 3)), ["aa", "bb", "cc"])
+
+    def test_bin_hashes(self) -> None:
+        """Test hashes outside the top hashes are summed in each sample."""
+        binned = bin_hashes(self.readtable, 2)
+        self.assertEqual(
+            list(binned.itertuples(name=None)),
+            [
+                ("S1", "aa", 10, 1, 10 / 95),
+                ("S1", "bb", 30, 1, 30 / 95),
+                ("S1", OTHER_HASHES, 55, 2, 55 / 95),
+                ("S2", "aa", 40, 1, 40 / 61),
+                ("S2", "bb", 20, 1, 20 / 61),
+                ("S2", OTHER_HASHES, 1, 1, 1 / 61),
+            ],
+        )
+        self.assertEqual(binned["abundance"].sum(), self.readtable["abundance"].sum())
+
+    def test_hash_quantiles(self) -> None:
+        """Test abundance quantiles over samples, for each hash category."""
+        quantiles = hash_quantiles(self.readtable, 2, (0, 0.5, 1))
+        self.assertEqual(list(quantiles.index), ["aa", "bb", OTHER_HASHES])
+        self.assertEqual(
+            list(quantiles.columns), ["rows", "total", "q0", "q50", "q100"]
+        )
+        self.assertEqual(quantiles.loc["aa"].tolist(), [2, 50, 10, 25, 40])
+        self.assertEqual(quantiles.loc[OTHER_HASHES].tolist(), [3, 56, 1, 5, 50])
+
+    def test_sample_totals(self) -> None:
+        """Test total reads and hashes for each sample."""
+        totals = sample_totals(self.readtable)
+        self.assertEqual(totals.loc["S1"].tolist(), [95, 4])
+        self.assertEqual(totals.loc["S2"].tolist(), [61, 3])
+
+    def test_empty(self) -> None:
+        """Test empty read tables give empty reductions."""
+        empty = self.readtable.iloc[:0]
+        self.assertEqual(len(bin_hashes(empty)), 0)
+        self.assertEqual(len(hash_quantiles(empty)), 0)
+
+
+class TestReducedPlots(unittest.TestCase):
+
+    """Class defining tests that plot size does not grow with read hashes."""
+
+    def setUp(self) -> None:
+        """Create output directory for tests."""
+        self.outdir = Path("tests") / "test_output" / "aggregation"
+        shutil.rmtree(self.outdir, ignore_errors=True)
+        self.outdir.mkdir(parents=True)
+
+    def test_plot_size(self) -> None:
+        """Test plots of 100-fold more read hashes are about the same size."""
+        for plotfunc in (plot_read_hash_abundances, plot_sample_hash_abundances):
+            sizes = []
+            for hashes in (50, 5000):
+                ofname = self.outdir / f"{plotfunc.__name__}_{hashes}.html"
+                plotfunc(
+                    random_readtable(10, hashes),
+                    ofname,
+                    datalink="05_thresholded_reads.tab",
+                )
+                sizes.append(ofname.stat().st_size)
+                self.assertIn("05_thresholded_reads.tab", ofname.read_text())
+            self.assertAlmostEqual(sizes[1] / sizes[0], 1, delta=0.05)
+
+    @unittest.skipUnless(HAVE_MATPLOTLIB, "matplotlib is not available")
+    def test_empty_static_plots(self) -> None:
+        """Test static plots are drawn from a read table with no rows."""
+        empty = random_readtable(1, 1).iloc[:0]
+        for plotfunc in (
+            plot_read_hash_abundances_static,
+            plot_sample_hash_abundances_static,
+        ):
+            ofname = self.outdir / f"{plotfunc.__name__}_empty.png"
+            plotfunc(empty, ofname)
+            self.assertTrue(ofname.stat().st_size)
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""Test the in-memory hashing and thresholding API.
+
+Intended to be run from repository root with pytest -v
+"""
+
+import hashlib
+import unittest
+
+import numpy as np
+
+from pymetabc.api import (
+    hash_count_matrix,
+    hash_reads,
+    hex_digests,
+    merge_hashed_reads,
+    threshold_counts,
+)
+
+
+class TestHashReads(unittest.TestCase):
+
+    """Class defining tests of in-memory read hashing."""
+
+    def setUp(self) -> None:
+        """Configure a batch of reads for tests."""
+        self.reads = ["ACGTA", "acgta", "TTGCA", "ACGTA", "GGC"]
+
+    def test_counts(self) -> None:
+        """Test unique reads are counted and identified by legacy MD5 hex IDs."""
+        hashed = hash_reads(self.reads)
+        result = dict(zip(hex_digests(hashed.digests), hashed.counts.tolist()))
+        expected = {
+            hashlib.md5(b"ACGTA").hexdigest(): 3,
+            hashlib.md5(b"TTGCA").hexdigest(): 1,
+            hashlib.md5(b"GGC").hexdigest(): 1,
+        }
+        self.assertEqual(result, expected)
+
+    def test_numpy_input(self) -> None:
+        """Test bytes and zero-padded uint8 arrays give the same result as str."""
+        expected = hash_reads(self.reads)
+        padded = np.zeros((len(self.reads), 6), dtype=np.uint8)
+        for idx, read in enumerate(self.reads):
+            padded[idx, : len(read)] = list(read.encode("ascii"))
+        for batch in (np.array([_.encode("ascii") for _ in self.reads]), padded):
+            hashed = hash_reads(batch)
+            self.assertTrue((hashed.digests == expected.digests).all())
+            self.assertEqual(hashed.counts.tolist(), expected.counts.tolist())
+            self.assertEqual(hashed.sequences.tolist(), expected.sequences.tolist())
+
+    def test_merge(self) -> None:
+        """Test merging batches matches hashing all reads at once."""
+        merged = merge_hashed_reads(
+            [hash_reads(self.reads[:2]), hash_reads(self.reads[2:])]
+        )
+        expected = hash_reads(self.reads)
+        self.assertTrue((merged.digests == expected.digests).all())
+        self.assertEqual(merged.counts.tolist(), expected.counts.tolist())
+
+    def test_matrix_threshold(self) -> None:
+        """Test abundance matrix is built and thresholded as in the pipeline."""
+        names, digests, matrix = hash_count_matrix(
+            {"s2": hash_reads(["GGC"] * 4), "s1": hash_reads(self.reads)}
+        )
+        self.assertEqual(names, ["s1", "s2"])
+        self.assertEqual(matrix.shape, (2, len(digests)))
+        self.assertEqual(matrix.sum(axis=1).tolist(), [5, 4])
+        self.assertEqual(threshold_counts(matrix, 3).sum(), 4)
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""Test reading of batch manifests of input and output directories.
+
+Intended to be run from repository root with pytest -v
+"""
+
+import unittest
+
+from pathlib import Path
+
+from pymetabc.batching import BatchEntry, read_batch_manifest
+
+
+class TestBatchManifest(unittest.TestCase):
+
+    """Class defining tests of batch manifest parsing."""
+
+    def setUp(self) -> None:
+        """Set path for test batch manifests."""
+        self.outdir = Path("tests") / "test_output" / "batching"
+        self.outdir.mkdir(parents=True, exist_ok=True)
+        self.fpath = self.outdir / "batch.tsv"
+
+    def write_manifest(self, text: str) -> None:
+        """Write the passed text to the test batch manifest."""
+        with self.fpath.open("w") as ofh:
+            ofh.write(text)
+
+    def test_read(self) -> None:
+        """Test directory pairs are read, skipping comments and blank lines."""
+        self.write_manifest("# plates\nin1\tout1\n\nin2\tout2\n")
+        self.assertEqual(
+            read_batch_manifest(self.fpath),
+            [
+                BatchEntry(Path("in1"), Path("out1")),
+                BatchEntry(Path("in2"), Path("out2")),
+            ],
+        )
+
+    def test_malformed(self) -> None:
+        """Test lines without exactly two directories are rejected."""
+        self.write_manifest("in1\tout1\nin2 out2\n")
+        with self.assertRaisesRegex(ValueError, "line 2"):
+            read_batch_manifest(self.fpath)
+
+    def test_duplicate_outdir(self) -> None:
+        """Test output directories may not be shared."""
+        self.write_manifest("in1\tout1\nin2\tout1\n")
+        with self.assertRaises(ValueError):
+            read_batch_manifest(self.fpath)
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""Test de novo chimera detection on unique sequences.
+
+Intended to be run from repository root with pytest -v
+"""
+
+import random
+import unittest
+
+from pymetabc.chimeras import KmerIndex, find_chimeras
+
+
+class TestChimeras(unittest.TestCase):
+
+    """Class defining tests of chimera detection."""
+
+    def setUp(self) -> None:
+        """Create two unrelated parent sequences."""
+        rng = random.Random(42)
+        self.parent_a = "".join(rng.choice("ACGT") for _ in range(200))
+        self.parent_b = "".join(rng.choice("ACGT") for _ in range(200))
+
+    def test_chimera(self) -> None:
+        """Test a low-abundance join of two parents is flagged."""
+        chimera = self.parent_a[:120] + self.parent_b[120:]
+        hits = find_chimeras(
+            [("a", 1000, self.parent_a), ("b", 800, self.parent_b), ("c", 50, chimera)]
+        )
+        self.assertEqual(len(hits), 1)
+        self.assertEqual(hits[0].read_hash, "c")
+        self.assertEqual((hits[0].parent_a, hits[0].parent_b), ("a", "b"))
+        self.assertEqual(hits[0].breakpoint, 120)
+        self.assertEqual(hits[0].diffs, 0)
+
+    def test_abskew(self) -> None:
+        """Test parents must be sufficiently more abundant than a chimera."""
+        chimera = self.parent_a[:120] + self.parent_b[120:]
+        reads = [
+            ("a", 1000, self.parent_a),
+            ("b", 800, self.parent_b),
+            ("c", 500, chimera),
+        ]
+        self.assertEqual(find_chimeras(reads, abskew=2.0), [])
+        self.assertEqual(len(find_chimeras(reads, abskew=1.5)), 1)
+
+    def test_variant(self) -> None:
+        """Test a point variant of a single parent is not flagged."""
+        variant = self.parent_a[:100] + "ACGT".replace(self.parent_a[100], "")[0]
+        variant += self.parent_a[101:]
+        hits = find_chimeras(
+            [("a", 1000, self.parent_a), ("b", 800, self.parent_b), ("v", 50, variant)]
+        )
+        self.assertEqual(hits, [])
+
+    def test_kmer_index(self) -> None:
+        """Test indexed sequences are ranked by shared k-mers."""
+        index = KmerIndex(k=4)
+        index.add(0, self.parent_a)
+        index.add(1, self.parent_b)
+        self.assertEqual(index.top_hits(self.parent_b[:50], 1, 2), [1])
+        self.assertEqual(index.top_hits(self.parent_b[:50], 1, 1), [0])
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""Test removal of contamination seen in control samples.
+
+Intended to be run from repository root with pytest -v
+"""
+
+import unittest
+
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from pymetabc.contamination import (
+    build_control_profile,
+    hash_matrix,
+    remove_contamination,
+)
+
+
+def read_table(rows: List[Tuple]) -> pd.DataFrame:
+    """Return read hash abundance table from (sample, hash, abundance) rows."""
+    return pd.DataFrame(
+        rows, columns=["sample_name", "read_hash", "abundance"]
+    ).set_index("sample_name")
+
+
+class TestContamination(unittest.TestCase):
+
+    """Class defining tests of control profiles and contamination removal."""
+
+    def setUp(self) -> None:
+        """Create control profile and sample abundance matrix."""
+        controls = read_table(
+            [("EB", "aa", 10), ("EB", "bb", 4), ("PCR", "aa", 20), ("PCR", "cc", 2)]
+        )
+        # Levels at the maximum across controls: aa 20, bb 4, cc 2
+        self.profile = build_control_profile(controls, 1.0)
+        self.matrix = hash_matrix(
+            read_table(
+                [("S1", "aa", 100), ("S1", "bb", 3), ("S1", "dd", 50), ("S2", "cc", 5)]
+            )
+        )
+
+    def test_profile(self) -> None:
+        """Test controls are indexed by sorted hash, with levels and prevalence."""
+        self.assertEqual(list(self.profile.hashes), ["aa", "bb", "cc"])
+        np.testing.assert_array_equal(self.profile.levels, [20, 4, 2])
+        np.testing.assert_array_equal(self.profile.prevalence, [2, 1, 1])
+
+    def test_subtract(self) -> None:
+        """Test contamination levels are subtracted from sample abundances."""
+        cleaned, report = remove_contamination(self.matrix, self.profile, "subtract")
+        self.assertEqual(cleaned.loc["S1"].tolist(), [80, 0, 0, 50])
+        self.assertEqual(cleaned.loc["S2"].tolist(), [0, 0, 3, 0])
+        self.assertEqual(report.loc["S1", "reads_removed"], 23)
+        self.assertEqual(report.loc["S1", "hashes_removed"], 1)
+
+    def test_flag(self) -> None:
+        """Test abundances at or below contamination levels are zeroed."""
+        cleaned, report = remove_contamination(self.matrix, self.profile, "flag")
+        self.assertEqual(cleaned.loc["S1"].tolist(), [100, 0, 0, 50])
+        self.assertEqual(cleaned.loc["S2"].tolist(), [0, 0, 5, 0])
+        self.assertEqual(report["hashes_flagged"].tolist(), [1, 0])
+
+    def test_bad_mode(self) -> None:
+        """Test unknown modes are rejected."""
+        with self.assertRaises(ValueError):
+            remove_contamination(self.matrix, self.profile, "ignore")
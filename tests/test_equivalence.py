@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""Test that optimised pipeline modes reproduce reference output.
+
+Intended to be run from repository root with pytest -v
+
+Full pipeline runs are skipped unless trimmomatic and flash are on the PATH.
+"""
+
+import shutil
+import unittest
+
+from pathlib import Path
+from typing import List, Tuple
+
+import pandas as pd
+
+from pymetabc.equivalence import (
+    EQUIVALENCE_MODES,
+    compare_outputs,
+    run_modes,
+    timing_table,
+    write_synthetic_input,
+)
+from pymetabc.io import sampledir_to_paths, table_path, write_table
+
+HAVE_TOOLS = all(shutil.which(_) for _ in ("trimmomatic", "flash"))
+
+
+class TestCompareOutputs(unittest.TestCase):
+
+    """Class defining tests of output comparison between modes."""
+
+    def setUp(self) -> None:
+        """Write two matching pipeline output trees."""
+        self.outdir = Path("tests") / "test_output" / "equivalence_compare"
+        shutil.rmtree(self.outdir, ignore_errors=True)
+        self.refdir, self.altdir = self.outdir / "reference", self.outdir / "alt"
+        rows = [("S1", "aa", 5), ("S1", "bb", 7), ("S2", "aa", 3)]
+        for root, order in ((self.refdir, rows), (self.altdir, rows[::-1])):
+            for subdir in ("04_hashed", "05_thresholded", "02_trimmed/S1"):
+                (root / subdir).mkdir(parents=True)
+            (root / "04_hashed" / "S1.fasta").write_text(">aa_5\nACGT\n")
+            (root / "05_thresholded" / "S1.fasta").write_text(">aa_5\nACGT\n")
+            (root / "02_trimmed" / "S1" / "summary.txt").write_text("Input: 9\n")
+            write_table(
+                self._read_table(order), table_path(root, "05_thresholded_reads")
+            )
+
+    @staticmethod
+    def _read_table(rows: List[Tuple]) -> pd.DataFrame:
+        """Return read table dataframe for (sample, hash, abundance) rows."""
+        return pd.DataFrame(
+            rows, columns=["sample_name", "read_hash", "abundance"]
+        ).set_index("sample_name")
+
+    def test_equivalent(self) -> None:
+        """Test outputs differing only in table row order are equivalent."""
+        self.assertEqual(compare_outputs(self.refdir, self.altdir), [])
+
+    def test_differences(self) -> None:
+        """Test changed, missing and unexpected files are reported."""
+        (self.altdir / "04_hashed" / "S1.fasta").write_text(">aa_6\nACGT\n")
+        (self.altdir / "05_thresholded" / "S1.fasta").unlink()
+        (self.altdir / "05_thresholded" / "S2.fasta").write_text(">aa_3\nACGT\n")
+        write_table(
+            self._read_table([("S1", "aa", 5)]),
+            table_path(self.altdir, "05_thresholded_reads"),
+        )
+        self.assertEqual(
+            compare_outputs(self.refdir, self.altdir),
+            [
+                "05_thresholded_reads.tab differs (3 reference rows, 1 rows)",
+                "04_hashed/S1.fasta differs",
+                "05_thresholded/S1.fasta is missing",
+                "05_thresholded/S2.fasta is unexpected",
+            ],
+        )
+
+
+class TestSyntheticInput(unittest.TestCase):
+
+    """Class defining tests of synthetic pipeline input."""
+
+    def setUp(self) -> None:
+        """Create output directory for tests."""
+        self.outdir = Path("tests") / "test_output" / "equivalence_synthetic"
+        shutil.rmtree(self.outdir, ignore_errors=True)
+
+    def test_layout(self) -> None:
+        """Test synthetic input is laid out as pipeline input, reproducibly."""
+        counts = write_synthetic_input(self.outdir / "a", samples=2, reads=50)
+        write_synthetic_input(self.outdir / "b", samples=2, reads=50)
+        self.assertEqual(sorted(counts), ["Synth-1", "Synth-2"])
+        self.assertEqual(counts["Synth-1"].sum(), 50)
+        for sample_dir, other in zip(
+            sorted((self.outdir / "a").iterdir()), sorted((self.outdir / "b").iterdir())
+        ):
+            paths = sampledir_to_paths(sample_dir, "_L001")
+            self.assertTrue(paths["fwd_read_path"].endswith("_R1_001.fastq.gz"))
+            self.assertTrue(paths["rev_read_path"].endswith("_R2_001.fastq.gz"))
+            self.assertEqual(
+                Path(paths["fwd_read_path"]).read_bytes(),
+                (other / Path(paths["fwd_read_path"]).name).read_bytes(),
+            )
+
+
+@unittest.skipUnless(HAVE_TOOLS, "trimmomatic and flash are not available")
+class TestModeEquivalence(unittest.TestCase):
+
+    """Class defining tests that every mode matches the reference mode."""
+
+    def setUp(self) -> None:
+        """Create output directory for tests."""
+        self.outdir = Path("tests") / "test_output" / "equivalence_modes"
+        shutil.rmtree(self.outdir, ignore_errors=True)
+        self.outdir.mkdir(parents=True)
+
+    def check_modes(self, indir: Path, workdir: Path, cutoff: int) -> None:
+        """Run all modes on indir, record timings, and check equivalence."""
+        results = run_modes(
+            indir,
+            workdir,
+            extra_args=["--disable_tqdm", "--thresh_cutoff", cutoff],
+        )
+        timing_table(results).to_csv(workdir / "timings.tab", sep="\t")
+        self.assertEqual([_.mode for _ in results], list(EQUIVALENCE_MODES))
+        for result in results:
+            self.assertEqual(result.differences, [], result.mode)
+
+    def test_test_input(self) -> None:
+        """Test modes are equivalent on the repository's test input."""
+        self.check_modes(Path("tests") / "test_input", self.outdir / "test_input", 30)
+
+    def test_synthetic_input(self) -> None:
+        """Test modes are equivalent on synthetic input."""
+        indir = self.outdir / "synthetic_input"
+        write_synthetic_input(indir, samples=6, reads=2000)
+        self.check_modes(indir, self.outdir / "synthetic", 10)
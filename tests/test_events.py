@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""Test structured progress events written as JSON lines.
+
+Intended to be run from repository root with pytest -v
+"""
+
+import io
+import json
+import unittest
+
+from pathlib import Path
+from typing import Dict, List
+
+from pymetabc import events
+
+
+class BrokenStream(io.StringIO):
+
+    """Text stream that fails on every write."""
+
+    def write(self, text: str) -> int:
+        """Raise an OSError, as for a closed socket."""
+        raise OSError("reader went away")
+
+
+class TestEventStream(unittest.TestCase):
+
+    """Class defining tests of the event stream."""
+
+    def setUp(self) -> None:
+        """Set path for test event output."""
+        self.outdir = Path("tests") / "test_output" / "events"
+        self.outdir.mkdir(parents=True, exist_ok=True)
+        self.fpath = self.outdir / "events.jsonl"
+
+    def read_events(self) -> List[Dict]:
+        """Return events written to the test output file."""
+        with self.fpath.open() as ifh:
+            return [json.loads(_) for _ in ifh]
+
+    def test_file(self) -> None:
+        """Test events are written in order, one JSON object per line."""
+        stream = events.open_event_stream(str(self.fpath))
+        for idx in range(1000):
+            stream.emit("sample_end", sample=f"S{idx}", path=self.fpath)
+        stream.close()
+        stream.emit("ignored")
+        written = self.read_events()
+        self.assertEqual(len(written), 1000)
+        self.assertEqual(written[-1]["sample"], "S999")
+        self.assertEqual(written[0]["path"], str(self.fpath))
+
+    def test_stage(self) -> None:
+        """Test stage start and end events go to the active stream."""
+        previous = events.set_stream(events.open_event_stream(str(self.fpath)))
+        with events.stage("trim", samples=2) as counts:
+            counts["reads"] = 10
+        events.set_stream(previous).close()
+        start, end = self.read_events()
+        self.assertEqual((start["event"], start["stage"]), ("stage_start", "trim"))
+        self.assertEqual(
+            (end["event"], end["samples"], end["reads"]), ("stage_end", 2, 10)
+        )
+        self.assertGreaterEqual(end["seconds"], 0)
+
+    def test_failed_output(self) -> None:
+        """Test a failing output does not raise errors in the caller."""
+        stream = events.EventStream(BrokenStream())
+        stream.emit("stage_start", stage="trim")
+        stream.close()
+
+    def test_bad_socket(self) -> None:
+        """Test malformed socket addresses are rejected."""
+        with self.assertRaises(ValueError):
+            events.open_event_stream("tcp://localhost")
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""Test filtering of merged reads before hashing.
+
+Intended to be run from repository root with pytest -v
+"""
+
+import shutil
+import unittest
+
+from pathlib import Path
+
+from pymetabc.filtering import ReadFilter
+from pymetabc.hashing import fastq_to_hash_abundance, sum_hashed_abundance
+
+
+class TestReadFilter(unittest.TestCase):
+
+    """Class defining tests of length, N count and expected error filters."""
+
+    def setUp(self) -> None:
+        """Define reads of known length, N count and expected errors."""
+        # Phred+33: "I" is Q40 (EE 0.0001/base), "+" is Q10 (EE 0.1/base)
+        self.seqs = ["ACGTACGTAC", "ACGT", "ACNNACGTAC", "ACGTACGTAC", "ACGTACGTACGT"]
+        self.quals = ["I" * 10, "I" * 4, "I" * 10, "+" * 10, "I" * 12]
+
+    def test_no_filters(self) -> None:
+        """Test all reads pass when no filters are set."""
+        readfilter = ReadFilter()
+        self.assertTrue(readfilter.filter(self.seqs, self.quals).all())
+        self.assertEqual(readfilter.stats()["rejected_reads"], 0)
+
+    def test_filters(self) -> None:
+        """Test each read is rejected by the first filter it fails."""
+        readfilter = ReadFilter(min_length=5, max_length=10, max_ns=1, max_ee=0.5)
+        keep = readfilter.filter(self.seqs, self.quals)
+        self.assertEqual(keep.tolist(), [True, False, False, False, False])
+        self.assertEqual(
+            readfilter.stats(),
+            {
+                "rejected_length": 2,
+                "rejected_ns": 1,
+                "rejected_ee": 1,
+                "rejected_reads": 4,
+            },
+        )
+
+    def test_expected_errors(self) -> None:
+        """Test the expected error threshold is inclusive, with phred64 offset."""
+        readfilter = ReadFilter(max_ee=1.0, offset=64)
+        # Phred+64: "J" is Q10
+        keep = readfilter.filter(["ACGTACGTAC", "ACGTACGTACG"], ["J" * 10, "J" * 11])
+        self.assertEqual(keep.tolist(), [True, False])
+
+    def test_counts_accumulate(self) -> None:
+        """Test rejected counts accumulate over chunks, including empty ones."""
+        readfilter = ReadFilter(min_length=5)
+        readfilter.filter(self.seqs, self.quals)
+        readfilter.filter([], [])
+        readfilter.filter(self.seqs, self.quals)
+        self.assertEqual(readfilter.stats()["rejected_length"], 2)
+
+
+class TestFilteredHashing(unittest.TestCase):
+
+    """Class defining tests of filters applied while hashing merged reads."""
+
+    def setUp(self) -> None:
+        """Write a FASTQ file of merged reads."""
+        self.outdir = Path("tests") / "test_output" / "filtered_hashing"
+        shutil.rmtree(self.outdir, ignore_errors=True)
+        self.outdir.mkdir(parents=True, exist_ok=True)
+        self.fpath = self.outdir / "reads.fastq"
+        reads = [("ACGTACGTAC", "I" * 10)] * 5 + [("ACGT", "IIII")] * 3
+        with self.fpath.open("w") as ofh:
+            for idx, (seq, qual) in enumerate(reads):
+                ofh.write(f"@read{idx}\n{seq}\n+\n{qual}\n")
+
+    def test_filtered_hashing(self) -> None:
+        """Test rejected reads are not hashed, and hashed plus rejected is total."""
+        readfilter = ReadFilter(min_length=5, chunksize=3)
+        hashed = fastq_to_hash_abundance(self.fpath, readfilter=readfilter)
+        self.assertEqual(len(hashed), 1)
+        self.assertEqual(sum_hashed_abundance(hashed), 5)
+        self.assertEqual(readfilter.stats()["rejected_reads"], 3)
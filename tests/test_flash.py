@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""Test handling of flash output.
+
+Intended to be run from repository root with pytest -v
+"""
+
+import unittest
+
+from pymetabc.flash import parse_flash_stats
+
+# STDOUT of a flash v1.2.11 run on one of the test input samples
+FLASH_STDOUT = """[FLASH] Starting FLASH v1.2.11
+[FLASH] Fast Length Adjustment of SHort reads
+[FLASH]
+[FLASH] Input files:
+[FLASH]     EB-Plate1-1_S13_L001_R1_001.fastq.gz_trimmed.fastq
+[FLASH]     EB-Plate1-1_S13_L001_R2_001.fastq.gz_trimmed.fastq
+[FLASH]
+[FLASH] Output files:
+[FLASH]     03_merged/EB_Plate1_1/EB-Plate1-1_S13.extendedFrags.fastq
+[FLASH]     03_merged/EB_Plate1_1/EB-Plate1-1_S13.notCombined_1.fastq
+[FLASH]     03_merged/EB_Plate1_1/EB-Plate1-1_S13.notCombined_2.fastq
+[FLASH]     03_merged/EB_Plate1_1/EB-Plate1-1_S13.hist
+[FLASH]     03_merged/EB_Plate1_1/EB-Plate1-1_S13.histogram
+[FLASH]
+[FLASH] Parameters:
+[FLASH]     Min overlap:           10
+[FLASH]     Max overlap:           300
+[FLASH]     Max mismatch density:  0.250000
+[FLASH]     Allow "outie" pairs:   true
+[FLASH]     Cap mismatch quals:    false
+[FLASH]     Combiner threads:      4
+[FLASH]     Input format:          FASTQ, phred_offset=33
+[FLASH]     Output format:         FASTQ, phred_offset=33
+[FLASH]
+[FLASH] Starting reader and writer threads
+[FLASH] Starting 4 combiner threads
+[FLASH] Processed 1290 read pairs
+[FLASH]
+[FLASH] Read combination statistics:
+[FLASH]     Total pairs:      1290
+[FLASH]     Combined pairs:   1268
+[FLASH]         Innie pairs:   1203 (94.87% of combined)
+[FLASH]         Outie pairs:   65 (5.13% of combined)
+[FLASH]     Uncombined pairs: 22
+[FLASH]     Percent combined: 98.29%
+[FLASH]
+[FLASH] Writing histogram files.
+[FLASH]
+[FLASH] FLASH v1.2.11 complete!
+[FLASH] 0.034 seconds elapsed
+"""
+
+
+class TestFlashStats(unittest.TestCase):
+
+    """Class defining tests of flash statistics parsing."""
+
+    def test_parse(self) -> None:
+        """Test read pair counts are parsed from flash STDOUT."""
+        self.assertEqual(
+            parse_flash_stats(FLASH_STDOUT),
+            {"Total pairs": 1290, "Combined pairs": 1268, "Uncombined pairs": 22},
+        )
+
+    def test_no_stats(self) -> None:
+        """Test output without statistics gives no counts."""
+        self.assertEqual(parse_flash_stats("[FLASH] Starting FLASH v1.2.11\n"), {})
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""Test hashing of merged reads.
+
+Intended to be run from repository root with pytest -v
+"""
+
+import hashlib
+import shutil
+import unittest
+
+from pathlib import Path
+
+from Bio.Seq import Seq
+from Bio.SeqRecord import SeqRecord
+
+from pymetabc.digest import from_hex, get_digest_function, to_hex
+from pymetabc.hashing import aggregate_hash_counts, count_unique_hashes, top_hashes
+from pymetabc.io import write_hashed_reads
+
+
+class TestDigest(unittest.TestCase):
+
+    """Class defining tests of read digest backends."""
+
+    def setUp(self) -> None:
+        """Configure parameters for tests."""
+        self.seq = b"ACGTTGCAACGGTAGCTAGCTAGGCTAACGT"
+
+    def test_md5_compatible(self) -> None:
+        """Test md5 backend reproduces legacy hex MD5 read IDs."""
+        digest = get_digest_function("md5")
+        self.assertEqual(to_hex(digest(self.seq)), hashlib.md5(self.seq).hexdigest())
+
+    def test_blake2b_size(self) -> None:
+        """Test blake2b backend returns digests of the requested length."""
+        digest = get_digest_function("blake2b", 8)
+        self.assertEqual(len(digest(self.seq)), 8)
+
+    def test_hex_roundtrip(self) -> None:
+        """Test binary digests survive conversion to and from hex."""
+        value = get_digest_function("blake2b", 12)(self.seq)
+        self.assertEqual(from_hex(to_hex(value)), value)
+
+    def test_bad_algorithm(self) -> None:
+        """Test unknown digest algorithms are rejected."""
+        with self.assertRaises(ValueError):
+            get_digest_function("crc32")
+
+
+class TestAggregateHashCounts(unittest.TestCase):
+
+    """Class defining tests of run-level hash abundance aggregation."""
+
+    def setUp(self) -> None:
+        """Write hashed read FASTA files for aggregation.
+
+        The first three files have no metadata, as written by earlier versions
+        of pymetabc, and the first of them is not sorted by hash; the last
+        is written sorted, with sidecar metadata.
+        """
+        self.outdir = Path("tests") / "test_output" / "aggregate_hashes"
+        shutil.rmtree(self.outdir, ignore_errors=True)
+        self.outdir.mkdir(parents=True, exist_ok=True)
+        # Includes a digest with trailing null bytes
+        self.hashes = ["ab" * 15 + "00", "01" * 16, "ff" * 16]
+        samples = [[(0, 5), (1, 3)], [(1, 4), (2, 9)], [(0, 1), (2, 2)]]
+        for idx, sample in enumerate(samples):
+            with (self.outdir / f"sample{idx}.fasta").open("w") as ofh:
+                for hidx, count in sample:
+                    ofh.write(f">{self.hashes[hidx]}_{count}\nACGT\n")
+        write_hashed_reads(
+            [
+                SeqRecord(Seq("ACGT"), id=f"{self.hashes[1]}_2"),
+                SeqRecord(Seq("ACGT"), id=f"{self.hashes[0]}_4"),
+            ],
+            self.outdir / "sample3.fasta",
+        )
+        self.totals = {self.hashes[0]: 10, self.hashes[1]: 9, self.hashes[2]: 11}
+
+    def test_aggregate(self) -> None:
+        """Test parallel aggregation gives the total abundance of each hash."""
+        hashes, counts = aggregate_hash_counts(self.outdir, workers=2)
+        result = {
+            to_hex(hashes[_ : _ + 1].tobytes()): int(counts[_])
+            for _ in range(len(hashes))
+        }
+        self.assertEqual(result, self.totals)
+
+    def test_count_unique(self) -> None:
+        """Test merged hash counts give the total abundance of each hash."""
+        result = {
+            to_hex(key): val for key, val in count_unique_hashes(self.outdir).items()
+        }
+        self.assertEqual(result, self.totals)
+
+    def test_top_hashes(self) -> None:
+        """Test top hashes are returned in decreasing order of abundance."""
+        hashes, counts = aggregate_hash_counts(self.outdir)
+        self.assertEqual(
+            top_hashes(hashes, counts, 2), [(self.hashes[2], 11), (self.hashes[0], 10)]
+        )
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""Test data IO functions.
+
+Intended to be run from repository root with pytest -v
+"""
+
+import hashlib
+import shutil
+import unittest
+
+from pathlib import Path
+
+import pandas as pd
+
+from Bio import SeqIO
+from Bio.Seq import Seq
+from Bio.SeqRecord import SeqRecord
+
+from pymetabc.io import (
+    READ_TABLE_DTYPES,
+    TABLE_FORMATS,
+    SequenceIndex,
+    TableWriter,
+    build_sequence_index,
+    join_hashed_reads,
+    merge_hashed_reads,
+    hashed_meta_path,
+    read_hashed_meta,
+    read_file_pair,
+    read_hashed_reads,
+    read_table,
+    sampledir_to_paths,
+    table_path,
+    write_hashed_reads,
+)
+
+try:
+    import pyarrow  # type: ignore  # noqa: F401
+
+    HAVE_ARROW = True
+except ImportError:
+    HAVE_ARROW = False
+
+
+class TestSequenceIndex(unittest.TestCase):
+
+    """Class defining tests of the hash to sequence index."""
+
+    def setUp(self) -> None:
+        """Write hashed read FASTA files for indexing."""
+        self.outdir = Path("tests") / "test_output" / "sequence_index"
+        shutil.rmtree(self.outdir, ignore_errors=True)
+        self.outdir.mkdir(parents=True, exist_ok=True)
+        self.seqs = ["ACGTACGTAA", "TTGCA", "GGGGCCCCATAT", "ACGTACGTAA"]
+        for idx, seq in enumerate(self.seqs):
+            hsh = hashlib.md5(seq.encode("ascii")).hexdigest()
+            with (self.outdir / f"sample{idx}.fasta").open("w") as ofh:
+                ofh.write(f">{hsh}_{idx + 1}\n{seq}\n")
+        self.idxpath = self.outdir / "hashed.idx"
+
+    def test_lookup(self) -> None:
+        """Test sequences are recovered for indexed and missing hashes."""
+        count = build_sequence_index([self.outdir], self.idxpath)
+        self.assertEqual(count, 3)
+        hashes = {hashlib.md5(_.encode("ascii")).hexdigest(): _ for _ in self.seqs}
+        missing, invalid = "0" * 32, "z" * 32
+        results = SequenceIndex(self.idxpath).lookup(list(hashes) + [missing, invalid])
+        self.assertIsNone(results.pop(missing))
+        self.assertIsNone(results.pop(invalid))
+        self.assertEqual(results, hashes)
+
+
+class TestHashedReadFiles(unittest.TestCase):
+
+    """Class defining tests of sorted hashed read files and merge-joins."""
+
+    def setUp(self) -> None:
+        """Write sorted hashed read files, and one unsorted legacy file."""
+        self.outdir = Path("tests") / "test_output" / "hashed_read_files"
+        shutil.rmtree(self.outdir, ignore_errors=True)
+        self.outdir.mkdir(parents=True, exist_ok=True)
+        self.fpaths = [self.outdir / f"sample{_}.fasta" for _ in range(3)]
+        samples = [
+            [("ff" * 16, 3, "AAAA"), ("01" * 16, 5, "CCCC")],
+            [("ab" * 16, 2, "GGGG"), ("ff" * 16, 4, "AAAA")],
+        ]
+        for fpath, reads in zip(self.fpaths, samples):
+            write_hashed_reads(
+                [SeqRecord(Seq(seq), id=f"{hsh}_{cnt}") for hsh, cnt, seq in reads],
+                fpath,
+            )
+        # Legacy file: no metadata, unsorted, wrapped sequence
+        with self.fpaths[2].open("w") as ofh:
+            ofh.write(f">{'ff' * 16}_1\nAA\nAA\n>{'01' * 16}_7\nCCCC\n")
+
+    def test_sorted_output(self) -> None:
+        """Test reads are written as plain FASTA in hash order, with metadata."""
+        self.assertEqual(
+            read_hashed_meta(self.fpaths[0]),
+            {"order": "digest", "reads": 8, "unique": 2},
+        )
+        self.assertEqual(
+            self.fpaths[0].read_text(),
+            f">{'01' * 16}_5\nCCCC\n>{'ff' * 16}_3\nAAAA\n",
+        )
+        self.assertEqual(
+            [_.id for _ in SeqIO.parse(str(self.fpaths[0]), "fasta")],
+            [f"{'01' * 16}_5", f"{'ff' * 16}_3"],
+        )
+        self.assertEqual(
+            list(read_hashed_reads(self.fpaths[0])),
+            [("01" * 16, 5, "CCCC"), ("ff" * 16, 3, "AAAA")],
+        )
+
+    def test_legacy_file(self) -> None:
+        """Test files without metadata are read, with sequences joined."""
+        self.assertFalse(hashed_meta_path(self.fpaths[2]).exists())
+        self.assertEqual(read_hashed_meta(self.fpaths[2]), {})
+        self.assertEqual(next(read_hashed_reads(self.fpaths[2]))[2], "AAAA")
+
+    def test_join(self) -> None:
+        """Test hashes are joined across files in hash order."""
+        self.assertEqual(
+            list(join_hashed_reads(self.fpaths)),
+            [
+                ("01" * 16, [5, 0, 7]),
+                ("ab" * 16, [0, 2, 0]),
+                ("ff" * 16, [3, 4, 1]),
+            ],
+        )
+
+    def test_merge(self) -> None:
+        """Test hash abundances are summed across files in hash order."""
+        self.assertEqual(
+            list(merge_hashed_reads(self.fpaths)),
+            [("01" * 16, 12), ("ab" * 16, 2), ("ff" * 16, 8)],
+        )
+
+    def test_fan_in(self) -> None:
+        """Test files are merged in rounds when there are more than the fan-in."""
+        fpaths = self.fpaths * 4
+        self.assertEqual(
+            list(merge_hashed_reads(fpaths, fan_in=2)),
+            [("01" * 16, 48), ("ab" * 16, 8), ("ff" * 16, 32)],
+        )
+        self.assertEqual(
+            list(join_hashed_reads(fpaths, fan_in=5)),
+            [
+                ("01" * 16, [5, 0, 7] * 4),
+                ("ab" * 16, [0, 2, 0] * 4),
+                ("ff" * 16, [3, 4, 1] * 4),
+            ],
+        )
+        with self.assertRaises(ValueError):
+            list(merge_hashed_reads(fpaths, fan_in=1))
+
+
+class TestSampleDirs(unittest.TestCase):
+
+    """Class defining tests of read file discovery in sample directories."""
+
+    def setUp(self) -> None:
+        """Create a sample directory holding read files and hidden files."""
+        self.sample_dir = Path("tests") / "test_output" / "sample_dirs" / "S1_L001-ds.a"
+        shutil.rmtree(self.sample_dir.parent, ignore_errors=True)
+        self.sample_dir.mkdir(parents=True)
+        for fname in (
+            "S1_L001_R1_001.fastq.gz",
+            "S1_L001_R2_001.fastq.gz",
+            ".DS_Store",
+            "._S1_L001_R1_001.fastq.gz",
+            "S1_L001.md5",
+        ):
+            (self.sample_dir / fname).write_bytes(b"data")
+
+    def test_read_file_pair(self) -> None:
+        """Test hidden and non-read files are ignored when finding read files."""
+        paths = sampledir_to_paths(
+            self.sample_dir, "_L001", read_file_pair(self.sample_dir)
+        )
+        self.assertEqual(paths["sample_name"], "S1")
+        self.assertEqual(Path(paths["fwd_read_path"]).name, "S1_L001_R1_001.fastq.gz")
+        self.assertEqual(Path(paths["rev_read_path"]).name, "S1_L001_R2_001.fastq.gz")
+
+    def test_missing_read_file(self) -> None:
+        """Test a sample directory without a reverse read file has no pair."""
+        (self.sample_dir / "S1_L001_R2_001.fastq.gz").unlink()
+        self.assertIsNone(read_file_pair(self.sample_dir))
+
+    def test_sample_dir(self) -> None:
+        """Test a directory holding only two read files is read in name order."""
+        for fname in (".DS_Store", "._S1_L001_R1_001.fastq.gz", "S1_L001.md5"):
+            (self.sample_dir / fname).unlink()
+        paths = sampledir_to_paths(self.sample_dir, "_L001")
+        self.assertEqual(Path(paths["fwd_read_path"]).name, "S1_L001_R1_001.fastq.gz")
+        self.assertEqual(Path(paths["rev_read_path"]).name, "S1_L001_R2_001.fastq.gz")
+
+
+class TestTableWriter(unittest.TestCase):
+
+    """Class defining round-trip tests of chunked tables in every format."""
+
+    def setUp(self) -> None:
+        """Define chunks of a read table, the first of them empty."""
+        self.outdir = Path("tests") / "test_output" / "table_writer"
+        shutil.rmtree(self.outdir, ignore_errors=True)
+        self.outdir.mkdir(parents=True)
+        self.table = pd.DataFrame(
+            {"read_hash": ["aa", "bb", "cc"], "abundance": [3, 2, 1]},
+            index=pd.Index(["S1", "S1", "S2"], name="sample_name"),
+        )
+        self.formats = [
+            _ for _ in TABLE_FORMATS if HAVE_ARROW or _ in ("tsv", "tsv.gz")
+        ]
+
+    def test_empty_first_chunk(self) -> None:
+        """Test tables starting with an empty chunk are read back intact."""
+        for fmt in self.formats:
+            ofname = table_path(self.outdir, "reads", fmt)
+            with TableWriter(ofname, fmt, READ_TABLE_DTYPES) as writer:
+                writer.write(self.table.iloc[:0])
+                writer.write(self.table.iloc[:2])
+                writer.write(self.table.iloc[2:])
+            self.assertEqual(writer.nrows, 3)
+            pd.testing.assert_frame_equal(
+                read_table(ofname, fmt, READ_TABLE_DTYPES), self.table, obj=fmt
+            )
+
+    def test_empty_table(self) -> None:
+        """Test tables with no rows are written with their columns."""
+        for fmt in self.formats:
+            ofname = table_path(self.outdir, "empty", fmt)
+            with TableWriter(ofname, fmt, READ_TABLE_DTYPES) as writer:
+                writer.write(self.table.iloc[:0])
+            result = read_table(ofname, fmt, READ_TABLE_DTYPES)
+            self.assertEqual(len(result), 0, fmt)
+            self.assertEqual(list(result.columns), ["read_hash", "abundance"], fmt)
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""Test estimation of read counts and stage resources for dry runs.
+
+Intended to be run from repository root with pytest -v
+"""
+
+import gzip
+import unittest
+
+from pathlib import Path
+
+import pandas as pd
+
+from pymetabc.planning import estimate_read_count, plan_stages
+
+
+class TestReadEstimates(unittest.TestCase):
+
+    """Class defining tests of read count estimation."""
+
+    def setUp(self) -> None:
+        """Set input read file and its true read count."""
+        self.fpath = sorted(
+            Path("tests/test_input").glob("PCR_Neg_Plate1*/*_R1_001.fastq.gz")
+        )[0]
+        with gzip.open(self.fpath, "rb") as ifh:
+            self.nreads = sum(1 for _ in ifh) // 4
+
+    def test_whole_file(self) -> None:
+        """Test the read count is exact if the whole file is read."""
+        total, _, _, sampled = estimate_read_count(self.fpath, self.nreads + 1)
+        self.assertEqual(total, self.nreads)
+        self.assertEqual(sampled, self.nreads)
+
+    def test_sampled(self) -> None:
+        """Test the read count is estimated from the first reads."""
+        total, length, _, sampled = estimate_read_count(self.fpath, 500)
+        self.assertEqual(sampled, 500)
+        self.assertGreater(length, 0)
+        self.assertLess(abs(total - self.nreads) / self.nreads, 0.5)
+
+
+class TestStagePlan(unittest.TestCase):
+
+    """Class defining tests of stage resource predictions."""
+
+    def setUp(self) -> None:
+        """Create a plan for two samples."""
+        self.plan = pd.DataFrame(
+            {
+                "read_pairs": [100000, 300000],
+                "read_length": [250.0, 250.0],
+                "unique_fraction": [0.5, 0.2],
+            },
+            index=pd.Index(["S1", "S2"], name="sample_name"),
+        )
+
+    def test_scratch(self) -> None:
+        """Test scratch space takes intermediates off the output filesystem."""
+        local = plan_stages(self.plan, 4)
+        scratch = plan_stages(self.plan, 4, scratch=True)
+        self.assertTrue((local["scratch_gb"] == 0).all())
+        self.assertEqual(scratch.loc["trim", "disk_gb"], 0)
+        self.assertGreater(scratch.loc["trim", "scratch_gb"], 0)
+        self.assertLess(scratch["disk_gb"].sum(), local["disk_gb"].sum())
+
+    def test_threads(self) -> None:
+        """Test only threaded stages are faster with more threads."""
+        one, four = plan_stages(self.plan, 1), plan_stages(self.plan, 4)
+        self.assertAlmostEqual(
+            one.loc["trim", "runtime_s"], 4 * four.loc["trim", "runtime_s"]
+        )
+        self.assertEqual(one.loc["hash", "runtime_s"], four.loc["hash", "runtime_s"])
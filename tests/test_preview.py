@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""Test previews of dominant sequences from a sample of read pairs.
+
+Intended to be run from repository root with pytest -v
+"""
+
+import shutil
+import unittest
+
+from argparse import Namespace
+from pathlib import Path
+
+from pymetabc.digest import get_digest_function, to_hex
+from pymetabc.equivalence import write_synthetic_input
+from pymetabc.io import sampledir_to_paths
+from pymetabc.manifest import SampleRecord
+from pymetabc.preview import (
+    clip_adapter,
+    merge_pairs,
+    preview_samples,
+    preview_tables,
+    read_adapters,
+    trim_pairs,
+)
+
+ADAPTERS = Path("data") / "TruSeq3-PE.fa"
+
+
+class TestMergePairs(unittest.TestCase):
+
+    """Class defining tests of the quick overlap merge."""
+
+    def setUp(self) -> None:
+        """Define an amplicon, and read pairs from its two ends."""
+        self.amplicon = "ACGTTGCAGGCTAGCTAGGATCCATGCAAGTCGATCGGATCCTAGCATGCAAGT"
+        complement = str.maketrans("ACGT", "TGCA")
+        self.fwd = self.amplicon[:40]
+        self.rev = self.amplicon[-40:][::-1].translate(complement)
+
+    def test_merge(self) -> None:
+        """Test overlapping reads merge to the amplicon."""
+        merged = merge_pairs([(self.fwd, "I" * 40, self.rev, "I" * 40)])
+        self.assertEqual(merged, [self.amplicon])
+
+    def test_quality_consensus(self) -> None:
+        """Test mismatches in the overlap take the higher quality base."""
+        fwd = self.fwd[:-1] + ("A" if self.fwd[-1] != "A" else "C")
+        qual = "I" * 39 + "#"
+        merged = merge_pairs([(fwd, qual, self.rev, "I" * 40)])
+        self.assertEqual(merged, [self.amplicon])
+
+    def test_no_overlap(self) -> None:
+        """Test reads that do not overlap are not merged."""
+        merged = merge_pairs([(self.fwd[:20], "I" * 20, self.rev[:20], "I" * 20)])
+        self.assertEqual(merged, [None])
+
+    def test_mixed_lengths(self) -> None:
+        """Test pairs of different read lengths merge together as on their own."""
+        complement = str.maketrans("ACGT", "TGCA")
+        revcomp = self.amplicon[::-1].translate(complement)
+        pairs = [
+            (self.amplicon[:fwdlen], "I" * fwdlen, revcomp[:revlen], "I" * revlen)
+            for fwdlen, revlen in ((40, 40), (30, 34), (54, 20), (27, 37), (12, 12))
+        ]
+        merged = merge_pairs(pairs)
+        self.assertEqual(merged, [merge_pairs([_])[0] for _ in pairs])
+        self.assertEqual(merged, [self.amplicon] * 4 + [None])
+
+    def test_read_through(self) -> None:
+        """Test reads running through a short insert merge to the insert only."""
+        fwd_adapter, rev_adapter = read_adapters(ADAPTERS)
+        complement = str.maketrans("ACGT", "TGCA")
+        fwd = (self.amplicon + fwd_adapter)[:70]
+        rev = (self.amplicon[::-1].translate(complement) + rev_adapter)[:70]
+        merged = merge_pairs([(fwd, "I" * 70, rev, "I" * 70)])
+        self.assertEqual(merged, [self.amplicon])
+
+
+class TestTrimPairs(unittest.TestCase):
+
+    """Class defining tests of adapter clipping and quality trimming."""
+
+    def setUp(self) -> None:
+        """Read the TruSeq adapters, and define a 60bp insert."""
+        self.adapters = read_adapters(ADAPTERS)
+        self.insert = "ACGTTGCAGGCTAGCTAGGATCCATGCAAGTCGATCGGATCCTAGCATGCAAGTTGCAAC"
+
+    def test_clip_adapter(self) -> None:
+        """Test reads are clipped at whole and partial adapters."""
+        adapter = self.adapters[0]
+        self.assertEqual(clip_adapter(self.insert + adapter, adapter), 60)
+        self.assertEqual(clip_adapter(self.insert + adapter[:9], adapter), 60)
+        self.assertEqual(clip_adapter(self.insert + adapter[:5], adapter), 65)
+
+    def test_trim(self) -> None:
+        """Test adapters and low quality tails are trimmed from read pairs."""
+        fwd = self.insert + self.adapters[0]
+        rev = self.insert + "ACGT" * 10
+        trimmed = trim_pairs(
+            [(fwd, "I" * len(fwd), rev, "I" * 60 + "#" * 40)], self.adapters
+        )
+        self.assertEqual(trimmed, [(self.insert, "I" * 60, self.insert, "I" * 60)])
+
+    def test_drop(self) -> None:
+        """Test pairs with an uncalled or too short read are dropped."""
+        trimmed = trim_pairs(
+            [
+                ("N" * 35, "#" * 35, "N" * 35, "#" * 35),
+                (self.insert, "I" * 60, self.insert[:40], "I" * 40),
+            ],
+            self.adapters,
+        )
+        self.assertEqual(trimmed, [None, None])
+
+
+class TestPreviewSamples(unittest.TestCase):
+
+    """Class defining tests of sample previews on synthetic input."""
+
+    def setUp(self) -> None:
+        """Write synthetic input without sequencing errors."""
+        self.outdir = Path("tests") / "test_output" / "preview"
+        shutil.rmtree(self.outdir, ignore_errors=True)
+        self.counts = write_synthetic_input(
+            self.outdir, samples=2, reads=500, error_rate=0, seed=1
+        )
+        self.samples = [
+            SampleRecord(**sampledir_to_paths(_, "_L001"))
+            for _ in sorted(self.outdir.iterdir())
+        ]
+        self.args = Namespace(
+            preview_reads=200,
+            preview_top=3,
+            hash_algorithm="md5",
+            hash_digest_size=16,
+            merge_maxoverlap=300,
+            threads=1,
+            trim_adapters=ADAPTERS,
+            trim_fastq="phred33",
+        )
+
+    def test_preview(self) -> None:
+        """Test the preview read limit, and that hash IDs match merged sequences."""
+        previews = preview_samples(self.samples, self.args)
+        summary, sample_hashes, run_hashes = preview_tables(previews, 3)
+        self.assertEqual(summary["pairs_previewed"].tolist(), [200, 200])
+        self.assertEqual(summary["merged_fraction"].tolist(), [1.0, 1.0])
+        self.assertEqual(len(sample_hashes), 6)
+        self.assertLessEqual(run_hashes["est_abundance"].sum(), 400)
+        # Hash IDs are digests of the merged sequence
+        digest = get_digest_function("md5")
+        for _, row in sample_hashes.iterrows():
+            self.assertEqual(
+                row["read_hash"], to_hex(digest(row["sequence"].encode("ascii")))
+            )
+
+    def test_preview_all(self) -> None:
+        """Test previewing all reads gives exact depth, and the top amplicon."""
+        self.args.preview_reads = 0
+        summary, sample_hashes, _ = preview_tables(
+            preview_samples(self.samples, self.args), 1
+        )
+        self.assertEqual(summary["est_read_pairs"].tolist(), [500, 500])
+        for sample, row in zip(self.counts, sample_hashes.itertuples()):
+            self.assertEqual(row.est_abundance, self.counts[sample].max())
+
+
+class TestPreviewRun(unittest.TestCase):
+
+    """Class defining tests of previews of the test run."""
+
+    def setUp(self) -> None:
+        """Define samples and options for the test run."""
+        self.samples = [
+            SampleRecord(**sampledir_to_paths(_, "_L001"))
+            for _ in sorted((Path("tests") / "test_input").iterdir())
+        ]
+        self.args = Namespace(
+            preview_reads=0,
+            preview_top=5,
+            hash_algorithm="md5",
+            hash_digest_size=16,
+            merge_maxoverlap=300,
+            threads=1,
+            trim_adapters=ADAPTERS,
+            trim_fastq="phred33",
+        )
+
+    def test_top_hash(self) -> None:
+        """Test the run's top previewed hash is in the full run's output.
+
+        The target table holds read hashes from trimmomatic and flash.
+        """
+        _, _, run_hashes = preview_tables(preview_samples(self.samples, self.args), 1)
+        with (
+            Path("tests") / "test_targets" / "05_thresholded_reads.tab"
+        ).open() as ifh:
+            hashes = {_.split("\t")[1] for _ in ifh}
+        self.assertIn(run_hashes["read_hash"].iloc[0], hashes)
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""Test primer matching and demultiplexing.
+
+Intended to be run from repository root with pytest -v
+"""
+
+import unittest
+
+from pymetabc.primers import Marker, MarkerMatcher, reverse_complement
+
+
+class TestMarkerMatcher(unittest.TestCase):
+
+    """Class defining tests of marker assignment by primer."""
+
+    def setUp(self) -> None:
+        """Configure markers and an amplicon for tests."""
+        self.matcher = MarkerMatcher(
+            [
+                Marker("m1", "GTGGTTTATCRGGTCTTGCT", "CACTTTCCAGCCGCGAATCA"),
+                Marker("m2", "ACCTGACTTTCTTCCCGCTA", "TTGGCAAAGGCTTACCGTAA"),
+            ],
+            max_mismatches=2,
+        )
+        self.insert = "ACGTTAGCCATGCATTAGCAGGCT"
+        self.amplicon = (
+            "GTGGTTTATCAGGTCTTGCT"
+            + self.insert
+            + reverse_complement("CACTTTCCAGCCGCGAATCA")
+        )
+
+    def test_assign_forward(self) -> None:
+        """Test amplicon with degenerate primer match is assigned and trimmed."""
+        self.assertEqual(self.matcher.assign(self.amplicon), ("m1", self.insert))
+
+    def test_assign_reverse_complement(self) -> None:
+        """Test reverse complemented amplicon is trimmed in primer orientation."""
+        self.assertEqual(
+            self.matcher.assign(reverse_complement(self.amplicon)), ("m1", self.insert)
+        )
+
+    def test_assign_mismatches(self) -> None:
+        """Test primers match with up to the allowed number of mismatches."""
+        twomm = "GAGGTTTATCAGGTCTTGAT" + self.amplicon[20:]
+        threemm = "GAGGTTTAACAGGTCTTGAT" + self.amplicon[20:]
+        self.assertEqual(self.matcher.assign(twomm), ("m1", self.insert))
+        self.assertIsNone(self.matcher.assign(threemm))
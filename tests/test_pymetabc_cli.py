@@ -61,7 +61,19 @@ class TestPymetabcCLI(unittest.TestCase):
             verbose=False,
             threads=cpu_count(),
             dryrun=False,
+            preview=False,
+            preview_reads=10000,
+            preview_top=10,
+            events=None,
             disable_tqdm=True,
+            scratch=None,
+            watch=False,
+            watch_interval=60.0,
+            watch_timeout=3600.0,
+            batch=None,
+            batch_workers=1,
+            batch_summary=None,
+            table_format="tsv",
             indir=self.dirpaths.indir,
             outdir=self.dirpaths.outdir,
             sample_sep="_L001",
@@ -73,9 +85,34 @@ class TestPymetabcCLI(unittest.TestCase):
             merge_dir="03_merged",
             merge_maxoverlap=300,
             hash_dir="04_hashed",
+            hash_algorithm="md5",
+            hash_digest_size=16,
+            hash_min_length=None,
+            hash_max_length=None,
+            hash_max_ns=None,
+            hash_max_ee=None,
+            index=False,
+            qc_dir="04_qc",
             thresh_dir="05_thresholded",
             thresh_mode="cutoff",
             thresh_cutoff=1000,
+            thresh_controls=None,
+            thresh_percentile=0.95,
+            control_mode="subtract",
+            chimeras=False,
+            chimera_dir="05_nonchimeric",
+            chimera_abskew=2.0,
+            chimera_min_diffs=3,
+            primers=None,
+            primer_dir="06_primers",
+            primer_mismatches=2,
+            report="interactive",
+            report_top=19,
+            validate_counts=False,
+            rarefy_depth=None,
+            rarefy_iterations=100,
+            rarefy_seed=None,
+            rarefy_curve_depths=[],
         )
 
         # Set command-line arguments
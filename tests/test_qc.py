@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""Test collection of merged read length and quality statistics.
+
+Intended to be run from repository root with pytest -v
+"""
+
+import shutil
+import unittest
+
+from pathlib import Path
+
+from pymetabc.qc import ReadQC, read_length_table, read_quality_table
+
+
+class TestReadQC(unittest.TestCase):
+
+    """Class defining tests of chunked read statistics."""
+
+    def setUp(self) -> None:
+        """Configure quality strings and output directory for tests."""
+        self.outdir = Path("tests") / "test_output" / "qc"
+        shutil.rmtree(self.outdir, ignore_errors=True)
+        self.outdir.mkdir(parents=True, exist_ok=True)
+        # Phred+33 scores: "I" = 40, "5" = 20, "#" = 2
+        self.quals = ["II#", "I5", "IIII5", "5"]
+
+    def test_chunked(self) -> None:
+        """Test statistics do not depend on the chunk size."""
+        results = []
+        for chunksize in (1, 3, 100):
+            readqc = ReadQC(chunksize=chunksize)
+            for qual in self.quals:
+                readqc.add(qual)
+            readqc.flush()
+            results.append((readqc.lengths.tolist(), readqc.qualities.tolist()))
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0], results[2])
+        self.assertEqual(results[0][0], [0, 1, 1, 1, 0, 1])
+
+    def test_tables(self) -> None:
+        """Test saved statistics are summarised by length and position."""
+        readqc = ReadQC(chunksize=2)
+        for qual in self.quals:
+            readqc.add(qual)
+        readqc.save(self.outdir / "sample1.npz")
+        lengths = read_length_table([self.outdir / "sample1.npz"])
+        self.assertEqual(lengths["count"].sum(), 4)
+        quality = read_quality_table([self.outdir / "sample1.npz"])
+        self.assertEqual(quality["reads"].tolist(), [4, 3, 2, 1, 1])
+        self.assertEqual(quality["median"].tolist(), [40, 40, 2, 40, 20])
+        self.assertAlmostEqual(quality["mean"].iloc[0], 35)
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""Test rarefaction of read hash abundances.
+
+Intended to be run from repository root with pytest -v
+"""
+
+import unittest
+
+from pathlib import Path
+
+import pandas as pd
+
+from pymetabc.io import TableWriter, read_table
+from pymetabc.rarefaction import RAREFIED_TABLE_DTYPES, rarefy_readtable
+
+
+class TestRarefaction(unittest.TestCase):
+
+    """Class defining tests of seeded rarefaction."""
+
+    def setUp(self) -> None:
+        """Build read hash abundance table for tests."""
+        self.outdir = Path("tests") / "test_output" / "rarefaction"
+        self.outdir.mkdir(parents=True, exist_ok=True)
+        self.readtable = pd.DataFrame(
+            [
+                ("s1", "h1", 50),
+                ("s1", "h2", 30),
+                ("s1", "h3", 20),
+                ("s2", "h1", 5),
+                ("s2", "h4", 500),
+                ("s3", "h2", 10),
+            ],
+            columns=["sample_name", "read_hash", "abundance"],
+        ).set_index("sample_name")
+
+    def test_depth(self) -> None:
+        """Test every rarefied subsample has the requested number of reads."""
+        ofname = self.outdir / "rarefied_reads.tab"
+        with TableWriter(ofname, "tsv", RAREFIED_TABLE_DTYPES) as writer:
+            rarefy_readtable(self.readtable, 40, 10, seed=1, writer=writer)
+        rarefied = read_table(ofname, "tsv", RAREFIED_TABLE_DTYPES)
+        sums = rarefied.groupby(["sample_name", "iteration"])[["abundance"]].sum()
+        self.assertEqual(len(sums), 20)  # s3 has too few reads
+        self.assertTrue((sums["abundance"] == 40).all())
+
+    def test_reproducible(self) -> None:
+        """Test seeded rarefaction does not depend on worker count."""
+        curves = [
+            rarefy_readtable(
+                self.readtable, 40, 10, seed=7, curve_depths=[10, 20], workers=workers
+            )
+            for workers in (1, 2)
+        ]
+        pd.testing.assert_frame_equal(curves[0], curves[1])
+        self.assertEqual(list(curves[0].loc["s1", "depth"]), [40, 20, 10])
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""Test building reports from the tables saved by the pipeline.
+
+Intended to be run from repository root with pytest -v
+"""
+
+import shutil
+import unittest
+
+from pathlib import Path
+
+import pandas as pd
+
+from pymetabc import io, plotting
+from pymetabc.qc import ReadQC, read_length_table, read_quality_table
+from pymetabc.reporting import (
+    REPORT_MODES,
+    build_report_jobs,
+    run_report_jobs,
+    summarise_read_hashes,
+    write_summary_report,
+)
+
+try:
+    import matplotlib  # type: ignore  # noqa: F401
+
+    HAVE_MATPLOTLIB = True
+except ImportError:
+    HAVE_MATPLOTLIB = False
+
+
+class TestReporting(unittest.TestCase):
+
+    """Class defining tests of report jobs and the summary report."""
+
+    def setUp(self) -> None:
+        """Write the stage tables that reports are built from."""
+        self.outdir = Path("tests") / "test_output" / "reporting"
+        shutil.rmtree(self.outdir, ignore_errors=True)
+        self.outdir.mkdir(parents=True)
+        targets = Path("tests") / "test_targets"
+        for stem in ("02_trimmed", "05_thresholded_reads"):
+            shutil.copy(targets / f"{stem}.tab", self.outdir / f"{stem}.tab")
+        qcfiles = []
+        for sample, quals in (("S1", ["II#", "I5"]), ("S2", ["IIII5", "5"])):
+            readqc = ReadQC()
+            for qual in quals:
+                readqc.add(qual)
+            qcfiles.append(self.outdir / f"{sample}.npz")
+            readqc.save(qcfiles[-1])
+        io.write_table(read_length_table(qcfiles), self.outdir / "04_read_lengths.tab")
+        io.write_table(read_quality_table(qcfiles), self.outdir / "04_read_quality.tab")
+
+    def test_jobs(self) -> None:
+        """Test plotting jobs are built for each report mode."""
+        jobs = build_report_jobs(self.outdir, "tsv", "interactive", 5)
+        self.assertEqual(
+            [_.ofname.name for _ in jobs],
+            [
+                "02_summaries.html",
+                "04_read_lengths.html",
+                "04_read_quality.html",
+                "05_abundance_by_hash.html",
+                "05_abundance_by_sample.html",
+            ],
+        )
+        self.assertTrue(all(_.infname.is_file() for _ in jobs))
+        self.assertEqual(jobs[0].plotfunc, plotting.plot_trimmomatic_summary)
+        self.assertEqual(
+            jobs[3].options, {"top": 5, "datalink": "05_thresholded_reads.tab"}
+        )
+        jobs = build_report_jobs(self.outdir, "tsv", "static", 5)
+        self.assertEqual({_.ofname.suffix for _ in jobs}, {".png"})
+        self.assertEqual(jobs[4].plotfunc, plotting.plot_sample_hash_abundances_static)
+        self.assertEqual(jobs[4].options, {"top": 5})
+        for mode in ("summary", "none"):
+            self.assertEqual(build_report_jobs(self.outdir, "tsv", mode), [])
+        self.assertEqual(len(REPORT_MODES), 4)
+
+    def test_jobs_readstem(self) -> None:
+        """Test abundance plots can be built from another read hash table."""
+        jobs = build_report_jobs(
+            self.outdir, "tsv", "interactive", readstem="05_nonchimeric_reads"
+        )
+        self.assertEqual(
+            [_.infname.name for _ in jobs[3:]], ["05_nonchimeric_reads.tab"] * 2
+        )
+        self.assertEqual(jobs[3].options["datalink"], "05_nonchimeric_reads.tab")
+        self.assertEqual(jobs[0].infname.name, "02_trimmed.tab")
+
+    def test_run_jobs(self) -> None:
+        """Test jobs give the same outputs, in job order, serially and in parallel."""
+        jobs = build_report_jobs(self.outdir, "tsv", "interactive")
+        for workers in (1, 3):
+            for job in jobs:
+                if job.ofname.exists():
+                    job.ofname.unlink()
+            self.assertEqual(run_report_jobs(jobs, workers), [_.ofname for _ in jobs])
+            self.assertTrue(all(_.ofname.stat().st_size for _ in jobs))
+
+    @unittest.skipUnless(HAVE_MATPLOTLIB, "matplotlib is not available")
+    def test_run_static_jobs(self) -> None:
+        """Test static report jobs write images in parallel worker processes."""
+        jobs = build_report_jobs(self.outdir, "tsv", "static")
+        self.assertEqual(run_report_jobs(jobs, 2), [_.ofname for _ in jobs])
+        for job in jobs:
+            self.assertEqual(job.ofname.read_bytes()[:8], b"\x89PNG\r\n\x1a\n")
+
+    def test_summary(self) -> None:
+        """Test read hashes and reads are summarised for each sample."""
+        readtable = pd.DataFrame(
+            {
+                "read_hash": ["aa", "bb", "cc", "bb"],
+                "abundance": [10, 30, 5, 7],
+            },
+            index=pd.Index(["S1", "S1", "S1", "S2"], name="sample_name"),
+        )
+        summary = summarise_read_hashes(readtable)
+        self.assertEqual(
+            list(summary.itertuples(name=None)),
+            [("S1", 3, 45, "bb", 30), ("S2", 1, 7, "bb", 7)],
+        )
+        self.assertEqual(len(summarise_read_hashes(readtable.iloc[:0])), 0)
+
+    def test_summary_report(self) -> None:
+        """Test the summary report is written from the saved read table."""
+        ofname = write_summary_report(self.outdir, "tsv")
+        self.assertEqual(ofname, self.outdir / "05_summary.tab")
+        readtable = io.read_table(
+            self.outdir / "05_thresholded_reads.tab", dtypes=io.READ_TABLE_DTYPES
+        )
+        summary = io.read_table(ofname, dtypes={"top_hash": str})
+        self.assertEqual(sorted(summary.index), sorted(set(readtable.index)))
+        self.assertEqual(
+            summary["thresholded_reads"].sum(), readtable["abundance"].sum()
+        )
+        self.assertEqual(summary["thresholded_hashes"].sum(), len(readtable))
+        top = readtable.loc[["F2-S6"]].sort_values("abundance").iloc[-1]
+        self.assertEqual(
+            summary.loc["F2-S6", ["top_hash", "top_abundance"]].tolist(),
+            [top["read_hash"], top["abundance"]],
+        )
+
+    def test_summary_report_readstem(self) -> None:
+        """Test the summary report is written from another read hash table."""
+        readtable = io.read_table(
+            self.outdir / "05_thresholded_reads.tab", dtypes=io.READ_TABLE_DTYPES
+        )
+        io.write_table(
+            readtable.loc[["F2-S6"]], self.outdir / "05_nonchimeric_reads.tab"
+        )
+        ofname = write_summary_report(self.outdir, "tsv", "05_nonchimeric_reads")
+        summary = io.read_table(ofname, dtypes={"top_hash": str})
+        self.assertEqual(list(summary.index), ["F2-S6"])
+        self.assertEqual(
+            summary["thresholded_reads"].sum(),
+            readtable.loc[["F2-S6"]]["abundance"].sum(),
+        )
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""Test publishing of outputs from scratch space.
+
+Intended to be run from repository root with pytest -v
+"""
+
+import shutil
+import unittest
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from pymetabc.scratch import publish_file
+
+
+class TestPublishFile(unittest.TestCase):
+
+    """Class defining tests of atomic publication of scratch outputs."""
+
+    def setUp(self) -> None:
+        """Create output directory for tests."""
+        self.outdir = Path("tests") / "test_output" / "scratch"
+        shutil.rmtree(self.outdir, ignore_errors=True)
+        self.outdir.mkdir(parents=True, exist_ok=True)
+
+    def test_publish_replaces(self) -> None:
+        """Test published file replaces any existing output, leaving no partial."""
+        dest = self.outdir / "reads.fasta"
+        dest.write_text("old\n")
+        with TemporaryDirectory() as tmpdir:
+            src = Path(tmpdir) / "reads.fasta"
+            src.write_text(">a_1\nACGT\n")
+            publish_file(src, dest)
+            self.assertFalse(src.exists())
+        self.assertEqual(dest.read_text(), ">a_1\nACGT\n")
+        self.assertEqual([_.name for _ in self.outdir.iterdir()], ["reads.fasta"])
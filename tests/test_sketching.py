@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""Test bounded-memory abundance sketches.
+
+Intended to be run from repository root with pytest -v
+"""
+
+import unittest
+
+from collections import Counter
+
+import numpy as np
+
+from pymetabc.digest import get_digest_function
+from pymetabc.sketching import (
+    CountMinSketch,
+    HeavyHitters,
+    HyperLogLog,
+    digest_keys,
+)
+
+
+class TestSketches(unittest.TestCase):
+
+    """Class defining tests of count-min, heavy hitter and HyperLogLog sketches."""
+
+    def setUp(self) -> None:
+        """Draw a skewed stream of sequences, and their digests."""
+        rng = np.random.default_rng(0)
+        digest = get_digest_function("md5")
+        self.items = [f"SEQ{_}" for _ in rng.zipf(1.5, 20000)]
+        self.digests = [digest(_.encode("ascii")) for _ in self.items]
+        self.counts = Counter(self.items)
+
+    def test_count_min_bounds(self) -> None:
+        """Test count-min estimates are never below the true counts."""
+        sketch = CountMinSketch(width=256, depth=4)
+        sketch.update(digest_keys(self.digests))
+        digest = get_digest_function("md5")
+        items = list(self.counts)
+        estimates = sketch.estimate(
+            digest_keys([digest(_.encode("ascii")) for _ in items])
+        )
+        self.assertTrue(all(estimates >= [self.counts[_] for _ in items]))
+        self.assertEqual(sketch.total, len(self.items))
+
+    def test_heavy_hitters(self) -> None:
+        """Test the top items are found, in order, from merged halves."""
+        halves = [HeavyHitters(capacity=20), HeavyHitters(capacity=20)]
+        for start in range(0, len(self.items), 1000):
+            half = halves[(start // 1000) % 2]
+            half.update(
+                self.digests[start : start + 1000], self.items[start : start + 1000]
+            )
+        halves[0].merge(halves[1])
+        top = [(seq, count) for _, count, seq in halves[0].top(3)]
+        self.assertEqual(top, self.counts.most_common(3))
+
+    def test_hyperloglog(self) -> None:
+        """Test distinct counts are estimated closely, and merge as unions."""
+        first, second = HyperLogLog(), HyperLogLog()
+        first.update(digest_keys(self.digests[:10000]))
+        second.update(digest_keys(self.digests[10000:]))
+        first.merge(second)
+        self.assertAlmostEqual(first.estimate() / len(self.counts), 1, delta=0.05)
+
+    def test_short_digests(self) -> None:
+        """Test short digests are extended to full sketch keys."""
+        digest = get_digest_function("blake2b", 4)
+        keys = digest_keys([digest(b"ACGT"), digest(b"TTTT")])
+        self.assertEqual(keys.shape, (2, 2))
+        self.assertNotEqual(keys[0].tolist(), keys[1].tolist())
+
+    def test_bad_parameters(self) -> None:
+        """Test invalid sketch sizes are rejected."""
+        with self.assertRaises(ValueError):
+            HyperLogLog(precision=3)
+        with self.assertRaises(ValueError):
+            CountMinSketch(256, 4).merge(CountMinSketch(128, 4))
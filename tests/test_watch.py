@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""Test detection of complete sample directories in watch mode.
+
+Intended to be run from repository root with pytest -v
+"""
+
+import shutil
+import unittest
+
+from pathlib import Path
+
+from pymetabc.watch import SampleWatcher
+
+
+class TestSampleWatcher(unittest.TestCase):
+
+    """Class defining tests of sample directory polling."""
+
+    def setUp(self) -> None:
+        """Create an empty input directory for tests."""
+        self.indir = Path("tests") / "test_output" / "watch"
+        shutil.rmtree(self.indir, ignore_errors=True)
+        self.indir.mkdir(parents=True, exist_ok=True)
+        self.watcher = SampleWatcher(self.indir, "_L001")
+
+    def add_read_file(self, sample_dir: str, fname: str, data: bytes) -> None:
+        """Append data to a read file in the named sample directory."""
+        (self.indir / sample_dir).mkdir(exist_ok=True)
+        with (self.indir / sample_dir / fname).open("ab") as ofh:
+            ofh.write(data)
+
+    def test_stable_sample(self) -> None:
+        """Test a sample is reported once its read files stop changing."""
+        self.add_read_file("S1_L001-ds.abc", "S1_L001_R1_001.fastq.gz", b"fwd")
+        self.add_read_file("S1_L001-ds.abc", "S1_L001_R2_001.fastq.gz", b"rev")
+        self.assertEqual(self.watcher.poll(), [])
+        ready = self.watcher.poll()
+        self.assertEqual([_.sample_name for _ in ready], ["S1"])
+        self.assertTrue(ready[0].fwd_read_path.endswith("R1_001.fastq.gz"))
+        self.assertEqual(self.watcher.poll(), [])
+
+    def test_incomplete_sample(self) -> None:
+        """Test samples with missing or growing read files are not reported."""
+        self.add_read_file("S2_L001-ds.def", "S2_L001_R1_001.fastq.gz", b"fwd")
+        self.assertEqual(self.watcher.poll(), [])
+        self.assertEqual(self.watcher.poll(), [])
+        self.add_read_file("S2_L001-ds.def", "S2_L001_R2_001.fastq.gz", b"rev")
+        self.assertEqual(self.watcher.poll(), [])
+        self.add_read_file("S2_L001-ds.def", "S2_L001_R2_001.fastq.gz", b"more")
+        self.assertEqual(self.watcher.poll(), [])
+        self.assertEqual(len(self.watcher.poll()), 1)